@@ -0,0 +1,196 @@
+""" Benchmark harness for sortdicom. Generates a synthetic dicom archive with pydicom and times each stage
+of the pipeline separately. Run from the repo root after installing the package (make install-dev):
+
+    $ python benchmarks/bench_sortdicom.py --files 2000 --depth 3 --pixel-bytes 1000000 --duplicate-ratio 0.2
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import resource
+import tracemalloc
+from collections import OrderedDict
+
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.uid import ExplicitVRLittleEndian, generate_uid
+
+import sortdicom.processor as processor
+
+MAMMO_SOP_CLASS = '1.2.840.10008.5.1.4.1.1.1.2'  # digital mammography x-ray image storage - for presentation
+VIEWS = [('L', 'CC'), ('L', 'MLO'), ('R', 'CC'), ('R', 'MLO')]
+
+
+def _write_dicom(filepath='', tags=None, pixel_bytes=0):
+    """ write a minimal explicit vr little endian mammogram with the given (mrn, laterality, view, date) tags
+    """
+    mrn, laterality, view, date = tags
+    meta = FileMetaDataset()
+    meta.MediaStorageSOPClassUID = MAMMO_SOP_CLASS
+    meta.MediaStorageSOPInstanceUID = generate_uid()
+    meta.TransferSyntaxUID = ExplicitVRLittleEndian
+
+    ds = Dataset()
+    ds.file_meta = meta
+    ds.SOPClassUID = MAMMO_SOP_CLASS
+    ds.SOPInstanceUID = meta.MediaStorageSOPInstanceUID
+    ds.PatientID = mrn
+    ds.ImageLaterality = laterality
+    ds.ViewPosition = view
+    ds.AcquisitionDate = date
+    ds.Modality = 'MG'
+
+    side = max(int((pixel_bytes // 2) ** 0.5), 1)
+    ds.Rows = side
+    ds.Columns = side
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = 'MONOCHROME2'
+    ds.BitsAllocated = 16
+    ds.BitsStored = 16
+    ds.HighBit = 15
+    ds.PixelRepresentation = 0
+    ds.PixelData = (bytes(range(256)) * (side * side * 2 // 256 + 1))[:side * side * 2]
+    try:
+        ds.save_as(filepath, enforce_file_format=True)
+    except TypeError:  # pydicom < 3.0
+        ds.save_as(filepath, write_like_original=False)
+
+
+def generate_archive(root_dir='', files=1000, depth=2, fanout=4, pixel_bytes=100000, duplicate_ratio=0.1, seed=0):
+    """ generate a synthetic archive of dicom files under root_dir
+
+    :param str root_dir: The directory to write into
+    :param int files: The number of dicom files
+    :param int depth: The number of directory levels below root_dir
+    :param int fanout: The number of subdirectories per level
+    :param int pixel_bytes: The approximate size of the pixel data per file
+    :param float duplicate_ratio: The fraction of files that repeat the header tags of an earlier file
+    :param int seed: Random seed so that archives are reproducible
+    :returns: the total number of bytes written
+    :rtype: int
+    """
+    rng = random.Random(seed)
+    seen = []
+    total_bytes = 0
+    for i in range(files):
+        if seen and rng.random() < duplicate_ratio:
+            tags = rng.choice(seen)
+        else:
+            laterality, view = VIEWS[len(seen) % len(VIEWS)]
+            tags = ('MRN-{:07d}'.format(len(seen) // len(VIEWS)), laterality, view,
+                '20{:02d}{:02d}{:02d}'.format(rng.randint(0, 19), rng.randint(1, 12), rng.randint(1, 28)))
+            seen.append(tags)
+
+        subdirs = [str(rng.randrange(fanout)) for _ in range(depth)]
+        dirpath = os.path.join(root_dir, *subdirs)
+        os.makedirs(dirpath, exist_ok=True)
+        filepath = os.path.join(dirpath, '{:08d}.dcm'.format(i))
+        _write_dicom(filepath, tags, pixel_bytes)
+        total_bytes += os.path.getsize(filepath)
+    return total_bytes
+
+
+class StageTimer:
+    """ Times a stage and records its peak python memory if tracing is enabled. MB/sec is only reported for 
+    stages given nbytes
+    """
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.results = OrderedDict()
+
+    def run(self, name, func, *args, files=0, nbytes=None, **kwargs):
+        if self.trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        peak = None
+        if self.trace_memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        self.results[name] = {'seconds': elapsed, 'files': files, 'bytes': nbytes, 'peak_bytes': peak}
+        return result
+
+    def report(self, out=sys.stdout):
+        out.write('{:<20}{:>10}{:>14}{:>12}{:>16}\n'.format('stage', 'seconds', 'files/sec', 'MB/sec', 'peak MB'))
+        for name, r in self.results.items():
+            secs = max(r['seconds'], 1e-9)
+            peak = '-' if r['peak_bytes'] is None else '{:.1f}'.format(r['peak_bytes'] / 1e6)
+            rate = '-' if r['bytes'] is None else '{:.1f}'.format(r['bytes'] / 1e6 / secs)
+            out.write('{:<20}{:>10.3f}{:>14.1f}{:>12}{:>16}\n'.format(name, r['seconds'], r['files'] / secs, rate, peak))
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3  # kB on linux
+        out.write('process peak RSS: {:.1f} MB\n'.format(maxrss))
+
+
+def _extract_all(filepaths, workers=1, executor='thread', fast_scan=True):
+    uids = processor._iter_dicom_unique_identifiers(filepaths, workers=workers, executor=executor, fast_scan=fast_scan)
+    return OrderedDict(processor._iter_valid_dicom_unique_identifiers(uids, raise_on_read_error=False))
+
+
+def _place_all(copy_map, output_dir='', placement='copy'):
+    for k, v in copy_map.items():
+        processor._copy_dicom_file(k, v, output_dir, placement)
+
+
+def run_benchmark(root_dir='', output_dir='', workers=1, executor='thread', placement='copy', trace_memory=False, 
+        fast_scan=True):
+    """ time discovery, header extraction, duplicate labeling and placement over root_dir
+    :returns: the StageTimer with the results
+    """
+    timer = StageTimer(trace_memory)
+    filepaths = timer.run('discovery', processor._get_all_dicom_filepaths, root_dir)
+    nbytes = sum(os.path.getsize(f) for f in filepaths)
+    n = len(filepaths)
+
+    # header extraction stops at the header, so the file sizes would overstate its MB/sec. Only files/sec is reported 
+    copy_map = timer.run('header extraction', _extract_all, filepaths, workers, executor, fast_scan, files=n)
+    copy_map = timer.run('duplicate labeling', processor._label_duplicates, copy_map, files=n)
+    timer.run('placement', _place_all, copy_map, output_dir, placement, files=n, nbytes=nbytes)
+    timer.results['discovery']['files'] = n
+    return timer
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=1000)
+    parser.add_argument('--depth', type=int, default=2)
+    parser.add_argument('--fanout', type=int, default=4)
+    parser.add_argument('--pixel-bytes', type=int, default=100000)
+    parser.add_argument('--duplicate-ratio', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--executor', default='thread', choices=sorted(processor.EXECUTORS.keys()))
+    parser.add_argument('--placement', default='copy')
+    parser.add_argument('--pydicom', action='store_true', help='read headers with pydicom instead of the fast scanner')
+    parser.add_argument('--trace-memory', action='store_true', help='record peak python memory per stage (slower)')
+    parser.add_argument('--workdir', default=None, help='reuse or keep the archive in this dir instead of a temp dir')
+    args = parser.parse_args(argv)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='sortdicom-bench-')
+    root_dir = os.path.join(workdir, 'archive')
+    output_dir = os.path.join(workdir, 'output')
+    try:
+        if not os.path.exists(root_dir):
+            start = time.perf_counter()
+            nbytes = generate_archive(root_dir, args.files, args.depth, args.fanout, args.pixel_bytes,
+                args.duplicate_ratio, args.seed)
+            sys.stdout.write('generated {} files ({:.1f} MB) in {:.1f}s\n'.format(
+                args.files, nbytes / 1e6, time.perf_counter() - start))
+        if os.path.exists(output_dir):
+            shutil.rmtree(output_dir)
+        os.mkdir(output_dir)
+
+        timer = run_benchmark(root_dir, output_dir, args.workers, args.executor, args.placement, args.trace_memory, 
+            not args.pydicom)
+        timer.report()
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
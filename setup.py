@@ -27,7 +27,9 @@ REQUIRED = [
 ]
 
 # What packages are optional?
-EXTRAS = {}
+EXTRAS = {
+    'parquet': ['pyarrow'],  # parquet manifests
+}
 
 # The rest you shouldn't have to touch too much :)
 # ------------------------------------------------
@@ -69,6 +71,9 @@ setup(
     test_suite='nose.collector',
     install_requires=REQUIRED,
     extras_require=EXTRAS,
+    entry_points={
+        'console_scripts': ['sortdicom=sortdicom.cli:main'],
+    },
     include_package_data=True,
     license='MIT',
     classifiers=[
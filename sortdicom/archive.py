@@ -0,0 +1,151 @@
+""" Reads dicom files straight out of zip and tar archives so they never have to be extracted to scratch
+space first. Members are always read front to back in archive order, which is the only cheap way to read a
+compressed tar. Each member is known by its archive-member path, the archive path joined with the member
+name, eg. /data/study.zip/PATIENT/1.dcm. Only the start of each member is read for its header, so a member
+is never held in memory whole.
+"""
+
+import os
+import zipfile
+import tarfile
+import posixpath
+
+from .discovery import DEFAULT_INCLUDE, DICOM_PREAMBLE_LENGTH, DICOM_MAGIC, _compile_patterns
+from .scanner import SCAN_BYTES
+
+import logging
+l = logging.getLogger(__name__)
+
+ARCHIVE_SUFFIXES = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+
+def is_archive(path=''):
+    """ check if a path is a zip or tar archive that sortdicom can read from
+    :param str path: The path to check
+    :rtype: bool
+    """
+    path = os.fspath(path)
+    return path.lower().endswith(ARCHIVE_SUFFIXES) and os.path.isfile(path)
+
+
+class DicomArchive:
+    """ A zip or tar archive of dicom files. Members are filtered with the same include, exclude and
+    exclude_dirs globs as discovery.iter_dicom_filepaths, where exclude_dirs is matched against every
+    directory in the member name. Use as a context manager.
+    """
+
+    def __init__(self, archive_path='', include=None, exclude=None, exclude_dirs=None, magic=False):
+        if not is_archive(archive_path):
+            raise ValueError('Not a supported archive: {}. Use one of: {}'.format(archive_path, list(ARCHIVE_SUFFIXES)))
+        self.archive_path = os.fspath(archive_path)
+        self.include = _compile_patterns(DEFAULT_INCLUDE if include is None else include)
+        self.exclude = _compile_patterns(exclude)
+        self.exclude_dirs = _compile_patterns(exclude_dirs)
+        self.magic = magic
+        self._archive = None
+
+
+    def __enter__(self):
+        self.open()
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def open(self):
+        if self.archive_path.lower().endswith('.zip'):
+            self._archive = zipfile.ZipFile(self.archive_path)
+        else:
+            self._archive = tarfile.open(self.archive_path, 'r:*')
+        return self
+
+
+    def close(self):
+        if self._archive is not None:
+            self._archive.close()
+            self._archive = None
+
+
+    def member_path(self, name=''):
+        """ the archive-member path used as the key for a member name. Tar members are often stored as ./name 
+        """
+        return os.path.join(self.archive_path, posixpath.normpath(name).lstrip('/'))
+
+
+    def _iter_files(self):
+        """ yields (name, size, fileobj) for every regular file in archive order 
+        """
+        if isinstance(self._archive, zipfile.ZipFile):
+            for info in self._archive.infolist():
+                if info.is_dir():
+                    continue
+                with self._archive.open(info) as f:
+                    yield info.filename, info.file_size, f
+        else:
+            for info in self._archive:
+                if not info.isfile():
+                    continue
+                f = self._archive.extractfile(info)
+                try:
+                    yield info.name, info.size, f
+                finally:
+                    f.close()
+
+
+    def open_member(self, member_path=''):
+        """ open one member by its archive-member path, out of archive order. This is slow for compressed tars 
+        since they have to be read again from the start, so it is only used for the odd member whose header 
+        could not be read from its start 
+        :raise: KeyError if there is no such member 
+        """
+        if isinstance(self._archive, zipfile.ZipFile):
+            infos = (info for info in self._archive.infolist() if not info.is_dir())
+            name = lambda info: info.filename
+        else:
+            infos = (info for info in self._archive.getmembers() if info.isfile())
+            name = lambda info: info.name
+        for info in infos:
+            if self.member_path(name(info)) == member_path:
+                return self._archive.open(info) if isinstance(self._archive, zipfile.ZipFile) else \
+                    self._archive.extractfile(info)
+        raise KeyError(member_path)
+
+
+    def _matches(self, name=''):
+        """ returns True, False or None if only the magic bytes can tell 
+        """
+        parts = posixpath.normpath(name).split('/')
+        if self.exclude_dirs and any(self.exclude_dirs.match(d) for d in parts[:-1]):
+            return False
+        if self.exclude and self.exclude.match(parts[-1]):
+            return False
+        if self.include and self.include.match(parts[-1]):
+            return True
+        return None if self.magic else False
+
+
+    def iter_members(self, prefix_bytes=SCAN_BYTES):
+        """ yields (member_path, prefix, size) for every dicom member in archive order, where prefix is at most the 
+        first prefix_bytes of the member and size is its full size 
+        """
+        for name, size, f in self._iter_files():
+            match = self._matches(name)
+            if match is False:
+                continue
+            prefix = f.read(prefix_bytes)
+            if match is None and prefix[DICOM_PREAMBLE_LENGTH:DICOM_PREAMBLE_LENGTH + len(DICOM_MAGIC)] != DICOM_MAGIC:
+                continue
+            yield self.member_path(name), prefix, size
+
+
+    def iter_open_members(self, member_paths):
+        """ yields (member_path, fileobj) for the members in member_paths in archive order. Each file object 
+        is only valid until the next member is yielded. 
+        """
+        member_paths = set(member_paths)
+        for name, size, f in self._iter_files():
+            key = self.member_path(name)
+            if key in member_paths:
+                yield key, f
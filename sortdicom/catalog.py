@@ -0,0 +1,183 @@
+""" A persistent sqlite catalog of sorted files keyed by their header values. A run fills it as files are
+placed so downstream jobs can look up the output paths for a patient, view or date range without listing
+the output dir or opening any dicoms. Rows are keyed by output path, so running again over the same output
+dir updates the catalog instead of duplicating it.
+"""
+
+import os
+import sqlite3
+import threading
+
+from .handler import DicomFileHandler
+
+import logging
+l = logging.getLogger(__name__)
+
+CATALOG_NAME = '.sortdicom.catalog'
+COMMIT_EVERY = 1000  # rows between commits
+CATALOGED_STATUSES = ['placed']  # see manifest.STATUSES. Only files whose output exists
+
+
+class OutputCatalog:
+    """ Takes the same record_parsed, record_error and record_output calls as manifest.ManifestWriter and 
+    keeps one row per output with its source path, size and a column per DicomFileHandler.mapping key, 
+    each with its own index. Values are the cleaned values used in the output names. Files skipped by a 
+    FileIndex or a journal are not read again, so their rows from the earlier run are left as they are. 
+    Files waiting for their output are kept in a temporary table rather than in memory. 
+    Thread safe. Use as a context manager.
+    """
+
+    def __init__(self, catalog_path=''):
+        self.catalog_path = catalog_path
+        self.headers = list(DicomFileHandler.mapping.keys())
+        self.conn = None
+        self._lock = threading.Lock()
+        self._uncommitted = 0
+
+
+    def __enter__(self):
+        self.open()
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def open(self):
+        """ connect to the catalog, creating it or adding columns for new mapping keys as needed 
+        """
+        self.conn = sqlite3.connect(self.catalog_path, check_same_thread=False)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS outputs (output_path TEXT PRIMARY KEY, source_path TEXT NOT NULL, '
+            'size INTEGER)')
+        columns = {row[1] for row in self.conn.execute('PRAGMA table_info(outputs)')}
+        for h in self.headers:
+            if h not in columns:
+                self.conn.execute('ALTER TABLE outputs ADD COLUMN "{}" TEXT'.format(h))
+            self.conn.execute('CREATE INDEX IF NOT EXISTS "outputs_{0}" ON outputs ("{0}")'.format(h))
+        # source_path -> size and header values until the output is known. Dropped when the connection closes 
+        self.conn.execute('CREATE TEMP TABLE IF NOT EXISTS parsed (source_path TEXT PRIMARY KEY, size INTEGER, {})'.format(
+            ', '.join('"{}" TEXT'.format(h) for h in self.headers)))
+        self.conn.commit()
+        return self
+
+
+    def close(self):
+        """ commit and close the connection
+        """
+        if self.conn is not None:
+            with self._lock:
+                self.conn.commit()
+                self.conn.close()
+                self.conn = None
+
+
+    def commit(self):
+        """ make the rows recorded so far visible to other connections 
+        """
+        with self._lock:
+            self.conn.commit()
+            self._uncommitted = 0
+
+
+    def _columns(self):
+        return ', '.join('"{}"'.format(h) for h in self.headers)
+
+
+    def _counted(self):
+        self._uncommitted += 1
+        if self._uncommitted >= COMMIT_EVERY:
+            self.conn.commit()
+            self._uncommitted = 0
+
+
+    def record_parsed(self, filepath='', details=None):
+        """ keep the size and header values of a file until its output is known 
+        :param dict details: size and header name -> value 
+        """
+        if not details:
+            return
+        with self._lock:
+            self.conn.execute('INSERT OR REPLACE INTO parsed (source_path, size, {}) VALUES ({})'.format(
+                self._columns(), ', '.join('?' * (len(self.headers) + 2))),
+                [str(filepath), details.get('size')] + [details.get(h) for h in self.headers])
+            self._counted()
+
+
+    def record_error(self, filepath='', status='invalid', error=None, details=None):
+        """ files that could not be sorted have no output so they are not cataloged 
+        """
+        with self._lock:
+            self.conn.execute('DELETE FROM parsed WHERE source_path = ?', (str(filepath),))
+
+
+    def record_output(self, filepath='', output_path='', status='placed', bytes_saved=None):
+        """ store the row of a file once its new name is known 
+        """
+        with self._lock:
+            row = self.conn.execute('SELECT size, {} FROM parsed WHERE source_path = ?'.format(self._columns()), 
+                (str(filepath),)).fetchone()
+            if row is None:
+                return
+            self.conn.execute('DELETE FROM parsed WHERE source_path = ?', (str(filepath),))
+            if status not in CATALOGED_STATUSES:
+                return
+            self.conn.execute('INSERT OR REPLACE INTO outputs (output_path, source_path, size, {}) VALUES ({})'.format(
+                self._columns(), ', '.join('?' * (len(self.headers) + 3))), [output_path, str(filepath)] + list(row))
+            self._counted()
+
+
+    def _where(self, date_from=None, date_to=None, values=None):
+        clauses, params = [], []
+        for h, value in (values or {}).items():
+            if h.lower() not in self.headers:
+                raise ValueError('Invalid dicom mapping name. Use list_header_mappings to get key names.')
+            if isinstance(value, (list, tuple, set, frozenset)):
+                clauses.append('"{}" IN ({})'.format(h.lower(), ', '.join('?' * len(value))))
+                params.extend(value)
+            else:
+                clauses.append('"{}" = ?'.format(h.lower()))
+                params.append(value)
+        if date_from is not None:
+            clauses.append('date >= ?')
+            params.append(date_from)
+        if date_to is not None:
+            clauses.append('date <= ?')
+            params.append(date_to)
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+
+    def query(self, date_from=None, date_to=None, **values):
+        """ find the outputs whose header values match, eg. query(mrn='TCGA-AO-A0JB', view=['CC', 'MLO']) 
+
+        :param str date_from: Only dates on or after this YYYYMMDD date 
+        :param str date_to: Only dates on or before this YYYYMMDD date 
+        :param values: header name -> value, or a list of values any of which may match 
+        :returns: output paths relative to the output dir, sorted 
+        :rtype: list 
+        :raise: ValueError for a header name that isn't in the mapping 
+        """
+        where, params = self._where(date_from, date_to, values)
+        with self._lock:
+            rows = self.conn.execute('SELECT output_path FROM outputs{} ORDER BY output_path'.format(where), params)
+            return [row[0] for row in rows]
+
+
+    def lookup(self, output_path=''):
+        """ the catalog row of one output 
+        :returns: a dict with output_path, source_path, size and a key per header, or None if it isn't cataloged 
+        :rtype: dict 
+        """
+        with self._lock:
+            cursor = self.conn.execute('SELECT * FROM outputs WHERE output_path = ?', (output_path,))
+            row = cursor.fetchone()
+            return dict(zip([c[0] for c in cursor.description], row)) if row is not None else None
+
+
+def query_catalog(catalog_path='', date_from=None, date_to=None, **values):
+    """ open a catalog written by sortdicom(catalog_path=...) and run one OutputCatalog.query on it 
+    """
+    if not os.path.exists(catalog_path):
+        raise IOError('No catalog at {}'.format(catalog_path))
+    with OutputCatalog(catalog_path) as catalog:
+        return catalog.query(date_from, date_to, **values)
@@ -0,0 +1,148 @@
+""" The sortdicom command line. plan parses the headers under a root dir and writes a placement plan, 
+execute places the files of a plan, possibly on another node. pydicom and the processor are only 
+imported once a command runs so that --help and bad arguments come back straight away.
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+
+import click
+
+from . import __version__
+from .metrics import Metrics
+from .placement import PLACEMENT_STRATEGIES
+
+PROGRESS_INTERVAL = 0.5  # seconds between progress line updates
+TRANSCODE_PLACEMENTS = ['deflate', 'rle']  # transcode.TRANSFER_SYNTAXES, which would import pydicom
+
+
+class _Progress:
+    """ Rewrites a files/sec and MB/sec line on stderr from the counters of a metrics.Metrics while a command 
+    runs. Use as a context manager. 
+    """
+
+    def __init__(self, metrics=None, files='', bytes_='', verb='', enabled=True, interval=PROGRESS_INTERVAL):
+        self.metrics = metrics
+        self.files = files
+        self.bytes_ = bytes_
+        self.verb = verb
+        self.enabled = enabled
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._start = None
+
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        if self.enabled:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if exc_type is None:
+            click.echo(('\r' if self.enabled else '') + self.line(), err=True)
+
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            click.echo('\r' + self.line(), err=True, nl=False)
+
+
+    def line(self):
+        elapsed = max(time.perf_counter() - self._start, 1e-9)
+        files = self.metrics.counters[self.files]
+        megabytes = self.metrics.counters[self.bytes_] / 1e6
+        return '{} {} files ({:.1f} MB) in {:.1f}s   {:.0f} files/sec   {:.1f} MB/sec'.format(
+            self.verb, files, megabytes, elapsed, files / elapsed, megabytes / elapsed)
+
+
+def _show_progress(progress=None):
+    return sys.stderr.isatty() if progress is None else progress
+
+
+@click.group()
+@click.version_option(__version__)
+@click.option('-v', '--verbose', count=True, help='Log warnings, or everything with -vv')
+def main(verbose=0):
+    """ Sort dicom files into an output dir by their header values. Run plan to parse the headers and write
+    a plan, review it, then run execute to place the files.
+    """
+    level = {0: logging.ERROR, 1: logging.WARNING}.get(verbose, logging.INFO)
+    logging.basicConfig(level=level, format='%(levelname)s %(name)s: %(message)s')
+
+
+@main.command()
+@click.argument('root_dir', type=click.Path(exists=True, file_okay=False))
+@click.argument('plan_path', type=click.Path(dir_okay=False, writable=True))
+@click.option('-w', '--workers', default=1, show_default=True, help='Header extraction workers')
+@click.option('--executor', type=click.Choice(['thread', 'process']), default='thread', show_default=True, 
+    help='thread for slow or network storage, process for fast local disks')
+@click.option('--layout', default=None, help='Output path template, eg. "{mrn}/{date}/{laterality}_{view}.dcm"')
+@click.option('--include', multiple=True, help='Glob for dicom file names. Repeatable. Defaults to *.dcm')
+@click.option('--exclude', multiple=True, help='Glob for file names to skip. Repeatable')
+@click.option('--exclude-dir', 'exclude_dirs', multiple=True, help='Glob for directory names to skip. Repeatable')
+@click.option('--magic', is_flag=True, help='Also pick up files with the DICM magic that include misses')
+@click.option('--skip-invalid', is_flag=True, help='Log and skip files pydicom can not read instead of failing')
+@click.option('--pydicom', 'use_pydicom', is_flag=True, help='Read every header with pydicom instead of the fast scanner')
+@click.option('--io-schedule', is_flag=True, help='Order reads by their place on disk, for spinning disks')
+@click.option('--progress/--no-progress', default=None, help='Show a progress line. Defaults to on for a terminal')
+def plan(root_dir, plan_path, workers=1, executor='thread', layout=None, include=(), exclude=(), exclude_dirs=(), 
+        magic=False, skip_invalid=False, use_pydicom=False, io_schedule=False, progress=None):
+    """ Parse the headers under ROOT_DIR and write a placement plan to PLAN_PATH. The plan is json lines of
+    [source path, new name] that execute places.
+    """
+    from . import processor  # imports pydicom
+    from .layout import OutputLayout
+    from pydicom.errors import InvalidDicomError
+
+    if layout is not None:
+        try:
+            layout = OutputLayout(layout)
+        except ValueError as err:
+            raise click.BadParameter(str(err), param_hint="'--layout'")
+    metrics = Metrics()
+    try:
+        with _Progress(metrics, 'files_parsed', 'bytes_parsed', 'Planned', _show_progress(progress)):
+            processor.plan_sortdicom(os.path.abspath(root_dir), plan_path, raise_on_read_error=not skip_invalid, 
+                workers=workers, executor=executor, layout=layout, include=list(include) or None, 
+                exclude=list(exclude) or None, exclude_dirs=list(exclude_dirs) or None, magic=magic, 
+                fast_scan=not use_pydicom, io_schedule=io_schedule, metrics=metrics, compact=True)
+    except InvalidDicomError as err:
+        raise click.ClickException('{}. Use --skip-invalid to skip files that are not dicom'.format(err))
+    except (ValueError, OSError) as err:
+        raise click.ClickException(str(err))
+
+
+@main.command()
+@click.argument('plan_path', type=click.Path(exists=True, dir_okay=False))
+@click.argument('output_dir', type=click.Path(file_okay=False))
+@click.option('-w', '--workers', default=4, show_default=True, help='Placement threads, or processes when transcoding')
+@click.option('--placement', type=click.Choice(list(PLACEMENT_STRATEGIES) + TRANSCODE_PLACEMENTS), default='copy', 
+    show_default=True, help='How files are placed. deflate and rle transcode them')
+@click.option('--root-dir', type=click.Path(exists=True, file_okay=False), default=None, 
+    help='Read the sources from here instead of the root dir the plan was written for')
+@click.option('--shard', type=int, default=None, help='Only place the files of this shard of a merged manifest')
+@click.option('--progress/--no-progress', default=None, help='Show a progress line. Defaults to on for a terminal')
+def execute(plan_path, output_dir, workers=4, placement='copy', root_dir=None, shard=None, progress=None):
+    """ Place the files of the plan at PLAN_PATH in OUTPUT_DIR. Also takes a manifest from merge_manifests.
+    """
+    from . import processor  # imports pydicom
+    from pydicom.errors import InvalidDicomError
+
+    metrics = Metrics()
+    try:
+        with _Progress(metrics, 'files_placed', 'bytes_placed', 'Placed', _show_progress(progress)):
+            processor.place_manifest(plan_path, output_dir, shard=shard, placement=placement, 
+                placement_workers=workers, metrics=metrics, root_dir=root_dir and os.path.abspath(root_dir))
+    except (ValueError, OSError, InvalidDicomError) as err:
+        raise click.ClickException(str(err))
+
@@ -0,0 +1,178 @@
+""" A compact, read only mapping of source filepath -> new name for runs with millions of files. Instead of
+two python strings per file in an OrderedDict, source paths are stored as an index into a table of shared
+directories plus their basename in a byte buffer, and new names are split on / and _ into components
+that are interned once and stored as indices. Everything per file lives in arrays, which start out with
+16 bit items and are widened only once a value no longer fits.
+"""
+
+import os
+import re
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping, ItemsView, ValuesView
+
+_SEPARATORS = re.compile(r'([/_])')
+_WIDER = {'H': ('I', 1 << 16), 'I': ('Q', 1 << 32)}  # typecode -> (next typecode, first value that doesn't fit)
+
+
+def _fit(arr, value=0):
+    """ return arr, or a copy with a wider typecode if value doesn't fit in it 
+    """
+    while arr.typecode in _WIDER and value >= _WIDER[arr.typecode][1]:
+        arr = array(_WIDER[arr.typecode][0], arr)
+    return arr
+
+
+class _Interned:
+    """ a table of distinct strings, each with a stable integer id 
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.values = []
+
+
+    def __len__(self):
+        return len(self.values)
+
+
+    def add(self, value=''):
+        i = self.ids.get(value)
+        if i is None:
+            i = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return i
+
+
+class _ItemsView(ItemsView):
+
+    def __iter__(self):
+        return self._mapping._iter_items()
+
+
+class _ValuesView(ValuesView):
+
+    def __iter__(self):
+        return (v for k, v in self._mapping._iter_items())
+
+
+class CompactPathMap(Mapping):
+    """ An insertion ordered mapping of filepath -> new name with a much smaller footprint than an OrderedDict. 
+    Entries are appended with __setitem__ or update and each key can only be set once. Iterating is cheap. 
+    The first lookup by key builds a sorted hash index over all keys, which is rebuilt after new entries 
+    are added. 
+    """
+
+    def __init__(self, items=None):
+        self._dirs = _Interned()
+        self._key_dirs = array('H')
+        self._basenames = bytearray()
+        self._basename_ends = array('H')
+        self._fields = _Interned()
+        self._shapes = _Interned()       # the separators between the fields of a name, eg. ___ 
+        self._value_fields = array('H')
+        self._value_ends = array('H')
+        self._value_shapes = array('H')
+        self._index = None
+        if items is not None:
+            self.update(items)
+
+
+    def __len__(self):
+        return len(self._key_dirs)
+
+
+    def __setitem__(self, key='', value=''):
+        head, sep, tail = str(key).rpartition(os.sep)
+        self._append('_key_dirs', self._dirs.add(head + sep))
+        self._basenames += tail.encode('utf-8', 'surrogateescape')
+        self._append('_basename_ends', len(self._basenames))
+
+        parts = _SEPARATORS.split(value)
+        ids = [self._fields.add(p) for p in parts[0::2]]
+        self._value_fields = _fit(self._value_fields, len(self._fields))
+        self._value_fields.extend(ids)
+        self._append('_value_ends', len(self._value_fields))
+        self._append('_value_shapes', self._shapes.add(''.join(parts[1::2])))
+        self._index = None
+
+
+    def _append(self, name='', value=0):
+        arr = _fit(getattr(self, name), value)
+        arr.append(value)
+        setattr(self, name, arr)
+
+
+    def update(self, items=()):
+        if isinstance(items, Mapping):
+            items = items.items()
+        for k, v in items:
+            self[k] = v
+
+
+    def _key(self, i=0):
+        start = self._basename_ends[i - 1] if i else 0
+        basename = self._basenames[start:self._basename_ends[i]].decode('utf-8', 'surrogateescape')
+        return self._dirs.values[self._key_dirs[i]] + basename
+
+
+    def _value(self, i=0):
+        start = self._value_ends[i - 1] if i else 0
+        fields = self._fields.values
+        ids = self._value_fields[start:self._value_ends[i]]
+        seps = self._shapes.values[self._value_shapes[i]]
+        value = fields[ids[0]]
+        for sep, field_id in zip(seps, ids[1:]):
+            value += sep + fields[field_id]
+        return value
+
+
+    def _iter_items(self):
+        for i in range(len(self)):
+            yield self._key(i), self._value(i)
+
+
+    def __iter__(self):
+        return (self._key(i) for i in range(len(self)))
+
+
+    def items(self):
+        return _ItemsView(self)
+
+
+    def values(self):
+        return _ValuesView(self)
+
+
+    def _build_index(self):
+        hashes = [hash(k) for k in self]
+        order = sorted(range(len(hashes)), key=hashes.__getitem__)
+        self._index = (array('q', (hashes[i] for i in order)), array('Q', order))
+
+
+    def _find(self, key=''):
+        if self._index is None:
+            self._build_index()
+        hashes, order = self._index
+        h = hash(key)
+        i = bisect_left(hashes, h)
+        while i < len(hashes) and hashes[i] == h:
+            if self._key(order[i]) == key:
+                return order[i]
+            i += 1
+        return None
+
+
+    def __getitem__(self, key=''):
+        i = self._find(str(key))
+        if i is None:
+            raise KeyError(key)
+        return self._value(i)
+
+
+    def __contains__(self, key):
+        return self._find(str(key)) is not None
+
+
+    def __repr__(self):
+        return '{}({} files)'.format(type(self).__name__, len(self))
@@ -0,0 +1,120 @@
+""" Finds byte identical dicom files so each payload is only placed once. Identical files always have the
+same uid, so only files with the same uid and the same size are hashed, and hashing runs on a thread pool
+while headers are still being parsed.
+"""
+
+import os
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+import logging
+l = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1 << 20
+
+
+def hash_file(filepath=''):
+    """ streaming blake2b digest of a file
+    :param str filepath: The file to hash
+    :returns: the hex digest
+    :rtype: str
+    """
+    h = hashlib.blake2b(digest_size=16)
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class Deduplicator:
+    """ Tracks parsed files by (uid, size) and hashes a file only once a second file with the same key shows
+    up. The first file seen with a given payload is the canonical copy and every later identical file is an
+    alias of it. Use as a context manager.
+    """
+
+    def __init__(self, workers=4):
+        self.workers = workers
+        self._pool = None
+        self._groups = {}  # (uid, size) -> filepaths in arrival order
+        self._keys = {}    # filepath -> (uid, size)
+        self._hashes = {}  # filepath -> future digest
+
+
+    def __enter__(self):
+        self.open()
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def open(self):
+        """ start the hashing pool
+        """
+        self._pool = ThreadPoolExecutor(max_workers=self.workers)
+        return self
+
+
+    def close(self):
+        """ wait for outstanding hashes and stop the pool
+        """
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+
+    def _hash(self, filepath=''):
+        if filepath not in self._hashes:
+            self._hashes[filepath] = self._pool.submit(hash_file, filepath)
+        return self._hashes[filepath]
+
+
+    def add(self, filepath='', uid_filename=''):
+        """ register a parsed file. Starts hashing in the background if its size collides with another
+        file that has the same uid.
+        """
+        key = (uid_filename, os.stat(filepath).st_size)
+        self._keys[filepath] = key
+        group = self._groups.setdefault(key, [])
+        group.append(filepath)
+        if len(group) > 1:
+            self._hash(group[0])
+            self._hash(filepath)
+
+
+    def alias_of(self, filepath=''):
+        """ return the canonical filepath that this file is a byte identical copy of, or None if it is
+        the first file with its payload. Blocks until the hashes it needs are done.
+        """
+        group = self._groups[self._keys[filepath]]
+        if group[0] == filepath:
+            return None
+        digest = self._hash(filepath).result()
+        for other in group:
+            if other == filepath:
+                return None
+            if self._hash(other).result() == digest:
+                return other
+        return None
+
+
+    def iter_added(self, uids):
+        """ pass through (filepath, uid) pairs while registering each one
+        """
+        for f, uid_filename in uids:
+            self.add(f, uid_filename)
+            yield f, uid_filename
+
+
+    def iter_unique(self, uids, aliases):
+        """ pass through (filepath, uid) pairs that are not aliases. Aliases are stored in the aliases
+        dict as alias -> canonical filepath instead.
+        """
+        for f, uid_filename in uids:
+            canonical = self.alias_of(f)
+            if canonical is not None:
+                l.info('Identical payload: {} is a copy of {}'.format(f, canonical))
+                aliases[f] = canonical
+                continue
+            yield f, uid_filename
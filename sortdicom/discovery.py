@@ -0,0 +1,82 @@
+""" Finds dicom files under a root directory. Uses os.scandir so that file type checks come from the
+directory entry itself instead of an extra stat per file.
+"""
+
+import os
+import re
+import fnmatch
+
+import logging
+l = logging.getLogger(__name__)
+
+DEFAULT_INCLUDE = ['*.dcm']
+DICOM_PREAMBLE_LENGTH = 128
+DICOM_MAGIC = b'DICM'
+
+
+def _compile_patterns(patterns=None):
+    """ combine a list of glob patterns into a single case insensitive regex. Returns None if there
+    are no patterns
+    """
+    if not patterns:
+        return None
+    return re.compile('|'.join(fnmatch.translate(p) for p in patterns), re.IGNORECASE)
+
+
+def has_dicom_magic(filepath=''):
+    """ check for the 128 byte preamble followed by the DICM prefix of a dicom part 10 file
+    :param str filepath: The filepath to check
+    :returns: True if the file has the magic bytes
+    :rtype: bool
+    """
+    try:
+        with open(filepath, 'rb') as f:
+            f.seek(DICOM_PREAMBLE_LENGTH)
+            return f.read(len(DICOM_MAGIC)) == DICOM_MAGIC
+    except OSError:
+        return False
+
+
+def iter_dicom_filepaths(root_dir='', include=None, exclude=None, exclude_dirs=None, magic=False):
+    """ Walks a root directory top down and yields dicom filepaths as soon as they are found. Entries in
+    each directory are visited in sorted order so the output is deterministic.
+
+    :param str root_dir: The directory to walk
+    :param list include: glob patterns for file names to include. Defaults to ["*.dcm"]. Matching is case insensitive
+    :param list exclude: glob patterns for file names to skip even if they match include
+    :param list exclude_dirs: glob patterns for directory names that are not descended into
+    :param bool magic: If True also yield files that do not match include but have the dicom preamble and
+        DICM magic. Useful for extensionless exports.
+    :returns: a generator of filepaths
+    """
+    include = _compile_patterns(DEFAULT_INCLUDE if include is None else include)
+    exclude = _compile_patterns(exclude)
+    exclude_dirs = _compile_patterns(exclude_dirs)
+
+    stack = [os.fspath(root_dir)]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError as err:
+            l.warning('Could not read directory {} -> skipping. ({})'.format(current, err))
+            continue
+
+        subdirs = []
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                continue
+            if is_dir:
+                if entry.is_symlink() or (exclude_dirs and exclude_dirs.match(entry.name)):
+                    continue
+                subdirs.append(entry.path)
+                continue
+            if exclude and exclude.match(entry.name):
+                continue
+            if (include and include.match(entry.name)) or (magic and has_dicom_magic(entry.path)):
+                yield entry.path
+
+        stack.extend(reversed(subdirs))  # so the first subdir is walked next
@@ -1,8 +1,23 @@
+import io
 import pydicom  
 
+from .scanner import scan_tags, scan_buffer, UnsupportedDicomError
+
 import logging 
 l = logging.getLogger(__name__)
 
+# replaces whitespace and bad chars with - or . and drops the rest 
+CLEAN_TABLE = str.maketrans({
+    ' ': '-', 
+    '/': '-', 
+    '(': None, 
+    ')': None, 
+    '*': None, 
+    '&': None, 
+    '$': None, 
+    ':': '.', 
+})
+
 
 class DicomFileHandler:
     """ Reads in an instance of Dicom file and extracts metadata.  
@@ -27,23 +42,35 @@ class DicomFileHandler:
     def _clean_tag(self, tag=''): 
         """ clean up the tag by replacing some whitespace and bad chars with _ or blanks
         """
-        return tag.replace(' ', '-') \
-            .replace('/','-') \
-            .replace('(','') \
-            .replace(')','') \
-            .replace('*', '') \
-            .replace('&', '') \
-            .replace('$', '') \
-            .replace(':', '.')
+        return tag.translate(CLEAN_TABLE)
         
     
-    def load(self, filepath=''):
+    def list_header_tags(self, headers=None):
+        """ return a flat list of every tag referenced by the given mapping keys. Used to tell 
+        pydicom which elements to materialize when only reading the header.
+        :param list headers: mapping key names. Defaults to all keys in the mapping 
+        :return: a list of (group, element) tuples 
+        :rtype: list 
+        """
+        if not headers:
+            headers = self.list_header_mappings()
+        return [h for name in headers for h in self.mapping[name.lower()]]
+
+
+    def load(self, filepath='', header_only=False, headers=None):
         """ trys to load a dicom file given an absolute path and sets in on the instance
         :param str filepath: The filepath to the dicom header
+        :param bool header_only: If True stop reading before the pixel data and only keep the tags 
+            listed in the mapping. Avoids reading and decoding large image payloads.
+        :param list headers: mapping key names to keep when header_only is set. Defaults to all 
         :raise: IOError if invalid path  
         """
         try: 
-            self.ds = pydicom.dcmread(filepath)
+            if header_only:
+                self.ds = pydicom.dcmread(filepath, stop_before_pixels=True, 
+                    specific_tags=self.list_header_tags(headers))
+            else:
+                self.ds = pydicom.dcmread(filepath)
             self.filepath = filepath
         except IOError as err:
             l.error('Invalid filepath. Double check the path you entered for {}'.format(filepath))
@@ -86,3 +113,121 @@ class DicomFileHandler:
                 l.warn('Could not find tag for {} -> skipping this tag.'.format(h))
                 
         return self._clean_tag(tag)
+
+
+
+class ExtractionPlan:
+    """ A compiled version of DicomFileHandler for building the uid of many files. The requested headers 
+    are validated and resolved to their tags once, so applying the plan to a dataset is a single pass 
+    over a fixed list of tags with no per file lookups or logging. If fast_scan is set header only loads 
+    try the scanner module first and only fall back to pydicom for files it can't handle. 
+    """
+
+    suffix = '.dcm'
+
+    def __init__(self, headers=None, mapping=None, fast_scan=True):
+        mapping = mapping or DicomFileHandler.mapping
+        headers = [h.lower() for h in headers] if headers else list(mapping.keys())
+        for h in headers:
+            if h not in mapping:
+                raise ValueError('Invalid dicom mapping name. Use list_header_mappings to get key names.')
+
+        self.headers = tuple(headers)
+        self.tag_groups = tuple(tuple(mapping[h]) for h in headers)
+        self.tags = [t for group in self.tag_groups for t in group]
+        self.fast_scan = fast_scan
+
+
+    def load(self, filepath='', header_only=True):
+        """ read a dicom file. If header_only only the tags in this plan are materialized and pixel data is skipped. 
+        The result is either a pydicom dataset or a dict of tag -> scanner.ScannedElement, both of which apply takes.
+        :param str filepath: The filepath to the dicom file 
+        :returns: the dataset 
+        :raise: IOError if invalid path 
+        """
+        if header_only and self.fast_scan:
+            try:
+                return scan_tags(filepath, self.tags)
+            except UnsupportedDicomError as err:
+                l.debug('Falling back to pydicom for {} ({})'.format(filepath, err))
+        try:
+            if header_only:
+                return pydicom.dcmread(filepath, stop_before_pixels=True, specific_tags=self.tags)
+            return pydicom.dcmread(filepath)
+        except IOError:
+            l.error('Invalid filepath. Double check the path you entered for {}'.format(filepath))
+            raise
+
+
+    def load_bytes(self, data=b'', header_only=True, name='', truncated=False):
+        """ same as load for the contents of a dicom file that is already in memory, such as an archive member 
+        :param bytes data: The file contents 
+        :param str name: Only used for logging 
+        :param bool truncated: data is only the start of the file. If the scanner can't read it, or the whole 
+            file is wanted, UnsupportedDicomError is raised so the caller can use load_fileobj instead 
+        :returns: the dataset 
+        """
+        if header_only and self.fast_scan:
+            try:
+                return scan_buffer(data, self.tags, truncated)
+            except UnsupportedDicomError as err:
+                if truncated:
+                    raise
+                l.debug('Falling back to pydicom for {} ({})'.format(name, err))
+        if truncated:
+            raise UnsupportedDicomError('only the start of {} is in memory'.format(name))
+        if header_only:
+            return pydicom.dcmread(io.BytesIO(data), stop_before_pixels=True, specific_tags=self.tags)
+        return pydicom.dcmread(io.BytesIO(data))
+
+
+    def load_fileobj(self, fileobj=None, header_only=True):
+        """ same as load for an open binary file object, such as an archive member. Only pydicom is used and 
+        with header_only it stops before the pixel data 
+        :returns: the dataset 
+        """
+        if header_only:
+            return pydicom.dcmread(fileobj, stop_before_pixels=True, specific_tags=self.tags)
+        return pydicom.dcmread(fileobj)
+
+
+    def values(self, ds):
+        """ the cleaned value of each header in this plan, taking the first tag in its group that has one 
+        :returns: header name -> value, or an empty string if none of its tags were found 
+        :rtype: dict 
+        """
+        values = {}
+        for h, group in zip(self.headers, self.tag_groups):
+            values[h] = ''
+            for t in group:
+                try:
+                    val = str(ds[t].value)
+                except KeyError:
+                    continue
+                if val:
+                    values[h] = val.translate(CLEAN_TABLE)
+                    break
+        return values
+
+
+    def apply(self, ds):
+        """ build the uid for a dataset. Tags are joined with _ in the same way as 
+        processor._build_dicom_unique_identifier always has, without the .dcm suffix. 
+        :returns: the uid or an empty string if no tags were found 
+        :rtype: str 
+        """
+        uid = ''
+        last = len(self.tag_groups) - 1
+        for i, group in enumerate(self.tag_groups):
+            for h in group:
+                try:
+                    val = str(ds[h].value)
+                except KeyError:
+                    continue
+                if val:
+                    uid += val.translate(CLEAN_TABLE)
+                    break
+            if i < last and uid != '':
+                uid += '_'
+        return uid
+
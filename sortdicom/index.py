@@ -0,0 +1,169 @@
+""" A persistent sqlite index of source dicom files. Lets repeated runs over a growing archive skip
+files that have not changed since the last run and keeps duplicate numbering stable between runs.
+"""
+
+import os
+import sqlite3
+
+from .labeling import parse_label
+
+import logging
+l = logging.getLogger(__name__)
+
+COMMIT_EVERY = 1000  # rows between commits
+INDEX_NAME = '.sortdicom.index'
+
+
+class FileIndex:
+    """ Caches the extracted uid and assigned output name for each source file keyed by its path. A file
+    is considered unchanged if its size, mtime and inode match the last run. The output names depend on the 
+    layout.OutputLayout, so the index remembers the layout it was built with and forgets every file when a 
+    run uses another one. Use as a context manager.
+    """
+
+    _schema = """
+        CREATE TABLE IF NOT EXISTS files (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            inode INTEGER NOT NULL,
+            uid TEXT NOT NULL,
+            counter INTEGER NOT NULL,
+            output_name TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+    """
+
+    def __init__(self, index_path='', layout=None):
+        self.index_path = index_path
+        self.layout = layout
+        self.conn = None
+        self.counters = {}   # uid -> highest duplicate counter handed out so far
+        self.unchanged = []  # (path, output_name) for files skipped during this run
+        self._pending = {}   # path -> (stat key, cached row) for files waiting on a header parse
+        self._uncommitted = 0
+
+
+    def __enter__(self):
+        self.open()
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def open(self):
+        """ connect to the index and load the duplicate counters
+        """
+        self.conn = sqlite3.connect(self.index_path)
+        self.conn.executescript(self._schema)
+        self._check_layout()
+        self.counters = dict(self.conn.execute('SELECT uid, MAX(counter) FROM files GROUP BY uid'))
+        return self
+
+
+    def _check_layout(self):
+        """ forget every file if the cached output names were made with another layout, or with an unknown one 
+        by an index from before the layout was stored 
+        """
+        naming = {'layout': self.layout.template if self.layout is not None else '', 
+            'fanout': str(self.layout.fanout if self.layout is not None else 0)}
+        stored = dict(self.conn.execute('SELECT key, value FROM meta'))
+        if stored != naming and self.conn.execute('SELECT 1 FROM files LIMIT 1').fetchone() is not None:
+            l.warning('Index {} was built with another layout, every file will be parsed again'.format(self.index_path))
+            self.conn.execute('DELETE FROM files')
+        self.conn.executemany('INSERT OR REPLACE INTO meta VALUES (?, ?)', naming.items())
+        self.conn.commit()
+
+
+    def close(self):
+        """ commit and close the connection
+        """
+        if self.conn is not None:
+            self.conn.commit()
+            self.conn.close()
+            self.conn = None
+
+
+    def seed_counters(self, names):
+        """ make sure new duplicate counters continue after the counters of existing output names, such as the 
+        files already in an output dir that were placed without this index 
+        :param names: labeled names relative to the output dir 
+        """
+        for name in names:
+            parsed = parse_label(name)
+            if parsed is not None and parsed[1] > self.counters.get(parsed[0], 0):
+                self.counters[parsed[0]] = parsed[1]
+
+
+    def commit(self):
+        """ commit and start a new run. Files that were never recorded, eg. because they could not be read, 
+        are forgotten along with the unchanged files of the last run 
+        """
+        self.conn.commit()
+        self._uncommitted = 0
+        self._pending = {}
+        self.unchanged = []
+
+
+    def _stat_key(self, filepath=''):
+        st = os.stat(filepath)
+        return st.st_size, st.st_mtime_ns, st.st_ino
+
+
+    def iter_changed(self, filepaths):
+        """ yields only the filepaths that are new or changed since the last run. Unchanged files are
+        collected on self.unchanged with their previously assigned output name. Files that can no longer be 
+        stat'ed, eg. because they were removed, are logged and skipped.
+        """
+        for f in filepaths:
+            try:
+                key = self._stat_key(f)
+            except OSError as err:
+                l.error('Skipping file that can not be read: {}'.format(err))
+                continue
+            row = self.conn.execute(
+                'SELECT size, mtime_ns, inode, uid, counter, output_name FROM files WHERE path = ?', (str(f),)).fetchone()
+            if row is not None and tuple(row[:3]) == key:
+                self.unchanged.append((f, row[5]))
+                continue
+            self._pending[f] = (key, row)
+            yield f
+
+
+    def assign_counter(self, filepath='', uid_filename=''):
+        """ returns the duplicate counter for a file that was parsed this run. A changed file keeps its old
+        counter if its uid is the same, otherwise it gets the next counter for the uid. Existing outputs are
+        never renumbered.
+        """
+        key, row = self._pending[filepath]
+        if row is not None and row[3] == uid_filename:
+            return row[4]
+        counter = self.counters.get(uid_filename, 0) + 1
+        self.counters[uid_filename] = counter
+        return counter
+
+
+    def record(self, filepath='', uid_filename='', counter=1, output_name=''):
+        """ store the result for a parsed file
+        """
+        key, row = self._pending.pop(filepath)
+        self.conn.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (str(filepath),) + key + (uid_filename, counter, output_name))
+        self._uncommitted += 1
+        if self._uncommitted >= COMMIT_EVERY:
+            self.conn.commit()
+            self._uncommitted = 0
+
+
+    def record_alias(self, filepath='', canonical_filepath=''):
+        """ store a parsed file that is a byte identical copy of another file with the same result 
+        """
+        row = self.conn.execute(
+            'SELECT uid, counter, output_name FROM files WHERE path = ?', (str(canonical_filepath),)).fetchone()
+        self.record(filepath, *row)
+
@@ -0,0 +1,164 @@
+""" I/O scheduling for archives on spinning disks. Files are read in bounded windows, and within a window
+they are read in the order they sit on the device (by inode, or by the physical address of their first
+extent) instead of walk order. The kernel is told which header prefixes we are about to read so it can queue
+them up, and files we are done with are dropped from the page cache so a big run doesn't push out the
+cache of everything else on the node. Results are always handed back in their original order so
+scheduling never changes the outcome of a run.
+"""
+
+import os
+import struct
+import threading
+
+from .scanner import SCAN_BYTES
+
+import logging
+l = logging.getLogger(__name__)
+
+DEFAULT_WINDOW = 1024           # files reordered together
+DEFAULT_READS_PER_DEVICE = 8    # outstanding header reads per device
+HEADER_PREFIX = SCAN_BYTES      # bytes of each file we expect to read for the header
+
+FS_IOC_FIEMAP = 0xC020660B      # linux ioctl returning the physical extents of a file
+_FIEMAP = struct.Struct('QQIIII')        # fm_start, fm_length, fm_flags, fm_mapped_extents, fm_extent_count, fm_reserved
+_EXTENT = struct.Struct('QQQQQIIII')     # fe_logical, fe_physical, fe_length, reserved x2, fe_flags, reserved x3
+
+
+def _fadvise(filepath='', offset=0, length=0, advice=None):
+    """ posix_fadvise on a path. A no op where the platform doesn't have it. Returns False on failure
+    """
+    if advice is None or not hasattr(os, 'posix_fadvise'):
+        return False
+    try:
+        fd = os.open(filepath, os.O_RDONLY)
+    except OSError:
+        return False
+    try:
+        os.posix_fadvise(fd, offset, length, advice)
+        return True
+    except OSError:
+        return False
+    finally:
+        os.close(fd)
+
+
+def advise_willneed(filepath='', length=HEADER_PREFIX):
+    """ ask the kernel to start reading the header prefix of a file in the background 
+    """
+    return _fadvise(filepath, 0, length, getattr(os, 'POSIX_FADV_WILLNEED', None))
+
+
+def advise_dontneed(filepath=''):
+    """ drop the cached pages of a file we are done with. Dirty pages are only dropped once written back 
+    """
+    return _fadvise(filepath, 0, 0, getattr(os, 'POSIX_FADV_DONTNEED', None))
+
+
+def first_extent(filepath=''):
+    """ the physical byte address of the first extent of a file, or None if the filesystem can't tell us 
+    """
+    try:
+        import fcntl  # not available on windows
+        buf = bytearray(_FIEMAP.size + _EXTENT.size)
+        _FIEMAP.pack_into(buf, 0, 0, 0xFFFFFFFFFFFFFFFF, 0, 0, 1, 0)
+        with open(filepath, 'rb') as f:
+            fcntl.ioctl(f.fileno(), FS_IOC_FIEMAP, buf)
+    except (ImportError, OSError):
+        return None
+    if _FIEMAP.unpack_from(buf)[3] == 0:
+        return None  # empty or inline file
+    return _EXTENT.unpack_from(buf, _FIEMAP.size)[1]
+
+
+class IOScheduler:
+    """ Orders and throttles reads of many files. Pass one to sortdicom with io_schedule. 
+
+    :param int window: The number of files that are reordered together. Bigger windows mean fewer seeks but more 
+        files in flight 
+    :param int reads_per_device: The most reads in flight on one device at a time. Header reads and the copies or 
+        transcodes of a placement share the cap, counted against the device of the source file 
+    :param bool extent: Order by the physical address of each file's first extent (linux FIEMAP) rather than by 
+        inode. Falls back to the inode for filesystems that don't support it 
+    :param bool prefetch: Tell the kernel about the header reads of a window before they happen 
+    :param bool drop_cache: Drop files from the page cache once we are done with them 
+    """
+
+    def __init__(self, window=DEFAULT_WINDOW, reads_per_device=DEFAULT_READS_PER_DEVICE, extent=False, prefetch=True, 
+            drop_cache=True):
+        self.window = window
+        self.reads_per_device = reads_per_device
+        self.extent = extent
+        self.prefetch = prefetch
+        self.drop_cache = drop_cache
+        self._devices = {}  # st_dev -> semaphore
+        self._lock = threading.Lock()
+
+
+    def physical_key(self, filepath=''):
+        """ (device, position) used to sort files. Files that can't be stat'd go last 
+        """
+        try:
+            st = os.stat(filepath)
+        except OSError:
+            return (float('inf'), 0)
+        position = first_extent(filepath) if self.extent else None
+        return (st.st_dev, st.st_ino if position is None else position)
+
+
+    def iter_windows(self, items):
+        """ yields lists of up to window items in their original order 
+        """
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) >= self.window:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+    def order(self, filepaths, key=None):
+        """ sort one window of items by where their files sit on disk and issue the prefetch hints in that order. 
+        key picks the filepath out of an item. 
+        :returns: a list of (item, device) in the order to read them 
+        """
+        key = key or (lambda item: item)
+        keyed = sorted(((self.physical_key(key(item)), i, item) for i, item in enumerate(filepaths)), key=lambda t: t[:2])
+        if self.prefetch:
+            for (dev, position), i, item in keyed:
+                advise_willneed(key(item))
+        return [(item, dev) for (dev, position), i, item in keyed]
+
+
+    def device(self, filepath=''):
+        """ the device a file sits on, or None if it can't be stat'd 
+        """
+        try:
+            return os.stat(filepath).st_dev
+        except OSError:
+            return None
+
+
+    def _semaphore(self, dev=None):
+        with self._lock:
+            if dev not in self._devices:
+                self._devices[dev] = threading.BoundedSemaphore(self.reads_per_device)
+            return self._devices[dev]
+
+
+    def acquire(self, dev=None):
+        """ block until another read may start on dev 
+        """
+        self._semaphore(dev).acquire()
+
+
+    def release(self, dev=None):
+        self._semaphore(dev).release()
+
+
+    def done(self, filepath=''):
+        """ called once nothing else will read filepath 
+        """
+        if self.drop_cache:
+            advise_dontneed(filepath)
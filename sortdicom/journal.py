@@ -0,0 +1,102 @@
+""" A write-ahead journal for a sortdicom run. Records each parsed uid and each completed placement as one
+line so that an interrupted run can be resumed without parsing or placing those files again.
+"""
+
+import os
+import json
+import threading
+
+import logging
+l = logging.getLogger(__name__)
+
+JOURNAL_NAME = '.sortdicom.journal'
+FSYNC_EVERY = 1000  # records between fsyncs
+
+
+class PlacementJournal:
+    """ An append only journal of json lines. Each line is either ["parsed", filepath, uid] or
+    ["placed", filepath, new_name]. A partly written last line from a crash is ignored on load.
+    Use as a context manager.
+    """
+
+    def __init__(self, journal_path='', resume=False):
+        self.journal_path = journal_path
+        self.resume = resume
+        self.parsed = {}     # filepath -> uid
+        self.placed = set()  # (filepath, new_name)
+        self._file = None
+        self._lock = threading.Lock()
+        self._unsynced = 0
+
+
+    def __enter__(self):
+        self.open()
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def open(self):
+        """ load the existing journal if resuming, otherwise start a new one
+        """
+        if self.resume and os.path.exists(self.journal_path):
+            self._load()
+            l.info('Resuming from journal {}: {} parsed, {} placed'.format(
+                self.journal_path, len(self.parsed), len(self.placed)))
+            self._file = open(self.journal_path, 'a')
+        else:
+            self._file = open(self.journal_path, 'w')
+        return self
+
+
+    def close(self):
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+
+    def _load(self):
+        with open(self.journal_path) as f:
+            for line in f:
+                try:
+                    op, filepath, value = json.loads(line)
+                except ValueError:
+                    continue  # torn write at the end of the journal
+                if op == 'parsed':
+                    self.parsed[filepath] = value
+                elif op == 'placed':
+                    self.placed.add((filepath, value))
+
+
+    def _append(self, record):
+        with self._lock:
+            self._file.write(json.dumps(record) + '\n')
+            self._file.flush()
+            self._unsynced += 1
+            if self._unsynced >= FSYNC_EVERY:
+                os.fsync(self._file.fileno())
+                self._unsynced = 0
+
+
+    def record_parsed(self, filepath='', uid_filename=''):
+        """ record the uid of a parsed file unless it came from the journal
+        """
+        filepath = str(filepath)
+        if self.parsed.get(filepath) == uid_filename:
+            return
+        self.parsed[filepath] = uid_filename
+        self._append(['parsed', filepath, uid_filename])
+
+
+    def record_placed(self, filepath='', new_name=''):
+        """ record a completed placement. Safe to call from placement threads.
+        """
+        self._append(['placed', str(filepath), new_name])
+
+
+    def is_placed(self, filepath='', new_name=''):
+        return (str(filepath), new_name) in self.placed
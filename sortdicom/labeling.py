@@ -0,0 +1,116 @@
+""" Numbers files that share a uid with _1, _2, ... suffixes. Files are grouped by uid in a single pass and
+only the distinct uids are sorted. If there are more files than fit in the memory budget, sorted runs are
+spilled to temp files and merged back with an external sort.
+"""
+
+import os
+import json
+import heapq
+import tempfile
+from operator import itemgetter
+
+import logging
+l = logging.getLogger(__name__)
+
+DEFAULT_MAX_IN_MEMORY = 1000000  # entries held in memory before spilling a run to disk
+COMPACT_MAX_IN_MEMORY = 100000  # spill sooner when the caller asked for a compact result
+
+
+def label_duplicate(uid_filename='', counter=1):
+    """ append a duplicate counter to a uid filename. Only the last .dcm is replaced since the uid may be a 
+    path from a layout.OutputLayout 
+    """
+    return '_{}.dcm'.format(counter).join(uid_filename.rsplit('.dcm', 1))
+
+
+def parse_label(new_name=''):
+    """ split a labeled name back into its uid filename and duplicate counter 
+    :returns: (uid_filename, counter) or None if the name doesn't carry a counter 
+    """
+    head, dcm, tail = new_name.rpartition('.dcm')
+    stem, sep, counter = head.rpartition('_')
+    if not dcm or tail or not sep or not counter.isdigit():
+        return None
+    return stem + dcm, int(counter)
+
+
+class DuplicateLabeler:
+    """ Collects (filepath, uid) pairs and yields (filepath, new_name) pairs sorted by uid, with files that
+    share a uid numbered in the order they were added. This matches the stable sort that
+    processor._label_duplicates has always used. Iterate once after adding everything. Use as a context
+    manager so spilled runs are cleaned up.
+    """
+
+    def __init__(self, max_in_memory=DEFAULT_MAX_IN_MEMORY, tmp_dir=None):
+        self.max_in_memory = max_in_memory
+        self.tmp_dir = tmp_dir
+        self._groups = {}  # uid -> filepaths in arrival order
+        self._size = 0
+        self._seq = 0
+        self._runs = []    # paths of spilled runs
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def close(self):
+        """ remove any spilled runs
+        """
+        for run in self._runs:
+            if os.path.exists(run):
+                os.remove(run)
+        self._runs = []
+
+
+    def add(self, filepath='', uid_filename=''):
+        self._groups.setdefault(uid_filename, []).append((self._seq, filepath))
+        self._seq += 1
+        self._size += 1
+        if self._size >= self.max_in_memory:
+            self._spill()
+
+
+    def _iter_groups(self):
+        """ yields (uid, seq, filepath) for the in memory entries sorted by uid and arrival
+        """
+        for uid in sorted(self._groups):
+            for seq, filepath in self._groups[uid]:
+                yield uid, seq, filepath
+
+
+    def _spill(self):
+        fd, run = tempfile.mkstemp(prefix='sortdicom-labels-', suffix='.run', dir=self.tmp_dir)
+        l.info('Spilling {} labels to {}'.format(self._size, run))
+        with os.fdopen(fd, 'w') as f:
+            for record in self._iter_groups():
+                f.write(json.dumps(record) + '\n')
+        self._runs.append(run)
+        self._groups = {}
+        self._size = 0
+
+
+    def _iter_run(self, run=''):
+        with open(run) as f:
+            for line in f:
+                yield tuple(json.loads(line))
+
+
+    def __iter__(self):
+        if self._runs:
+            records = heapq.merge(self._iter_groups(), *[self._iter_run(r) for r in self._runs], key=itemgetter(0, 1))
+        else:
+            records = self._iter_groups()
+
+        current = None
+        counter = 0
+        for uid, seq, filepath in records:
+            if uid != current:
+                current = uid
+                counter = 0
+            counter += 1
+            yield filepath, label_duplicate(uid, counter)
@@ -0,0 +1,75 @@
+""" Templated output paths. Instead of one flat output dir with millions of entries, files can be laid out
+in a tree such as {mrn}/{date}/{laterality}_{view}.dcm built from the DicomFileHandler.mapping keys, with
+optional hash prefix directories on top to keep every directory small. Duplicates are numbered per
+rendered path, so numbering is scoped to each leaf directory.
+"""
+
+import string
+import hashlib
+import posixpath
+
+from .handler import DicomFileHandler, ExtractionPlan
+
+MISSING = 'unknown'   # used for a path component whose headers were not found
+FANOUT_WIDTH = 2      # hex characters per fan out directory, ie. 256 entries per level
+
+
+class OutputLayout:
+    """ A compiled path template. Fields are DicomFileHandler.mapping keys and may use format specs, 
+    eg. {date:.4} for the year. The .dcm suffix is added if the template doesn't end with it. If fanout > 0 
+    that many levels of hash prefix directories are put in front of the path. The prefix is a hash of 
+    the first path component so that everything under, say, one mrn stays together. 
+    """
+
+    def __init__(self, template='', fanout=0, mapping=None):
+        mapping = mapping or DicomFileHandler.mapping
+        if not template.endswith(ExtractionPlan.suffix):
+            template += ExtractionPlan.suffix
+        parts = template.split('/')
+        if template.startswith('/') or '' in parts or '.' in parts or '..' in parts:
+            raise ValueError('Layout template must be a relative path without empty, . or .. parts: {}'.format(template))
+        fields = [name for _, name, _, _ in string.Formatter().parse(template) if name is not None]
+        if not fields:
+            raise ValueError('Layout template has no fields: {}'.format(template))
+        for name in fields:
+            if name not in mapping:
+                raise ValueError('Invalid dicom mapping name {} in layout. Use list_header_mappings to get key names.'.format(name))
+        if fanout < 0:
+            raise ValueError('fanout must be 0 or more')
+
+        self.template = template
+        self.fanout = fanout
+        self.headers = tuple(dict.fromkeys(fields))
+
+
+    def __eq__(self, other):
+        return isinstance(other, OutputLayout) and (self.template, self.fanout) == (other.template, other.fanout)
+
+
+    def __hash__(self):
+        return hash((self.template, self.fanout))
+
+
+    def __repr__(self):
+        return 'OutputLayout({!r}, fanout={})'.format(self.template, self.fanout)
+
+
+    def _prefix(self, component=''):
+        digest = hashlib.blake2b(component.encode('utf-8', 'surrogateescape'), digest_size=16).hexdigest()
+        return '/'.join(digest[i * FANOUT_WIDTH:(i + 1) * FANOUT_WIDTH] for i in range(self.fanout))
+
+
+    def render(self, values=None):
+        """ build the relative output path for one file
+
+        :param dict values: header name -> cleaned value as returned by ExtractionPlan.values
+        :returns: the relative path or an empty string if none of the headers were found
+        :rtype: str
+        """
+        if not any(values.get(h) for h in self.headers):
+            return ''
+        safe = {h: MISSING if values.get(h, '') in ('', '.', '..') else values[h] for h in self.headers}
+        path = self.template.format(**safe)
+        if self.fanout:
+            path = posixpath.join(self._prefix(path.split('/')[0]), path)
+        return path
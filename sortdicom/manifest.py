@@ -0,0 +1,162 @@
+""" A per file catalog of a sortdicom run, written as it goes. Each row has the source path, size, the
+extracted header values, the output path, the bytes saved by transcoding, a status and the error if there was one, so downstream jobs can
+query the run without opening the dicoms again. Rows are buffered and written in fixed size batches to a
+csv file, or to parquet row groups if pyarrow is installed and the path ends in .parquet.
+"""
+
+import csv
+import threading
+
+from .handler import DicomFileHandler
+
+import logging
+l = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 10000  # rows buffered before they are written out
+STATUSES = ['placed', 'parsed', 'skipped', 'deduplicated', 'blank', 'invalid']
+
+
+class ManifestWriter:
+    """ Streams one row per file to manifest_path. Files are recorded with record_parsed when their header is 
+    read and their row is written by record_output once their new name is known, or straight away by 
+    record_error. Only the header values of files still waiting for their new name are held in memory. In a 
+    batch run that is every file until the labeling is done, so memory only stays bounded with stream=True. 
+    Thread safe. Use as a context manager.
+
+    The columns are source_path, size, one per header, output_path, bytes_saved, status and error. output_path is 
+    relative to the output_dir. bytes_saved is only set for files placed with a transcoding placement. status is 
+    one of STATUSES. 
+    """
+
+    def __init__(self, manifest_path='', headers=None, batch_size=DEFAULT_BATCH_SIZE):
+        self.manifest_path = manifest_path
+        self.headers = list(headers or DicomFileHandler.mapping.keys())
+        self.columns = ['source_path', 'size'] + self.headers + ['output_path', 'bytes_saved', 'status', 'error']
+        self.batch_size = batch_size
+        self.parquet = manifest_path.lower().endswith('.parquet')
+        self.rows_written = 0
+        self._details = {}  # filepath -> (size, header values) until the row is written
+        self._rows = []
+        self._lock = threading.Lock()
+        self._file = None
+        self._writer = None
+
+
+    def __enter__(self):
+        self.open()
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def open(self):
+        if self.parquet:
+            try:
+                import pyarrow  # optional. pip install sortdicom[parquet]
+                import pyarrow.parquet
+            except ImportError:
+                raise ImportError('Writing a parquet manifest needs pyarrow. Use a .csv manifest_path or pip install pyarrow')
+            self._schema = pyarrow.schema([(c, pyarrow.int64() if c in ('size', 'bytes_saved') else pyarrow.string()) for c in self.columns])
+            self._writer = pyarrow.parquet.ParquetWriter(self.manifest_path, self._schema)
+        else:
+            self._file = open(self.manifest_path, 'w', newline='')
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(self.columns)
+        return self
+
+
+    def close(self):
+        """ write out the remaining rows and close the file. Files that were parsed but never given an output 
+        are written with an empty status, eg. if the run failed part way 
+        """
+        with self._lock:
+            for f in list(self._details):
+                self._add(f, '', '', '')
+            self._flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        elif self._writer is not None:
+            self._writer.close()
+        self._writer = None
+
+
+    def _flush(self):
+        if not self._rows:
+            return
+        if self.parquet:
+            import pyarrow
+            table = pyarrow.Table.from_pylist([dict(zip(self.columns, r)) for r in self._rows], schema=self._schema)
+            self._writer.write_table(table)
+        else:
+            self._writer.writerows(self._rows)
+            self._file.flush()
+        self.rows_written += len(self._rows)
+        self._rows = []
+
+
+    def _add(self, filepath='', output_path='', status='', error='', bytes_saved=None):
+        size, values = self._details.pop(filepath, (None, {}))
+        self._rows.append([str(filepath), size] + [values.get(h, '') for h in self.headers] + 
+            [output_path, bytes_saved, status, error])
+        if len(self._rows) >= self.batch_size:
+            self._flush()
+
+
+    def record_parsed(self, filepath='', details=None):
+        """ remember the size and header values of a file until its output is known 
+        :param dict details: size and header name -> value 
+        """
+        if not details:
+            return
+        details = dict(details)
+        size = details.pop('size', None)
+        with self._lock:
+            self._details[str(filepath)] = (size, details)
+
+
+    def record_error(self, filepath='', status='invalid', error=None, details=None):
+        """ write the row of a file that could not be sorted 
+        """
+        self.record_parsed(filepath, details)
+        with self._lock:
+            self._add(str(filepath), '', status, str(error) if error is not None else '')
+
+
+    def record_output(self, filepath='', output_path='', status='placed', bytes_saved=None):
+        """ write the row of a file once its new name is known 
+        :param int bytes_saved: source size less output size if the file was transcoded 
+        """
+        with self._lock:
+            self._add(str(filepath), output_path, status, bytes_saved=bytes_saved)
+
+
+class ManifestTee:
+    """ Forwards each record to several manifest like writers, such as a ManifestWriter and a 
+    catalog.OutputCatalog, so a run only has to hand its rows to one of them. 
+    """
+
+    def __init__(self, writers=None):
+        self.writers = list(writers or [])
+
+
+    def close(self):
+        for w in self.writers:
+            w.close()
+
+
+    def record_parsed(self, filepath='', details=None):
+        for w in self.writers:
+            w.record_parsed(filepath, details)
+
+
+    def record_error(self, filepath='', status='invalid', error=None, details=None):
+        for w in self.writers:
+            w.record_error(filepath, status, error, details)
+
+
+    def record_output(self, filepath='', output_path='', status='placed', bytes_saved=None):
+        for w in self.writers:
+            w.record_output(filepath, output_path, status, bytes_saved)
@@ -0,0 +1,142 @@
+""" Per stage counters and latency histograms for a sortdicom run. Pass a Metrics instance to sortdicom to
+collect them, or leave it out to use NullMetrics which does nothing.
+"""
+
+import os
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+
+COUNTERS = [
+    'files_discovered',
+    'files_parsed',
+    'bytes_parsed',  # size of the parsed files, not the bytes read 
+    'files_skipped',  # unchanged since the last run with an index
+    'files_blank',
+    'files_invalid',
+    'files_unreadable',  # removed or not readable by the time they were parsed or placed
+    'files_deduplicated',  # byte identical copies that were not placed
+    'files_placed',
+    'bytes_placed',
+    'bytes_saved',  # by transcoding placements
+]
+
+HISTOGRAMS = [
+    'parse_seconds',
+    'place_seconds',
+]
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+
+class Histogram:
+    """ A fixed bucket latency histogram. Memory does not grow with the number of observations.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+
+    def observe(self, value=0.0):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+    def percentile(self, q=0.5):
+        """ estimate a percentile as the upper bound of the bucket that contains it
+        :param float q: The quantile between 0 and 1
+        :returns: the bucket upper bound or None if nothing was observed
+        """
+        if self.count == 0:
+            return None
+        target = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return self.buckets[-1]
+
+
+class Metrics:
+    """ Collects counters and histograms for a run. Safe to update from worker threads.
+    """
+    enabled = True
+
+    def __init__(self, prefix='sortdicom'):
+        self.prefix = prefix
+        self.counters = OrderedDict((name, 0) for name in COUNTERS)
+        self.histograms = OrderedDict((name, Histogram()) for name in HISTOGRAMS)
+        self._lock = threading.Lock()
+
+
+    def inc(self, name='', value=1):
+        with self._lock:
+            self.counters[name] += value
+
+
+    def observe(self, name='', seconds=0.0):
+        with self._lock:
+            self.histograms[name].observe(seconds)
+
+
+    def summary(self, percentiles=(0.5, 0.9, 0.99)):
+        """ return the counters and histogram percentiles as a flat dict
+        :rtype: dict
+        """
+        result = OrderedDict(self.counters)
+        for name, h in self.histograms.items():
+            result[name + '_count'] = h.count
+            result[name + '_sum'] = h.sum
+            for q in percentiles:
+                result['{}_p{}'.format(name, int(q * 100))] = h.percentile(q)
+        return result
+
+
+    def to_prometheus(self):
+        """ render the metrics in the prometheus text exposition format
+        :rtype: str
+        """
+        lines = []
+        for name, value in self.counters.items():
+            metric = '{}_{}_total'.format(self.prefix, name)
+            lines.append('# TYPE {} counter'.format(metric))
+            lines.append('{} {}'.format(metric, value))
+        for name, h in self.histograms.items():
+            metric = '{}_{}'.format(self.prefix, name)
+            lines.append('# TYPE {} histogram'.format(metric))
+            cumulative = 0
+            for bound, count in zip(h.buckets, h.counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append('{}_bucket{{le="{}"}} {}'.format(metric, le, cumulative))
+            lines.append('{}_sum {}'.format(metric, h.sum))
+            lines.append('{}_count {}'.format(metric, h.count))
+        return '\n'.join(lines) + '\n'
+
+
+    def write_prometheus(self, filepath=''):
+        """ write the prometheus text dump to a file. The file is replaced atomically so that a
+        textfile collector never sees a partial dump.
+        """
+        tmp = filepath + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp, filepath)
+
+
+class NullMetrics:
+    """ Drop in for Metrics that records nothing. Used when instrumentation is turned off.
+    """
+    enabled = False
+
+    def inc(self, name='', value=1):
+        pass
+
+
+    def observe(self, name='', seconds=0.0):
+        pass
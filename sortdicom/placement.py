@@ -0,0 +1,236 @@
+""" Strategies for placing a dicom file at its new name in the output dir. The fast paths (links,
+reflinks, renames) fall back to a regular copy when the filesystem does not support them.
+"""
+
+import os
+import time
+import shutil
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import logging
+l = logging.getLogger(__name__)
+
+FICLONE = 0x40049409  # linux ioctl to share extents between two files (btrfs, xfs)
+
+
+def _copy(src, dst):
+    shutil.copy(src, dst)  # uses sendfile on linux so the bytes never enter userspace
+
+
+def _hardlink(src, dst):
+    os.link(src, dst)
+
+
+def _symlink(src, dst):
+    os.symlink(os.path.abspath(src), dst)
+
+
+def _reflink(src, dst):
+    import fcntl  # not available on windows
+    try:
+        with open(src, 'rb') as s, open(dst, 'wb') as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+    except OSError:
+        if os.path.exists(dst):
+            os.remove(dst)
+        raise
+    shutil.copymode(src, dst)
+
+
+def _move(src, dst):
+    shutil.move(src, dst)  # renames on the same device, copies and deletes across devices
+
+
+PLACEMENT_STRATEGIES = {
+    'copy': _copy,
+    'hardlink': _hardlink,
+    'symlink': _symlink,
+    'reflink': _reflink,
+    'move': _move,
+}
+
+
+def _temp_path(dst=''):
+    head, tail = os.path.split(dst)
+    return os.path.join(head, '.{}.part'.format(tail))
+
+
+def place_dicom_file(src='', dst='', strategy='copy'):
+    """ place a file at dst using the given strategy. The file is first placed at a hidden temp name next 
+    to dst and then renamed over it, so dst is either the old file or the complete new one and never a 
+    partial write. Renaming also replaces an old hard link at dst instead of writing through it into a 
+    source file. If the strategy is not supported for this pair of paths we fall back to a copy.
+
+    :param str src: The source filepath
+    :param str dst: The destination filepath
+    :param str strategy: One of "copy", "hardlink", "symlink", "reflink" or "move"
+    :raise: ValueError if the strategy is invalid
+    """
+    if strategy not in PLACEMENT_STRATEGIES:
+        raise ValueError('Invalid placement strategy. Use one of: {}'.format(list(PLACEMENT_STRATEGIES.keys())))
+
+    tmp = _temp_path(dst)
+    if os.path.lexists(tmp):
+        os.remove(tmp)  # left over from an interrupted run
+
+    try:
+        PLACEMENT_STRATEGIES[strategy](src, tmp)
+    except OSError as err:
+        if strategy == 'copy' or not os.path.exists(src):
+            raise
+        l.warning('Could not {} {} -> falling back to copy. ({})'.format(strategy, src, err))
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+        _copy(src, tmp)
+    os.replace(tmp, dst)
+
+
+def write_dicom_file(fileobj=None, dst=''):
+    """ stream the contents of an open file object to dst, such as a member of an archive. Uses the same 
+    temp name and rename as place_dicom_file so dst is never a partial write. 
+
+    :param fileobj: A readable binary file object 
+    :param str dst: The destination filepath 
+    :returns: the number of bytes written 
+    :rtype: int
+    """
+    tmp = _temp_path(dst)
+    if os.path.lexists(tmp):
+        os.remove(tmp)  # left over from an interrupted run
+
+    try:
+        with open(tmp, 'wb') as f:
+            shutil.copyfileobj(fileobj, f)
+            size = f.tell()
+    except BaseException:
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+        raise
+    os.replace(tmp, dst)
+    return size
+
+
+class DirectoryCache:
+    """ Creates the directories of an output layout. Every directory that has been made is remembered so a 
+    nested layout costs one makedirs per directory rather than an exists check and mkdir per file.
+    """
+
+    def __init__(self):
+        self._known = set()
+
+
+    def ensure(self, dirpath=''):
+        if dirpath in self._known:
+            return
+        os.makedirs(dirpath, exist_ok=True)
+        self._known.add(dirpath)
+
+
+    def ensure_parent(self, filepath=''):
+        """ make sure the directory that filepath goes into exists
+        """
+        self.ensure(os.path.dirname(filepath))
+
+
+    def ensure_all(self, filepaths):
+        """ create the parent directories of many files at once. Only the deepest directories are passed 
+        to makedirs since that creates the ones above them too.
+        """
+        dirpaths = set(os.path.dirname(f) for f in filepaths) - self._known
+        for d in sorted(dirpaths, reverse=True):
+            if d not in self._known:
+                os.makedirs(d, exist_ok=True)
+                while d and d not in self._known:
+                    self._known.add(d)
+                    d = os.path.dirname(d)
+
+
+class FilePlacer:
+    """ Places files into a target dir on a bounded thread pool so that copies overlap with each other.
+    Use as a context manager. Leaving the context waits on all pending placements and raises the first
+    error that occurred. With workers=1 files are placed synchronously. If a metrics.Metrics instance is 
+    given each placement is counted and timed. on_placed is called with (src, new_name) after each file 
+    is in place. If on_error is given it is called with (src, new_name, err) for a file that fails with an 
+    OSError, eg. because it was removed, instead of raising. If an iosched.IOScheduler is given each placement 
+    takes one of the reads of the source file's device. new_name may be a relative path and any directories it 
+    needs are created on the way.
+    """
+
+    def __init__(self, target_dir='', strategy='copy', workers=1, metrics=None, on_placed=None, on_error=None, 
+            scheduler=None):
+        if strategy not in PLACEMENT_STRATEGIES:
+            raise ValueError('Invalid placement strategy. Use one of: {}'.format(list(PLACEMENT_STRATEGIES.keys())))
+        self.target_dir = target_dir
+        self.strategy = strategy
+        self.workers = workers
+        self.metrics = metrics
+        self.on_placed = on_placed
+        self.on_error = on_error
+        self.scheduler = scheduler
+        self._pool = None
+        self._pending = deque()
+        self.dirs = DirectoryCache()
+
+
+    def __enter__(self):
+        if self.workers > 1:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers)
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                self.wait()
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+                self._pool = None
+
+
+    def place(self, src='', new_name=''):
+        """ place src into the target dir as new_name. Blocks if too many placements are in flight.
+        """
+        self.dirs.ensure_parent(os.path.join(self.target_dir, new_name))  # here so worker threads never race on it
+        if self._pool is None:
+            self._place(src, new_name)
+            return
+
+        self._pending.append(self._pool.submit(self._place, src, new_name))
+        while len(self._pending) >= self.workers * 2:
+            self._pending.popleft().result()
+
+
+    def _place(self, src='', new_name=''):
+        dst = os.path.join(self.target_dir, new_name)
+        if self.scheduler is not None:
+            dev = self.scheduler.device(src)
+            self.scheduler.acquire(dev)
+        try:
+            if self.metrics is None or not getattr(self.metrics, 'enabled', True):
+                place_dicom_file(src, dst, self.strategy)
+            else:
+                start = time.perf_counter()
+                size = os.stat(src).st_size  # before a move takes it away
+                place_dicom_file(src, dst, self.strategy)
+                self.metrics.observe('place_seconds', time.perf_counter() - start)
+                self.metrics.inc('files_placed')
+                self.metrics.inc('bytes_placed', size)
+        except OSError as err:
+            if self.on_error is None:
+                raise
+            self.on_error(src, new_name, err)
+            return
+        finally:
+            if self.scheduler is not None:
+                self.scheduler.release(dev)
+        if self.on_placed is not None:
+            self.on_placed(src, new_name)
+
+
+    def wait(self):
+        """ wait for all pending placements to finish
+        """
+        while self._pending:
+            self._pending.popleft().result()
@@ -3,15 +3,43 @@
 
 import os 
 import sys
-import shutil 
 import pathlib
-from collections import OrderedDict
+import time
+import asyncio
+import functools
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future
 from pydicom.errors import InvalidDicomError
 
-from .handler import DicomFileHandler 
+from .handler import ExtractionPlan
+from .scanner import UnsupportedDicomError
+from .placement import FilePlacer, DirectoryCache, place_dicom_file, write_dicom_file
+from .index import FileIndex, INDEX_NAME
+from .discovery import iter_dicom_filepaths
+from .metrics import Metrics, NullMetrics
+from .journal import PlacementJournal, JOURNAL_NAME
+from .dedupe import Deduplicator
+from .labeling import DuplicateLabeler, DEFAULT_MAX_IN_MEMORY, COMPACT_MAX_IN_MEMORY, label_duplicate as _label_duplicate
+from .archive import DicomArchive, is_archive
+from .layout import OutputLayout
+from .manifest import ManifestWriter, ManifestTee
+from .catalog import OutputCatalog
+from .compact import CompactPathMap
+from .watch import make_watcher, iter_batches, DEFAULT_BATCH_SIZE, DEFAULT_BATCH_TIMEOUT, DEFAULT_SETTLE, \
+    DEFAULT_POLL_INTERVAL
+from .iosched import IOScheduler
+from .transcode import Transcoder, TRANSFER_SYNTAXES, transcode_dicom_file
+from .sharding import shard_of, write_manifest, iter_merged, read_manifest_header, iter_manifest
 
 DEFAULT_TYPES = ["mrn", "laterality","view", "date", "sequence_info", "modality"]
 
+EXECUTORS = {
+    'thread': ThreadPoolExecutor,   # I/O bound, ie. network mounts 
+    'process': ProcessPoolExecutor, # parse bound, ie. fast local disk
+}
+PREFETCH_PER_WORKER = 4  # number of in flight header reads per worker 
+COPYING_PLACEMENTS = ['copy'] + list(TRANSFER_SYNTAXES)  # placements that read the whole source file 
+
 import logging 
 l = logging.getLogger(__name__)
 
@@ -21,120 +49,883 @@ class BlankDicomHeaderError(Exception):
     """
 
 
-def _get_all_dicom_filepaths(patient_root_dir=''):
+def _iter_dicom_filepaths(patient_root_dir='', include=None, exclude=None, exclude_dirs=None, magic=False):
+    """ Given a patient root directory, walks through subfolders top down and 
+    yields absolute dicom_filepaths as they are found. See discovery.iter_dicom_filepaths for the filters.
+    """
+    return iter_dicom_filepaths(patient_root_dir, include=include, exclude=exclude, exclude_dirs=exclude_dirs, magic=magic)
+
+
+def _get_all_dicom_filepaths(patient_root_dir='', include=None, exclude=None, exclude_dirs=None, magic=False):
     """ Given a patient root directory, walks through subfolders top down and 
     returns a list of absolute dicom_filepaths 
     """
-    walk = os.walk(patient_root_dir)
-    
-    dicom_filepaths = []
-    for w in walk: 
-        dicom_files = [f for f in w[-1] if '.dcm' in f]  # extracts .dcm files 
-        basepath = pathlib.Path(w[0])  # extracts the basepath 
-        full_paths = [os.path.join(basepath, df) for df in dicom_files] # combines the basepath with each .dcm file 
-        for f in full_paths:
-            dicom_filepaths.append(f) # load into master list 
-    
-    return dicom_filepaths 
+    return list(_iter_dicom_filepaths(patient_root_dir, include, exclude, exclude_dirs, magic))
     
 
 
-def _copy_dicom_file(original_dicom_filepath='', new_uid_name='', target_dir=''): 
+def _copy_dicom_file(original_dicom_filepath='', new_uid_name='', target_dir='', placement='copy'): 
     """ copy a dicom file from its original path, give a new name from the unique_identifier 
-    and place in the target_dir 
+    and place in the target_dir. See placement.PLACEMENT_STRATEGIES for the other ways to place a file.
     """
     outfile_path = os.path.join(target_dir, new_uid_name)
-    shutil.copy(original_dicom_filepath, outfile_path)
+    place_dicom_file(original_dicom_filepath, outfile_path, placement)
 
 
-def _build_dicom_unique_identifier(dicom_filepath='', headers=None):
-    """ Builds a unique identifier string for a single dicom file. The headers kwarg defaults 
-    to look for all fields in the mapping if set to None. 
+@functools.lru_cache(maxsize=None)
+def _get_extraction_plan(headers=None, fast_scan=True):
+    """ compile and cache an ExtractionPlan for a tuple of header names. Each worker process keeps its own cache. 
     """
-    handler = DicomFileHandler()
-    handler.load(dicom_filepath)
-    
+    return ExtractionPlan(headers, fast_scan=fast_scan)
 
-    if not headers:  # get all mappings unless headers
-        headers = handler.list_header_mappings()
 
-    uid = ''
-    suffix = '.dcm'
-    for i,h in enumerate(headers):
-        uid += handler.get_dicom_header_tag(h)
-        if i < len(headers) - 1 and uid != '':
-            uid += '_'
+def _get_layout(layout=None):
+    """ accept either a template string or a layout.OutputLayout 
+    """
+    if layout is None or isinstance(layout, OutputLayout):
+        return layout
+    return OutputLayout(layout)
+
+
+def _get_io_scheduler(io_schedule=None):
+    """ io_schedule may be True for the default iosched.IOScheduler or an IOScheduler instance """
+    if not io_schedule:
+        return None
+    return io_schedule if isinstance(io_schedule, IOScheduler) else IOScheduler()
+
+
+def _build_dicom_unique_identifier(dicom_filepath='', headers=None, header_only=True, fast_scan=True, data=None, 
+        layout=None, details=None, size=None):
+    """ Builds a unique identifier string for a single dicom file. The headers kwarg defaults 
+    to look for all fields in the mapping if set to None. By default only the header is read 
+    and pixel data is never loaded. fast_scan tries the lightweight scanner before pydicom. 
+    If data is given it is used instead of reading dicom_filepath. It is either the contents of the file, only 
+    their start if size is larger, or an open file object, in which case size must be given. 
+    If a layout.OutputLayout is given the uid is the relative path it renders and headers is ignored. 
+    If a details dict is given it is filled with the file size and the extracted header values. 
+    """
+    if layout is not None:
+        headers = layout.headers
+    plan = _get_extraction_plan(tuple(headers) if headers else None, fast_scan)
+    if size is None:
+        size = len(data) if data is not None else None
+    if details is not None:
+        details['size'] = size if size is not None else os.path.getsize(dicom_filepath)
+    if data is None:
+        ds = plan.load(dicom_filepath, header_only=header_only)
+    elif isinstance(data, (bytes, bytearray)):
+        ds = plan.load_bytes(data, header_only=header_only, name=dicom_filepath, truncated=size > len(data))
+    else:
+        ds = plan.load_fileobj(data, header_only=header_only)
+    if details is not None:
+        details.update(plan.values(ds))
+    uid = plan.apply(ds) if layout is None else layout.render(plan.values(ds))
 
     if len(uid) == 0:
         raise BlankDicomHeaderError('No headers were found for this dicom file: {}'.format(dicom_filepath)) 
 
-    return uid + suffix
+    return uid if layout is not None else uid + plan.suffix
+
+
+def _extract_dicom_unique_identifier(dicom_filepath='', headers=None, header_only=True, fast_scan=True, data=None, 
+        layout=None, with_details=False, size=None):
+    """ Wraps _build_dicom_unique_identifier for use in a worker pool. Returns a (uid, err, seconds, details) tuple 
+    so that expected per file errors are handed back to the caller instead of tearing down the pool. 
+    seconds is the time spent reading and parsing the header. details is the size and header values of 
+    the file if with_details is set and None otherwise. 
+    """
+    start = time.perf_counter()
+    details = {} if with_details else None
+    try:
+        uid = _build_dicom_unique_identifier(dicom_filepath, headers=headers, header_only=header_only, fast_scan=fast_scan, 
+            data=data, layout=layout, details=details, size=size)
+        return uid, None, time.perf_counter() - start, details
+    except (BlankDicomHeaderError, InvalidDicomError, OSError) as err:
+        return None, err, time.perf_counter() - start, details
+
+
+def _iter_dicom_unique_identifiers(dicom_filepaths, headers=None, header_only=True, workers=1, executor='thread', 
+        cached=None, fast_scan=True, layout=None, with_details=False, scheduler=None, drop_after_read=False):
+    """ Yields (filepath, (uid, err, seconds, details)) for each filepath in the same order as the input. If workers > 1 the 
+    header extraction is fanned out to a thread or process pool with a bounded number of reads in flight. 
+    Files found in the cached dict of filepath -> uid are not read again. If an iosched.IOScheduler is given the 
+    reads are scheduled by it, see _iter_scheduled_unique_identifiers. 
+    """
+    if executor not in EXECUTORS:
+        raise ValueError('Invalid executor. Use one of: {}'.format(list(EXECUTORS.keys())))
+    cached = cached or {}
+    if scheduler is not None:
+        yield from _iter_scheduled_unique_identifiers(dicom_filepaths, headers, header_only, workers, executor, cached, 
+            fast_scan, layout, with_details, scheduler, drop_after_read)
+        return
+
+    if workers <= 1:
+        for f in dicom_filepaths:
+            if str(f) in cached:
+                yield f, (cached[str(f)], None, 0.0, None)
+                continue
+            yield f, _extract_dicom_unique_identifier(f, headers, header_only, fast_scan, None, layout, with_details)
+        return
+
+    with EXECUTORS[executor](max_workers=workers) as pool:
+        pending = deque()
+        for f in dicom_filepaths:
+            if str(f) in cached:
+                fut = Future()
+                fut.set_result((cached[str(f)], None, 0.0, None))
+            else:
+                fut = pool.submit(_extract_dicom_unique_identifier, f, headers, header_only, fast_scan, None, layout, 
+                    with_details)
+            pending.append((f, fut))
+            if len(pending) >= workers * PREFETCH_PER_WORKER:
+                f, fut = pending.popleft()
+                yield f, fut.result()
+        while pending:
+            f, fut = pending.popleft()
+            yield f, fut.result()
+
+
+def _iter_scheduled_unique_identifiers(dicom_filepaths, headers=None, header_only=True, workers=1, executor='thread', 
+        cached=None, fast_scan=True, layout=None, with_details=False, scheduler=None, drop_after_read=False):
+    """ Same as _iter_dicom_unique_identifiers but the files of each scheduler window are read in the order they 
+    sit on disk, with at most scheduler.reads_per_device reads in flight per device. Results are still yielded 
+    in input order. If drop_after_read is set each file is dropped from the page cache once its header is parsed, 
+    for runs where nothing reads it again. 
+    """
+    with EXECUTORS[executor](max_workers=max(workers, 1)) as pool:
+        for chunk in scheduler.iter_windows(dicom_filepaths):
+            futures = {}
+            for f, dev in scheduler.order(chunk):
+                if str(f) in cached:
+                    futures[f] = Future()
+                    futures[f].set_result((cached[str(f)], None, 0.0, None))
+                    continue
+                scheduler.acquire(dev)
+                futures[f] = pool.submit(_extract_dicom_unique_identifier, f, headers, header_only, fast_scan, None, 
+                    layout, with_details)
+                futures[f].add_done_callback(lambda fut, dev=dev: scheduler.release(dev))
+            for f in chunk:
+                result = futures.pop(f).result()
+                if drop_after_read:
+                    scheduler.done(f)
+                yield f, result
+
+
+def _iter_archive_unique_identifiers(archive, headers=None, header_only=True, workers=1, executor='thread', 
+        fast_scan=True, metrics=None, layout=None, with_details=False):
+    """ Same as _iter_dicom_unique_identifiers for the members of an archive.DicomArchive. Members are read in 
+    archive order on this thread and only the parsing of their start is fanned out, so at most 
+    workers * PREFETCH_PER_WORKER member prefixes of scanner.SCAN_BYTES are held in memory at once. Members 
+    whose header can't be read from their start are reopened and read with pydicom on this thread. 
+    """
+    if executor not in EXECUTORS:
+        raise ValueError('Invalid executor. Use one of: {}'.format(list(EXECUTORS.keys())))
+    metrics = metrics or NullMetrics()
+
+    def from_member(f, size):
+        with archive.open_member(f) as fileobj:
+            return _extract_dicom_unique_identifier(f, headers, header_only, fast_scan, fileobj, layout, with_details, 
+                size)
+
+    if workers <= 1:
+        for f, prefix, size in archive.iter_members():
+            metrics.inc('files_discovered')
+            try:
+                result = _extract_dicom_unique_identifier(f, headers, header_only, fast_scan, prefix, layout, 
+                    with_details, size)
+            except UnsupportedDicomError:
+                result = from_member(f, size)
+            yield f, result
+        return
+
+    def result(f, size, fut):
+        try:
+            return fut.result()
+        except UnsupportedDicomError:
+            return from_member(f, size)
+
+    with EXECUTORS[executor](max_workers=workers) as pool:
+        pending = deque()
+        for f, prefix, size in archive.iter_members():
+            metrics.inc('files_discovered')
+            pending.append((f, size, pool.submit(_extract_dicom_unique_identifier, f, headers, header_only, fast_scan, 
+                prefix, layout, with_details, size)))
+            if len(pending) >= workers * PREFETCH_PER_WORKER:
+                f, size, fut = pending.popleft()
+                yield f, result(f, size, fut)
+        while pending:
+            f, size, fut = pending.popleft()
+            yield f, result(f, size, fut)
+
+
+def _iter_valid_dicom_unique_identifiers(uids, raise_on_read_error=True, metrics=None):
+    """ Takes the output of _iter_dicom_unique_identifiers and yields (filepath, uid) for every file that 
+    could be read. Blank headers are logged and skipped. Invalid files and files that could not be opened 
+    are raised or skipped depending on raise_on_read_error. 
+    """
+    metrics = metrics or NullMetrics()
+    for f, (uid_filename, err, seconds, details) in uids: 
+        metrics.observe('parse_seconds', seconds)
+        try:
+            l.info('Extracted dicom header data for:    {}'.format(f))
+            if err is not None:
+                raise err
+            metrics.inc('files_parsed')
+            if details:
+                metrics.inc('bytes_parsed', details.get('size') or 0)
+            yield f, uid_filename
+        except BlankDicomHeaderError as err: 
+            metrics.inc('files_blank')
+            l.error(str(err)) 
+        except InvalidDicomError as err: 
+            metrics.inc('files_invalid')
+            l.error('You attempted to pass a non-readable filetype to pydicom.dcmread: {}'.format(f))
+            if raise_on_read_error: 
+                raise
+            l.warn('Skipping bad file... {}'.format(f))
+        except OSError as err: 
+            metrics.inc('files_unreadable')
+            l.error('Could not read {}: {}'.format(f, err))
+            if raise_on_read_error: 
+                raise
 
 
-def _label_duplicates(ordered_dict):
-    """ takes an ordered dict and sorts the key value pairs. It checks 
-    for duplicates within small groups
+def _label_duplicates(ordered_dict, max_in_memory=DEFAULT_MAX_IN_MEMORY):
+    """ takes an ordered dict and sorts the key value pairs by name. Files that share 
+    a name are numbered in their original order. See labeling.DuplicateLabeler 
     """
-    # sort the key value pairs so that duplicates line up 
-    fname_tuples = sorted(ordered_dict.items(), key=lambda x:x[1])
-    fname_lists = [list(f) for f in fname_tuples]
+    with DuplicateLabeler(max_in_memory) as labeler:
+        for k,v in ordered_dict.items():
+            labeler.add(k, v)
+        return OrderedDict(labeler)
+
+
+def _open_manifest(manifest_path=None, catalog_path=None):
+    """ open the manifest.ManifestWriter and catalog.OutputCatalog of a run behind a single writer. None if 
+    neither is wanted 
+    """
+    writers = []
+    try:
+        if manifest_path:
+            writers.append(ManifestWriter(manifest_path).open())
+        if catalog_path:
+            writers.append(OutputCatalog(catalog_path).open())
+    except BaseException:
+        for w in writers:
+            w.close()
+        raise
+    if len(writers) > 1:
+        return ManifestTee(writers)
+    return writers[0] if writers else None
+
 
-    current_candidate_duplicate = fname_lists[0][1] # start with the first one
-    counter = 1  
-    for i, row in enumerate(fname_lists): 
-        if row[1] == current_candidate_duplicate: 
-            row[1] = row[1].replace('.dcm', '_{}.dcm'.format(counter))  # append counter 
-            counter += 1  #increment
+def _manifest_parsed(uids, manifest):
+    """ pass through the output of _iter_dicom_unique_identifiers while recording each file in the manifest. 
+    Files that could not be read get their row straight away. 
+    """
+    for f, result in uids:
+        uid_filename, err, seconds, details = result
+        if err is None:
+            manifest.record_parsed(f, details)
         else:
-            counter = 1  # reset the counter
-            current_candidate_duplicate = row[1] # set the new duplicate candidate
-            row[1] = row[1].replace('.dcm', '_{}.dcm'.format(counter)) 
-            counter += 1
-    
-    return OrderedDict(fname_lists)
+            status = 'blank' if isinstance(err, BlankDicomHeaderError) else 'invalid'
+            manifest.record_error(f, status, err, details)
+        yield f, result
+
+
+def _journal_parsed(uids, journal):
+    """ pass through (filepath, uid) pairs while recording them in the journal 
+    """
+    for f, uid_filename in uids:
+        journal.record_parsed(f, uid_filename)
+        yield f, uid_filename
+
+
+def _count_discovered(dicom_filepaths, metrics):
+    """ pass through a filepath generator while counting discovered files 
+    """
+    for f in dicom_filepaths:
+        metrics.inc('files_discovered')
+        yield f
+
+
+def _stream_label(uids):
+    """ label duplicates as soon as each uid is known. Files are numbered in the order they arrive 
+    which gives the same numbering as _label_duplicates since that sort is stable. Only a counter 
+    per distinct uid is kept in memory. 
+    """
+    counters = {}
+    for f, uid_filename in uids:
+        counter = counters.get(uid_filename, 0) + 1
+        counters[uid_filename] = counter
+        yield f, _label_duplicate(uid_filename, counter)
+
+
+def _index_label(uids, index):
+    """ label duplicates using the counters stored in a FileIndex so that numbering continues from 
+    previous runs, and record each result in the index. 
+    """
+    for f, uid_filename in uids:
+        counter = index.assign_counter(f, uid_filename)
+        new_name = _label_duplicate(uid_filename, counter)
+        index.record(f, uid_filename, counter, new_name)
+        yield f, new_name
+
+
+def _place_labeled(labeled, copy_map, output_dir=None, placement='copy', placement_workers=1, skip_existing=False, 
+        metrics=None, journal=None, manifest=None, scheduler=None, skip_unreadable=False):
+    """ collect labeled (filepath, new_name) pairs into copy_map and place each file in the output_dir 
+    if one is given. If skip_existing is True files already present in the output_dir are left alone. 
+    Files that a journal has already recorded as placed are skipped as well. Each file's row is written 
+    to the manifest if one is given. placement may also be a transcode.TRANSFER_SYNTAXES key, in which case files 
+    are transcoded on a process pool of placement_workers. If an iosched.IOScheduler is given the files of each of its windows are 
+    placed in the order they sit on disk, count against its reads per device and copies are dropped from the page 
+    cache once written. copy_map 
+    keeps the labeled order either way. If skip_unreadable is True files that fail to place with an OSError 
+    are logged and left out of copy_map instead of raising, which needs copy_map to be an OrderedDict. 
+    """
+    if not output_dir:
+        for k,v in labeled:
+            copy_map[k] = v
+            if manifest is not None:
+                manifest.record_output(k, v, 'parsed')
+        return
+
+    def on_placed(k, v, bytes_saved=None):
+        if journal is not None:
+            journal.record_placed(k, v)
+        if manifest is not None:
+            manifest.record_output(k, v, 'placed', bytes_saved)
+        if scheduler is not None and placement in COPYING_PLACEMENTS:
+            scheduler.done(k)
+            scheduler.done(os.path.join(output_dir, v))
+
+    def on_error(k, v, err):
+        l.error('Could not place {}: {}'.format(k, err))
+        copy_map.pop(k, None)
+        if metrics is not None:
+            metrics.inc('files_unreadable')
+        if manifest is not None:
+            manifest.record_error(k, 'invalid', err)
+
+    def ordered(labeled):
+        if scheduler is None:
+            for k,v in labeled:
+                copy_map[k] = v
+                yield k, v
+            return
+        for chunk in scheduler.iter_windows(labeled):
+            for k,v in chunk:
+                copy_map[k] = v
+            for (k,v), dev in scheduler.order(chunk, key=lambda kv: kv[0]):
+                yield k, v
+
+    if placement in TRANSFER_SYNTAXES:
+        placer = Transcoder(output_dir, syntax=placement, workers=placement_workers, metrics=metrics, on_placed=on_placed, 
+            on_error=on_error if skip_unreadable else None, scheduler=scheduler)
+    else:
+        placer = FilePlacer(output_dir, strategy=placement, workers=placement_workers, metrics=metrics, on_placed=on_placed, 
+            on_error=on_error if skip_unreadable else None, scheduler=scheduler)
+    with placer:
+        for k,v in ordered(labeled):
+            if skip_existing and os.path.exists(os.path.join(output_dir, v)):
+                if manifest is not None:
+                    manifest.record_output(k, v, 'skipped')
+                continue
+            if journal is not None and journal.is_placed(k, v) and os.path.exists(os.path.join(output_dir, v)):
+                l.info('Already placed: {}'.format(k))
+                if manifest is not None:
+                    manifest.record_output(k, v, 'skipped')
+                continue
+            l.info('Placing ({}): {}   to   {}'.format(placement, k, os.path.join(output_dir, v))) 
+            placer.place(k, v)
+
 
-def sortdicom(root_dir, output_dir=None, raise_on_read_error=True):
+def _place_archive_members(archive, copy_map, output_dir='', metrics=None, manifest=None):
+    """ write every member in copy_map straight from the archive to its new name in the output_dir. This is 
+    a second pass over the archive in archive order. 
+    """
+    metrics = metrics or NullMetrics()
+    dirs = DirectoryCache()
+    for k, f in archive.iter_open_members(copy_map.keys()):
+        dst = os.path.join(output_dir, copy_map[k])
+        dirs.ensure_parent(dst)
+        l.info('Placing (archive): {}   to   {}'.format(k, dst)) 
+        start = time.perf_counter()
+        size = write_dicom_file(f, dst)
+        metrics.observe('place_seconds', time.perf_counter() - start)
+        metrics.inc('files_placed')
+        metrics.inc('bytes_placed', size)
+        if manifest is not None:
+            manifest.record_output(k, copy_map[k], 'placed')
+
+
+def _sortdicom_archive(archive_path, output_dir=None, raise_on_read_error=True, header_only=True, workers=1, 
+        executor='thread', stream=False, include=None, exclude=None, exclude_dirs=None, magic=False, metrics=None, 
+        max_labels_in_memory=DEFAULT_MAX_IN_MEMORY, fast_scan=True, layout=None, manifest=None, compact=False):
+    """ sortdicom for a zip or tar archive. Headers are parsed from the members as the archive is read and 
+    the members are then written to the output_dir in a second pass, so nothing is extracted to scratch space. 
+    """
+    with DicomArchive(archive_path, include, exclude, exclude_dirs, magic) as archive, \
+            DuplicateLabeler(max_labels_in_memory) as labeler:
+        uids = _iter_archive_unique_identifiers(archive, header_only=header_only, workers=workers, 
+            executor=executor, fast_scan=fast_scan, metrics=metrics, layout=layout, with_details=manifest is not None)
+        if manifest is not None:
+            uids = _manifest_parsed(uids, manifest)
+        uids = _iter_valid_dicom_unique_identifiers(uids, raise_on_read_error, metrics)
+        if stream:
+            labeled = _stream_label(uids)
+        else:
+            for f, uid_filename in uids:
+                labeler.add(f, uid_filename)
+            labeled = iter(labeler)
+        copy_map = CompactPathMap(labeled) if compact else OrderedDict(labeled)
+
+        if output_dir:
+            _place_archive_members(archive, copy_map, output_dir, metrics, manifest)
+        elif manifest is not None:
+            for k, v in copy_map.items():
+                manifest.record_output(k, v, 'parsed')
+    return copy_map
+
+
+def sortdicom(root_dir, output_dir=None, raise_on_read_error=True, header_only=True, workers=1, executor='thread', 
+        placement='copy', placement_workers=1, stream=False, index_path=None, 
+        include=None, exclude=None, exclude_dirs=None, magic=False, metrics=None, metrics_path=None, 
+        journal_path=None, resume=False, dedupe=False, dedupe_workers=4, max_labels_in_memory=None, 
+        fast_scan=True, layout=None, manifest_path=None, compact=False, io_schedule=None, catalog_path=None):
     """ Main entrypoint for program. Given a patient_root_dir and an intended output_dir, extract dicom headers 
     from all .dcm in underlying subfolders and copy to the output_dir. 
     If with_copy is True will perform the copy to the output dir
 
     :param str root_dir: The root dir for a project. Will parse .dcm from this folder down to the root and extract all into an array. 
+        This can also be a .zip or .tar(.gz, .bz2, .xz) archive. Members are then read straight from the archive and 
+        written to the output_dir without extracting anything to disk, and the keys of the returned map are 
+        archive-member paths like study.zip/PATIENT/1.dcm. placement, index_path, journal_path, resume and 
+        dedupe are not supported for archives and placement_workers is ignored 
     :param str output_dir: The intended output dir. If set to None (default) then no copy will take place (useful for testing) 
+    :param bool header_only: Only read the header tags in DicomFileHandler.mapping and skip pixel data (default True)
+    :param bool fast_scan: With header_only, read tags with the built in scanner and only use pydicom for files it 
+        can't handle such as big endian or deflated files (default True)
+    :param int workers: Number of workers used to extract headers. The default of 1 runs serially in this process
+    :param str executor: Either "thread" (I/O bound storage) or "process" (parse bound). Only used if workers > 1 
+    :param str placement: How files are placed in the output_dir. One of "copy", "hardlink", "symlink", "reflink" or "move". 
+        Falls back to copy if the filesystem does not support it. "deflate" or "rle" re-encode each file to the deflated 
+        explicit vr or RLE lossless transfer syntax instead, on a process pool. Files that are already compressed 
+        are copied. The bytes saved are recorded in the manifest and metrics 
+    :param int placement_workers: Number of threads used to place files in the output_dir, or processes when transcoding 
+    :param bool stream: If True walk, parse and place concurrently instead of in three separate phases. Files are 
+        written to the output_dir as soon as their header is parsed. The returned map is then in walk order 
+        rather than sorted by name but the duplicate numbering is identical.
+    :param str index_path: Path to a sqlite file index. If given, files that are unchanged since the last run with 
+        this index are not parsed again and are only placed if missing from the output_dir. Duplicate numbering 
+        continues from the previous runs so existing outputs are never renamed. New and changed files are 
+        returned first in walk order, followed by the unchanged files.
+    :param list include: glob patterns for dicom file names. Defaults to ["*.dcm"] 
+    :param list exclude: glob patterns for file names to skip 
+    :param list exclude_dirs: glob patterns for directory names to skip entirely 
+    :param bool magic: Also pick up files that don't match include but start with the dicom preamble and DICM magic 
+    :param metrics.Metrics metrics: If given it is filled with per stage counters and latency histograms for this run 
+    :param str metrics_path: If given a prometheus text dump of the metrics is written here at the end of the run 
+    :param str journal_path: If given every parsed uid and completed placement is recorded in this write-ahead journal. 
+        Defaults to a .sortdicom.journal file in the output_dir when resume is set 
+    :param bool resume: Pick up an interrupted run from its journal. Files already parsed are not read again and files 
+        already placed under the same name are not placed again. Assumes the source tree has not changed, so 
+        it cannot be combined with placement="move". 
+    :param bool dedupe: Place byte identical files only once. Files with the same uid and size are hashed on a thread 
+        pool while parsing continues. Each copy maps to the new name of the first identical file in the returned 
+        map and does not take a duplicate number. Can not be combined with both stream and placement="move" 
+    :param int dedupe_workers: Number of threads used for hashing 
+    :param int max_labels_in_memory: Number of files the duplicate labeler holds in memory before spilling sorted 
+        runs to a temp file. Only used when neither stream nor index_path is set. Defaults to 
+        labeling.DEFAULT_MAX_IN_MEMORY, or the smaller labeling.COMPACT_MAX_IN_MEMORY with compact 
+    :param layout: A path template such as "{mrn}/{date}/{laterality}_{view}.dcm" or a layout.OutputLayout, which can 
+        also add hash prefix directories. Files are then placed in a tree under the output_dir instead of flat 
+        in it, the new names in the returned map are relative paths and duplicates are numbered per leaf directory 
+    :param str manifest_path: If given a catalog with one row per file is streamed here during the run, with the source 
+        path, size, header values, output path, status and error. Written as csv, or as parquet if the path ends in 
+        .parquet and pyarrow is installed. See manifest.ManifestWriter. Files skipped by the index or already 
+        parsed according to the journal are not read again so their size and header values are left empty. 
+        Rows are written once their output is known, so without stream the header values of every file are held 
+        in memory until the placement phase 
+    :param bool compact: Return a compact.CompactPathMap instead of an OrderedDict. It has the same read interface 
+        and order but takes around a tenth of the memory, which matters for runs with millions of files. Without 
+        stream the duplicate labeler also spills to disk sooner, see max_labels_in_memory 
+    :param io_schedule: True or an iosched.IOScheduler to schedule reads for spinning disks. Header reads and copies 
+        are then done in windows ordered by where the files sit on disk, header prefixes are prefetched, 
+        outstanding header reads and placements are capped per device and files are dropped from the page cache 
+        once we are done with them. The result is the same as without it. Not supported for archives 
+    :param str catalog_path: If given the header values of every output are kept in this sqlite catalog, indexed 
+        so that catalog.query_catalog can find the outputs for a patient or date range in milliseconds. The 
+        catalog persists across runs. catalog.CATALOG_NAME in the output_dir is a good place for it. Needs an 
+        output_dir since only files that were placed are cataloged 
     :returns: a dictionary mapping the original filepath on the system to the new filepath. Useful for debugging or logging the filepath output for larger projects 
     :rtype: dict
     """
+    if metrics is None:
+        metrics = Metrics() if metrics_path else NullMetrics()
+    if resume and placement == 'move':
+        raise ValueError('resume cannot be used with placement="move" since moved files are gone from the root_dir')
+    if dedupe and stream and placement == 'move':
+        raise ValueError('dedupe cannot be used with stream and placement="move" since a file may be moved away before '
+            'a later copy of it needs it for hashing')
+    if catalog_path and not output_dir:
+        raise ValueError('catalog_path needs an output_dir since only placed files are cataloged')
+    if resume and not journal_path:
+        if not output_dir:
+            raise ValueError('resume needs either a journal_path or an output_dir to keep the journal in')
+        journal_path = os.path.join(output_dir, JOURNAL_NAME)
+    if max_labels_in_memory is None:
+        max_labels_in_memory = COMPACT_MAX_IN_MEMORY if compact else DEFAULT_MAX_IN_MEMORY
     root_dir = pathlib.Path(root_dir)  # NOTE assumes input path was already checked
+    layout = _get_layout(layout)
+    archive = is_archive(root_dir)
+    if archive and (placement != 'copy' or index_path or journal_path or dedupe or io_schedule):
+        raise ValueError('placement, index_path, journal_path, resume, dedupe and io_schedule are not supported for archives')
+    scheduler = _get_io_scheduler(io_schedule)
 
     if output_dir:
         if not os.path.exists(output_dir): # do not make output_dir if with_copy = False
             l.info('Creating output dir {}'.format(output_dir))
             os.mkdir(output_dir)
 
-    # check root dir exists and construct abspath
-    dicom_filepaths = _get_all_dicom_filepaths(root_dir) 
-    copy_map = OrderedDict()  # key -> original name  value -> new name w/ uid 
-    repeat_counter = 1 
-    
-    for f in dicom_filepaths: 
+    manifest = _open_manifest(manifest_path, catalog_path)
+    if archive:
         try:
-            l.info('Extracting dicom header data for:    {}'.format(f))
-            uid_filename = _build_dicom_unique_identifier(f)
-            copy_map[f] = uid_filename
-        except BlankDicomHeaderError as err: 
-            l.error(str(err)) 
-        except InvalidDicomError as err: 
-            l.error('You attempted to pass a non-readable filetype to pydicom.dcmread: {}'.format(f))
-            if raise_on_read_error: 
-                raise
-            l.warn('Skipping bad file... {}'.format(f))
-    
-    # treat duplicates 
-    copy_map = _label_duplicates(copy_map)
-    if output_dir:
-        for k,v in copy_map.items():
-            l.info('Copying: {}   to   {}'.format(k, os.path.join(output_dir, v))) 
-            _copy_dicom_file(k, v, output_dir)
+            return _sortdicom_archive(root_dir, output_dir, raise_on_read_error, header_only, workers, executor, stream, 
+                include, exclude, exclude_dirs, magic, metrics, max_labels_in_memory, fast_scan, layout, manifest, compact)
+        finally:
+            if manifest is not None:
+                manifest.close()
+            if metrics_path:
+                metrics.write_prometheus(metrics_path)
+
+    # the walk is consumed as files are parsed so the list of every filepath is never held in memory 
+    dicom_filepaths = _count_discovered(_iter_dicom_filepaths(root_dir, include, exclude, exclude_dirs, magic), metrics)
+
+    index = FileIndex(index_path, layout).open() if index_path else None
+    journal = PlacementJournal(journal_path, resume=resume).open() if journal_path else None
+    dedup = Deduplicator(dedupe_workers).open() if dedupe else None
+    labeler = DuplicateLabeler(max_labels_in_memory)
+    try:
+        if index is not None:
+            dicom_filepaths = index.iter_changed(dicom_filepaths)
+        cached = journal.parsed if journal is not None else None
+        uids = _iter_dicom_unique_identifiers(dicom_filepaths, header_only=header_only, workers=workers, executor=executor, 
+            cached=cached, fast_scan=fast_scan, layout=layout, with_details=manifest is not None or metrics.enabled, 
+            scheduler=scheduler, drop_after_read=not output_dir or placement not in COPYING_PLACEMENTS)
+        if manifest is not None:
+            uids = _manifest_parsed(uids, manifest)
+        uids = _iter_valid_dicom_unique_identifiers(uids, raise_on_read_error, metrics)
+        if journal is not None:
+            uids = _journal_parsed(uids, journal)
+
+        aliases = OrderedDict()  # byte identical copy -> first file with that payload 
+        if dedup is not None:
+            uids = dedup.iter_added(uids)
+            if not stream:
+                uids = list(uids)  # colliding files are hashed in the background while parsing 
+            uids = dedup.iter_unique(uids, aliases)
+
+        # treat duplicates 
+        if index is not None:
+            labeled = _index_label(uids, index)
+        elif stream:
+            labeled = _stream_label(uids)
+        else:
+            for f, uid_filename in uids:  # finish parsing before placing anything 
+                labeler.add(f, uid_filename)
+            labeled = iter(labeler)
+        if not stream and index is not None:
+            labeled = list(labeled)
+
+        copy_map = CompactPathMap() if compact else OrderedDict()  # key -> original name  value -> new name w/ uid 
+        _place_labeled(labeled, copy_map, output_dir, placement, placement_workers, metrics=metrics, journal=journal, 
+            manifest=manifest, scheduler=scheduler)
+        if index is not None:
+            metrics.inc('files_skipped', len(index.unchanged))
+            _place_labeled(index.unchanged, copy_map, output_dir, placement, placement_workers, skip_existing=True, 
+                metrics=metrics, journal=journal, manifest=manifest, scheduler=scheduler)
+
+        aliases = [(alias, canonical, copy_map[canonical]) for alias, canonical in aliases.items()]  # look up before adding 
+        for alias, canonical, new_name in aliases:
+            copy_map[alias] = new_name
+            if manifest is not None:
+                manifest.record_output(alias, new_name, 'deduplicated')
+            if index is not None:
+                index.record_alias(alias, canonical)
+        metrics.inc('files_deduplicated', len(aliases))
+    finally:
+        labeler.close()
+        if dedup is not None:
+            dedup.close()
+        if index is not None:
+            index.close()
+        if journal is not None:
+            journal.close()
+        if manifest is not None:
+            manifest.close()
+        if metrics_path:
+            metrics.write_prometheus(metrics_path)
     
-    return copy_map 
+    return copy_map
+
+
+def sortdicom_shard(root_dir, manifest_path, shard=0, shards=1, raise_on_read_error=True, header_only=True, workers=1, 
+        executor='thread', include=None, exclude=None, exclude_dirs=None, magic=False, metrics=None, fast_scan=True, 
+        layout=None):
+    """ Parse one shard of a sortdicom run and write its partial manifest. Run this once per shard, on as many 
+    nodes as you like, then combine the manifests with merge_manifests and place the files with place_manifest. 
+    Every node walks the whole root_dir so that it knows the walk order, but only parses its own files. 
+
+    :param str root_dir: The root dir for the whole run. Nodes may mount it at different places since the 
+        manifest holds paths relative to it 
+    :param str manifest_path: Where to write this shard's partial manifest 
+    :param int shard: This shard's number, from 0 to shards - 1 
+    :param int shards: The total number of shards 
+    :returns: a dictionary mapping each filepath in this shard to its uid filename before duplicate labeling 
+    :rtype: dict
+    """
+    if not 0 <= shard < shards:
+        raise ValueError('shard must be in range({}), got {}'.format(shards, shard))
+    metrics = metrics or NullMetrics()
+    walk_index = {}  # filepath -> position in the full walk, for the files in flight 
+
+    def mine():
+        for i, f in enumerate(_iter_dicom_filepaths(root_dir, include, exclude, exclude_dirs, magic)):
+            if shard_of(f, root_dir, shards) == shard:
+                metrics.inc('files_discovered')
+                walk_index[f] = i
+                yield f
+
+    uids = _iter_dicom_unique_identifiers(mine(), header_only=header_only, workers=workers, executor=executor, 
+        fast_scan=fast_scan, layout=_get_layout(layout))
+    uid_map = OrderedDict()
+
+    def records():
+        for f, uid_filename in _iter_valid_dicom_unique_identifiers(uids, raise_on_read_error, metrics):
+            uid_map[f] = uid_filename
+            yield walk_index.pop(f), os.path.relpath(f, root_dir), uid_filename
+    header = {'root_dir': os.fspath(root_dir), 'shard': shard, 'shards': shards}
+    count = write_manifest(manifest_path, header, records())
+    l.info('Wrote {} files for shard {}/{} to {}'.format(count, shard, shards, manifest_path))
+    return uid_map
+
+
+def merge_manifests(manifest_paths, merged_path=None, max_labels_in_memory=DEFAULT_MAX_IN_MEMORY, root_dir=None):
+    """ Combine the partial manifests of every shard and label duplicates across all of them. The result is 
+    the same copy_map that sortdicom would return for the whole root_dir on a single node. 
+
+    :param list manifest_paths: The manifest written by sortdicom_shard for each shard 
+    :param str merged_path: If given the merged manifest is written here for place_manifest 
+    :param str root_dir: Where the root dir is mounted on this node. Defaults to the root dir of the first manifest 
+    :returns: a dictionary mapping the original filepath to the new filename 
+    :rtype: dict
+    :raise: ValueError if the manifests are from different runs or a shard is missing 
+    """
+    header, records = iter_merged(manifest_paths, root_dir)
+    with DuplicateLabeler(max_labels_in_memory) as labeler:
+        for i, rel, uid_filename in records:
+            labeler.add(rel, uid_filename)
+        relative_map = OrderedDict(labeler)
+    if merged_path:
+        write_manifest(merged_path, header, relative_map.items())
+    return OrderedDict((os.path.join(header['root_dir'], rel), v) for rel, v in relative_map.items())
+
+
+def place_manifest(merged_path, output_dir, shard=None, placement='copy', placement_workers=1, metrics=None, 
+        root_dir=None):
+    """ Place the files of a merged manifest in the output_dir. If shard is given only the files that belong 
+    to that shard are placed, so each node can place the files it parsed. 
+
+    :param str merged_path: The merged manifest written by merge_manifests or plan_sortdicom 
+    :param str output_dir: The output dir. Created if missing 
+    :param int shard: Only place this shard's files. Places every file if None 
+    :param str root_dir: Read the source files from under this dir instead of the root_dir the manifest was written 
+        for, eg. on a node that mounts the archive somewhere else 
+    :returns: a dictionary mapping each placed filepath to its new filename 
+    :rtype: dict
+    """
+    header = read_manifest_header(merged_path)
+    root_dir = root_dir or header['root_dir']
+    if not os.path.exists(output_dir):
+        l.info('Creating output dir {}'.format(output_dir))
+        os.makedirs(output_dir, exist_ok=True)  # other nodes may be creating it too 
+    labeled = ((os.path.join(root_dir, rel), v) for rel, v in iter_manifest(merged_path))
+    if shard is not None:
+        labeled = ((f, v) for f, v in labeled if shard_of(f, root_dir, header['shards']) == shard)
+    copy_map = OrderedDict()
+    _place_labeled(labeled, copy_map, output_dir, placement, placement_workers, metrics=metrics)
+    return copy_map
+
+
+def plan_sortdicom(root_dir, plan_path, **kwargs):
+    """ Run sortdicom without placing anything and write the result as a plan, a merged manifest that can be 
+    reviewed and then placed with place_manifest, on this node or another. Takes the same keyword arguments 
+    as sortdicom apart from output_dir. dedupe is not supported since a plan has no room for aliases. 
+
+    :param str root_dir: The root dir to sort 
+    :param str plan_path: Where to write the plan 
+    :returns: the same dictionary as sortdicom 
+    :rtype: dict
+    """
+    if kwargs.get('output_dir') or kwargs.get('dedupe'):
+        raise ValueError('output_dir and dedupe are not supported when writing a plan')
+    if is_archive(root_dir):
+        raise ValueError('Archives can not be planned since their members are not files. Use sortdicom instead')
+    copy_map = sortdicom(root_dir, **kwargs)
+    records = ((os.path.relpath(f, root_dir), v) for f, v in copy_map.items())
+    count = write_manifest(plan_path, {'root_dir': os.fspath(root_dir), 'shards': 1}, records)
+    l.info('Wrote a plan for {} files to {}'.format(count, plan_path))
+    return copy_map
+
+
+def _iter_existing(dicom_filepaths):
+    """ pass through the filepaths that still exist. A watched file can be removed before we get to it 
+    """
+    for f in dicom_filepaths:
+        if os.path.exists(f):
+            yield f
+        else:
+            l.warning('File disappeared before it could be sorted: {}'.format(f))
+
+
+def sortdicom_watch(root_dir, output_dir, index_path=None, workers=4, executor='thread', placement='copy', 
+        placement_workers=4, include=None, exclude=None, exclude_dirs=None, fast_scan=True, layout=None, 
+        batch_size=DEFAULT_BATCH_SIZE, batch_timeout=DEFAULT_BATCH_TIMEOUT, settle=DEFAULT_SETTLE, 
+        poll_interval=DEFAULT_POLL_INTERVAL, use_inotify=None, metrics=None, metrics_path=None, stop=None, 
+        on_batch=None, catalog_path=None):
+    """ Long running counterpart of sortdicom for a landing directory that files keep arriving in. Files 
+    already in root_dir are sorted first, then new files are picked up with inotify (or by polling) once they 
+    are completely written and sorted in micro batches, with header extraction and placement running on 
+    worker pools. Duplicate numbering goes through a file index as with sortdicom(index_path=...) and 
+    continues after the names already in the output_dir, so nothing that exists is ever renumbered. 
+    Unreadable files, and files removed before they could be stat'ed, parsed or placed, are logged and skipped. 
+
+    :param str root_dir: The landing directory to watch 
+    :param str output_dir: The output dir. Must not be inside root_dir 
+    :param str index_path: The file index. Defaults to a .sortdicom.index file in the output_dir 
+    :param int batch_size: The most files sorted at once 
+    :param float batch_timeout: Seconds after a file arrives before its batch is sorted even if it isn't full 
+    :param float settle: Seconds a file found by walking the directory must go without writes before it is read. 
+        Files that inotify sees being closed or renamed into place are read straight away 
+    :param float poll_interval: Seconds between walks when polling 
+    :param bool use_inotify: True to require inotify, False to always poll, None (default) to pick automatically 
+    :param str metrics_path: If given a prometheus text dump of the metrics is rewritten here after every batch 
+    :param stop: A threading.Event. The current batch is finished and the function returns once it is set. 
+        Runs until interrupted if None 
+    :param on_batch: Called with the copy_map of each batch after its files are placed 
+    :param str catalog_path: If given every sorted file is added to this catalog.OutputCatalog, which is committed 
+        after every batch so it can be queried while the watch runs 
+    :returns: the number of files sorted 
+    :rtype: int
+    """
+    root = os.path.abspath(root_dir)
+    if os.path.commonpath([root, os.path.abspath(output_dir)]) == root:
+        raise ValueError('The output_dir can not be inside the watched root_dir')
+    if metrics is None:
+        metrics = Metrics() if metrics_path else NullMetrics()
+    layout = _get_layout(layout)
+    os.makedirs(output_dir, exist_ok=True)
+    index_path = index_path or os.path.join(output_dir, INDEX_NAME)
+
+    total = 0
+    catalog = OutputCatalog(catalog_path).open() if catalog_path else None
+    try:
+        with FileIndex(index_path, layout) as index, make_watcher(root_dir, include, exclude, exclude_dirs, poll_interval, settle, 
+                use_inotify) as watcher:
+            index.seed_counters(os.path.relpath(f, output_dir) for f in _iter_dicom_filepaths(output_dir))
+            for batch in iter_batches(watcher, batch_size, batch_timeout, stop):
+                start = time.perf_counter()
+                dicom_filepaths = index.iter_changed(_iter_existing(_count_discovered(batch, metrics)))
+                uids = _iter_dicom_unique_identifiers(dicom_filepaths, workers=workers, executor=executor, 
+                    fast_scan=fast_scan, layout=layout, with_details=catalog is not None)
+                if catalog is not None:
+                    uids = _manifest_parsed(uids, catalog)
+                uids = _iter_valid_dicom_unique_identifiers(uids, raise_on_read_error=False, metrics=metrics)
+                copy_map = OrderedDict()
+                _place_labeled(_index_label(uids, index), copy_map, output_dir, placement, placement_workers, 
+                    metrics=metrics, manifest=catalog, skip_unreadable=True)
+                index.commit()
+                if catalog is not None:
+                    catalog.commit()
+
+                total += len(copy_map)
+                l.info('Sorted {} of {} new files in {:.2f}s'.format(len(copy_map), len(batch), time.perf_counter() - start))
+                if metrics_path:
+                    metrics.write_prometheus(metrics_path)
+                if on_batch is not None:
+                    on_batch(copy_map)
+    finally:
+        if catalog is not None:
+            catalog.close()
+    return total
+
+
+async def _gather_bounded(func, items, concurrency=32, executor=None):
+    """ run a blocking func over every item on the executor with at most concurrency calls in flight. 
+    Results are returned in the same order as the items. 
+    """
+    loop = asyncio.get_event_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(item):
+        try:
+            return await loop.run_in_executor(executor, func, item)
+        finally:
+            semaphore.release()
+
+    tasks = []
+    try:
+        for item in items:
+            await semaphore.acquire()
+            tasks.append(asyncio.ensure_future(run(item)))
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for t in tasks:
+            t.cancel()
+        raise
+
+
+async def sortdicom_async(root_dir, output_dir=None, raise_on_read_error=True, header_only=True, concurrency=32, 
+        placement='copy', include=None, exclude=None, exclude_dirs=None, magic=False, fast_scan=True, layout=None):
+    """ asyncio counterpart of sortdicom for high latency storage such as NFS or SMB mounts. Keeps up to 
+    concurrency header reads and placements in flight at once on a thread pool. Returns the same copy_map 
+    as sortdicom called with the same arguments. 
+
+    :param int concurrency: The maximum number of blocking reads or placements in flight 
+    :returns: a dictionary mapping the original filepath on the system to the new filepath 
+    :rtype: dict
+    """
+    if is_archive(root_dir):
+        raise ValueError('sortdicom_async does not read archives. Use sortdicom instead')
+    loop = asyncio.get_event_loop()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        if output_dir:
+            if not await loop.run_in_executor(pool, os.path.exists, output_dir):
+                l.info('Creating output dir {}'.format(output_dir))
+                await loop.run_in_executor(pool, os.mkdir, output_dir)
+
+        dicom_filepaths = await loop.run_in_executor(pool, functools.partial(
+            _get_all_dicom_filepaths, root_dir, include, exclude, exclude_dirs, magic))
+
+        extract = functools.partial(_extract_dicom_unique_identifier, header_only=header_only, fast_scan=fast_scan, 
+            layout=_get_layout(layout))
+        results = await _gather_bounded(extract, dicom_filepaths, concurrency, pool)
+        uids = _iter_valid_dicom_unique_identifiers(zip(dicom_filepaths, results), raise_on_read_error)
+        copy_map = _label_duplicates(OrderedDict(uids))
+
+        if output_dir:
+            dirs = DirectoryCache()
+            await loop.run_in_executor(pool, dirs.ensure_all, [os.path.join(output_dir, v) for v in copy_map.values()])
+
+            def place(item):
+                l.info('Placing ({}): {}   to   {}'.format(placement, item[0], os.path.join(output_dir, item[1]))) 
+                if placement in TRANSFER_SYNTAXES:
+                    transcode_dicom_file(item[0], os.path.join(output_dir, item[1]), placement)
+                else:
+                    place_dicom_file(item[0], os.path.join(output_dir, item[1]), placement)
+            await _gather_bounded(place, copy_map.items(), concurrency, pool)
 
+    return copy_map
 
@@ -0,0 +1,178 @@
+""" A minimal dicom tag scanner used as a fast path ahead of pydicom. Memory maps the start of a file and
+walks the little endian data elements until every requested tag has been found or passed, without
+building a pydicom Dataset. Anything unusual raises UnsupportedDicomError so the caller can fall back
+to pydicom.
+"""
+
+import os
+import mmap
+import struct
+from collections import namedtuple
+
+SCAN_BYTES = 256 * 1024  # only this much of the file is mapped. Headers live well within it
+PREAMBLE_LENGTH = 128
+MAGIC = b'DICM'
+PIXEL_DATA = (0x7FE0, 0x0010)
+SPECIFIC_CHARACTER_SET = (0x0008, 0x0005)
+UNDEFINED_LENGTH = 0xFFFFFFFF
+
+IMPLICIT_VR_LITTLE_ENDIAN = '1.2.840.10008.1.2'
+EXPLICIT_VR_LITTLE_ENDIAN = '1.2.840.10008.1.2.1'
+ENCAPSULATED_PREFIXES = ('1.2.840.10008.1.2.4.', '1.2.840.10008.1.2.5')  # jpeg family and rle use explicit vr le
+
+# explicit vrs that use a 2 byte reserved field and a 4 byte length
+LONG_VRS = {b'OB', b'OD', b'OF', b'OL', b'OV', b'OW', b'SQ', b'SV', b'UC', b'UN', b'UR', b'UT', b'UV'}
+# vrs we can decode as plain text. Everything in DicomFileHandler.mapping is one of these
+TEXT_VRS = {b'AE', b'AS', b'CS', b'DA', b'DT', b'LO', b'LT', b'SH', b'ST', b'TM', b'UI'}
+# character sets whose ascii range decodes the same way pydicom does
+SIMPLE_CHARSETS = {'', 'ISO_IR 6', 'ISO_IR 100', 'ISO_IR 192'}
+
+_tag = struct.Struct('<HH')
+_short_length = struct.Struct('<H')
+_long_length = struct.Struct('<I')
+
+ScannedElement = namedtuple('ScannedElement', ['tag', 'value'])
+
+
+class UnsupportedDicomError(Exception):
+    """ thrown when the scanner cannot handle a file and pydicom should read it instead
+    """
+
+
+def _decode(raw=b''):
+    """ decode a text value the way pydicom would, or bail on anything that needs pydicom's rules
+    """
+    if b'\\' in raw:
+        raise UnsupportedDicomError('multi valued element')
+    value = raw.rstrip(b' \x00')
+    if value[:1].isspace() or b'\x00' in value:
+        raise UnsupportedDicomError('leading whitespace or embedded null')
+    try:
+        return value.decode('ascii')
+    except UnicodeDecodeError:
+        raise UnsupportedDicomError('non ascii value')
+
+
+def _iter_elements(buf, offset=0, explicit=True, stop_group=None, truncated=False):
+    """ yields (tag, vr, value_offset, length) for the top level elements starting at offset. If stop_group
+    is given the walk ends at the first element from a different group. Running off the end of the
+    buffer is only fine if it is the real end of the file.
+    """
+    end = len(buf)
+    while offset + 8 <= end:
+        tag = _tag.unpack_from(buf, offset)
+        if stop_group is not None and tag[0] != stop_group:
+            return
+        if explicit:
+            vr = buf[offset + 4:offset + 6]
+            if not vr.isalpha() or not vr.isupper():
+                raise UnsupportedDicomError('bad explicit vr')
+            if vr in LONG_VRS:
+                if offset + 12 > end:
+                    raise UnsupportedDicomError('truncated element')
+                length = _long_length.unpack_from(buf, offset + 8)[0]
+                value_offset = offset + 12
+            else:
+                length = _short_length.unpack_from(buf, offset + 6)[0]
+                value_offset = offset + 8
+        else:
+            vr = None
+            length = _long_length.unpack_from(buf, offset + 4)[0]
+            value_offset = offset + 8
+
+        yield tag, vr, value_offset, length
+        if length == UNDEFINED_LENGTH:
+            raise UnsupportedDicomError('undefined length element')
+        offset = value_offset + length
+    if truncated or offset != end:
+        raise UnsupportedDicomError('ran out of scanned bytes')
+
+
+def _read_transfer_syntax(buf):
+    """ walk the file meta group and return (transfer syntax, offset of the dataset)
+    """
+    if buf[PREAMBLE_LENGTH:PREAMBLE_LENGTH + 4] != MAGIC:
+        raise UnsupportedDicomError('no DICM magic')
+    offset = PREAMBLE_LENGTH + 4
+    transfer_syntax = None
+    for tag, vr, value_offset, length in _iter_elements(buf, offset, explicit=True, stop_group=0x0002):
+        if tag == (0x0002, 0x0010):
+            transfer_syntax = buf[value_offset:value_offset + length].rstrip(b' \x00').decode('ascii')
+        offset = value_offset + length
+    if transfer_syntax is None:
+        raise UnsupportedDicomError('no transfer syntax')
+    return transfer_syntax, offset
+
+
+def scan_tags(filepath='', tags=None):
+    """ read the values of the requested top level tags from a dicom file
+
+    :param str filepath: The filepath to the dicom file
+    :param list tags: (group, element) tuples to look for
+    :returns: a dict of tag -> ScannedElement for every tag that was found. Missing tags are left out
+    :rtype: dict
+    :raise: UnsupportedDicomError if the file needs pydicom. This includes unreadable files so that
+        pydicom can raise its usual errors
+    """
+    wanted, last = _wanted(tags)
+    try:
+        with open(filepath, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size <= PREAMBLE_LENGTH + 4:
+                raise UnsupportedDicomError('too small')
+            with mmap.mmap(f.fileno(), min(size, SCAN_BYTES), access=mmap.ACCESS_READ) as buf:
+                return _scan(buf, wanted, last, truncated=size > SCAN_BYTES)
+    except (OSError, ValueError, struct.error) as err:
+        raise UnsupportedDicomError(str(err))
+
+
+def scan_buffer(buf=b'', tags=None, truncated=False):
+    """ same as scan_tags for a dicom file that is already in memory, such as an archive member
+
+    :param bytes buf: The file contents
+    :param list tags: (group, element) tuples to look for
+    :param bool truncated: buf is only the start of the file
+    :returns: a dict of tag -> ScannedElement for every tag that was found
+    :rtype: dict
+    :raise: UnsupportedDicomError if the file needs pydicom
+    """
+    wanted, last = _wanted(tags)
+    if len(buf) <= PREAMBLE_LENGTH + 4:
+        raise UnsupportedDicomError('too small')
+    try:
+        return _scan(buf, wanted, last, truncated=truncated)
+    except (ValueError, struct.error) as err:
+        raise UnsupportedDicomError(str(err))
+
+
+def _wanted(tags=None):
+    wanted = set(tuple(t) for t in tags)
+    return wanted, max(wanted)
+
+
+def _scan(buf, wanted, last, truncated=False):
+    transfer_syntax, offset = _read_transfer_syntax(buf)
+    if transfer_syntax == IMPLICIT_VR_LITTLE_ENDIAN:
+        explicit = False
+    elif transfer_syntax == EXPLICIT_VR_LITTLE_ENDIAN or transfer_syntax.startswith(ENCAPSULATED_PREFIXES):
+        explicit = True
+    else:
+        raise UnsupportedDicomError('unsupported transfer syntax {}'.format(transfer_syntax))
+
+    found = {}
+    for tag, vr, value_offset, length in _iter_elements(buf, offset, explicit, truncated=truncated):
+        if tag > last or tag >= PIXEL_DATA:
+            break
+        if tag == SPECIFIC_CHARACTER_SET:
+            charset = buf[value_offset:value_offset + length].rstrip(b' \x00').decode('ascii', 'replace')
+            if charset not in SIMPLE_CHARSETS:
+                raise UnsupportedDicomError('character set {}'.format(charset))
+        if tag in wanted:
+            if vr is not None and vr not in TEXT_VRS:
+                raise UnsupportedDicomError('unexpected vr for {}'.format(tag))
+            if value_offset + length > len(buf):
+                raise UnsupportedDicomError('truncated element')
+            found[tag] = ScannedElement(tag, _decode(buf[value_offset:value_offset + length]))
+            if len(found) == len(wanted):
+                break
+    return found
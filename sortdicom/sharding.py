@@ -0,0 +1,90 @@
+""" Splits one sortdicom run over several nodes. Every file belongs to exactly one shard, chosen by a
+stable hash of its path relative to the root dir, so each node can parse its shard on its own and write a
+partial manifest. Merging the manifests replays the files in their original walk order, which gives exactly
+the duplicate numbering a single node would have produced. Manifests hold paths relative to the root dir,
+so nodes can mount the archive at different places.
+"""
+
+import os
+import json
+import heapq
+import hashlib
+import pathlib
+from operator import itemgetter
+
+import logging
+l = logging.getLogger(__name__)
+
+
+def shard_of(filepath='', root_dir='', shards=1):
+    """ the shard a file belongs to. Uses the path relative to root_dir so that nodes which mount the
+    archive at different places still agree.
+
+    :param str filepath: The source filepath
+    :param str root_dir: The root dir of the run
+    :param int shards: The total number of shards
+    :returns: a shard number in range(shards)
+    :rtype: int
+    """
+    rel = pathlib.PurePath(os.path.relpath(filepath, root_dir)).as_posix()
+    digest = hashlib.blake2b(rel.encode('utf-8', 'surrogateescape'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % shards
+
+
+def write_manifest(manifest_path='', header=None, records=None):
+    """ write a manifest as json lines, a header dict followed by one list per record. The manifest is
+    written to a temp name and renamed into place so a crashed node never leaves a partial manifest.
+
+    :returns: the number of records written
+    :rtype: int
+    """
+    tmp = manifest_path + '.part'
+    count = 0
+    with open(tmp, 'w') as f:
+        f.write(json.dumps(header) + '\n')
+        for record in records:
+            f.write(json.dumps(record) + '\n')
+            count += 1
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, manifest_path)
+    return count
+
+
+def read_manifest_header(manifest_path=''):
+    with open(manifest_path) as f:
+        return json.loads(f.readline())
+
+
+def iter_manifest(manifest_path=''):
+    """ yields the records of a manifest as tuples
+    """
+    with open(manifest_path) as f:
+        f.readline()
+        for line in f:
+            yield tuple(json.loads(line))
+
+
+def iter_merged(manifest_paths, root_dir=None):
+    """ check that the partial manifests cover every shard of the same run exactly once and yield their
+    (walk_index, relative path, uid_filename) records merged back into walk order. Each partial manifest is
+    already in walk order so this is a streaming merge.
+
+    :param list manifest_paths: The partial manifests written by every shard
+    :param str root_dir: The root dir of the merged run. Defaults to the root dir of the first manifest
+    :returns: (header, generator of records) where header has the root_dir and shards of the run
+    :raise: ValueError if the manifests don't belong together or a shard is missing
+    """
+    headers = [read_manifest_header(p) for p in manifest_paths]
+    if not headers:
+        raise ValueError('No manifests to merge')
+    root_dir, shards = root_dir or headers[0]['root_dir'], headers[0]['shards']
+    for path, header in zip(manifest_paths, headers):
+        if header['shards'] != shards:
+            raise ValueError('Manifest {} is from a different run'.format(path))
+    found = sorted(h['shard'] for h in headers)
+    if found != list(range(shards)):
+        raise ValueError('Expected one manifest for each of {} shards but got shards {}'.format(shards, found))
+
+    records = heapq.merge(*[iter_manifest(p) for p in manifest_paths], key=itemgetter(0))
+    return {'root_dir': root_dir, 'shards': shards}, records
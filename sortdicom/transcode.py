@@ -0,0 +1,168 @@
+""" Re-encodes uncompressed dicom files to a lossless compressed transfer syntax while they are placed. Both
+syntaxes are written by pydicom alone: "deflate" zlib compresses the whole dataset and "rle" RLE encodes
+the pixel data. Transcoding is parse and cpu bound so Transcoder runs it on a process pool. Files that
+are already compressed, that pydicom can't encode, or that would come out larger, are copied as they are.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pydicom
+from pydicom.uid import DeflatedExplicitVRLittleEndian, RLELossless
+
+from .placement import FilePlacer, place_dicom_file, _temp_path
+
+import logging
+l = logging.getLogger(__name__)
+
+TRANSFER_SYNTAXES = {
+    'deflate': DeflatedExplicitVRLittleEndian,  # whole dataset, any pixel data
+    'rle': RLELossless,                         # pixel data only
+}
+
+
+def _encode(ds, syntax='deflate'):
+    """ switch a dataset to the transfer syntax in place. Returns False if it is left as it was 
+    """
+    transfer_syntax = ds.file_meta.get('TransferSyntaxUID')
+    if transfer_syntax is None or transfer_syntax.is_compressed or transfer_syntax == DeflatedExplicitVRLittleEndian:
+        return False
+    if syntax == 'rle':
+        if 'PixelData' not in ds:
+            return False
+        ds.compress(RLELossless)
+    else:
+        ds.file_meta.TransferSyntaxUID = DeflatedExplicitVRLittleEndian
+    return True
+
+
+def _save_as(ds, filepath=''):
+    """ write a dataset as a standard dicom file with its preamble and file meta 
+    """
+    try:
+        ds.save_as(filepath, enforce_file_format=True)
+    except TypeError:  # pydicom < 3.0
+        ds.save_as(filepath, write_like_original=False)
+
+
+def transcode_dicom_file(src='', dst='', syntax='deflate'):
+    """ write src to dst in a lossless compressed transfer syntax, through a temp name like 
+    placement.place_dicom_file. Falls back to a copy if the file is already compressed, can't be encoded or 
+    would not get any smaller, so the output is never larger than the source. 
+
+    :param str src: The source filepath 
+    :param str dst: The destination filepath 
+    :param str syntax: One of "deflate" or "rle" 
+    :returns: (source size, output size, seconds) 
+    :rtype: tuple 
+    :raise: ValueError if the syntax is invalid 
+    """
+    if syntax not in TRANSFER_SYNTAXES:
+        raise ValueError('Invalid transfer syntax. Use one of: {}'.format(list(TRANSFER_SYNTAXES.keys())))
+    start = time.perf_counter()
+    size = os.stat(src).st_size
+
+    ds = pydicom.dcmread(src)
+    try:
+        encoded = _encode(ds, syntax)
+    except (ValueError, NotImplementedError, RuntimeError, AttributeError) as err:
+        l.warning('Could not {} {} -> falling back to copy. ({})'.format(syntax, src, err))
+        encoded = False
+    if not encoded:
+        place_dicom_file(src, dst, 'copy')
+        return size, size, time.perf_counter() - start
+
+    tmp = _temp_path(dst)
+    try:
+        _save_as(ds, tmp)
+        output_size = os.stat(tmp).st_size
+    except BaseException:
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+        raise
+    if output_size >= size:
+        os.remove(tmp)
+        place_dicom_file(src, dst, 'copy')
+        return size, size, time.perf_counter() - start
+    os.replace(tmp, dst)
+    return size, output_size, time.perf_counter() - start
+
+
+class Transcoder(FilePlacer):
+    """ A FilePlacer that transcodes each file on a process pool instead of copying it. on_placed is called 
+    with (src, new_name, bytes_saved) on the calling thread. metrics get bytes_placed for the bytes written 
+    and bytes_saved for the difference to the source. With workers=1 files are transcoded synchronously. 
+    """
+
+    def __init__(self, target_dir='', syntax='deflate', workers=1, metrics=None, on_placed=None, on_error=None, 
+            scheduler=None):
+        if syntax not in TRANSFER_SYNTAXES:
+            raise ValueError('Invalid transfer syntax. Use one of: {}'.format(list(TRANSFER_SYNTAXES.keys())))
+        super().__init__(target_dir, 'copy', workers, metrics, on_placed, on_error, scheduler)
+        self.strategy = syntax
+
+
+    def __enter__(self):
+        if self.workers > 1:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self
+
+
+    def place(self, src='', new_name=''):
+        """ transcode src into the target dir as new_name. Blocks if too many files are in flight.
+        """
+        dst = os.path.join(self.target_dir, new_name)
+        self.dirs.ensure_parent(dst)
+        dev = self.scheduler.device(src) if self.scheduler is not None else None
+        if self._pool is None:
+            self._finish(src, new_name, lambda: self._throttled(dev, transcode_dicom_file, src, dst, self.strategy))
+            return
+
+        if self.scheduler is not None:
+            self.scheduler.acquire(dev)
+        fut = self._pool.submit(transcode_dicom_file, src, dst, self.strategy)
+        if self.scheduler is not None:
+            fut.add_done_callback(lambda fut: self.scheduler.release(dev))  # not in _finish, which runs on this thread 
+        self._pending.append((src, new_name, fut))
+        while len(self._pending) >= self.workers * 2:
+            self._finish_next()
+
+
+    def _throttled(self, dev, func, *args):
+        if self.scheduler is None:
+            return func(*args)
+        self.scheduler.acquire(dev)
+        try:
+            return func(*args)
+        finally:
+            self.scheduler.release(dev)
+
+
+    def _finish_next(self):
+        src, new_name, fut = self._pending.popleft()
+        self._finish(src, new_name, fut.result)
+
+
+    def _finish(self, src='', new_name='', result=None):
+        try:
+            size, output_size, seconds = result()
+        except OSError as err:
+            if self.on_error is None:
+                raise
+            self.on_error(src, new_name, err)
+            return
+        if self.metrics is not None:
+            self.metrics.observe('place_seconds', seconds)
+            self.metrics.inc('files_placed')
+            self.metrics.inc('bytes_placed', output_size)
+            self.metrics.inc('bytes_saved', size - output_size)
+        if self.on_placed is not None:
+            self.on_placed(src, new_name, size - output_size)
+
+
+    def wait(self):
+        """ wait for all pending files to finish
+        """
+        while self._pending:
+            self._finish_next()
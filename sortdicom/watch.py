@@ -0,0 +1,298 @@
+""" Watches a landing directory for newly arriving dicom files and hands them out in micro batches. On linux
+inotify tells us as soon as a writer closes a file or renames it into place. Everywhere else, or if inotify
+can't be used, the directory is walked every poll interval instead. Files that are only found by a walk are
+handed out once they have not been modified for settle seconds, so half written files are never read.
+"""
+
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+
+from .discovery import iter_dicom_filepaths, _compile_patterns, DEFAULT_INCLUDE
+
+import logging
+l = logging.getLogger(__name__)
+
+DEFAULT_SETTLE = 2.0         # seconds without writes before a file found by a walk is considered complete
+DEFAULT_POLL_INTERVAL = 1.0  # seconds between walks of the polling watcher
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_BATCH_TIMEOUT = 1.0  # seconds after its first file that a batch is handed out even if it isn't full
+
+# from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_ONLYDIR
+EVENT = struct.Struct('iIII')  # wd, mask, cookie, len followed by the name
+READ_SIZE = 64 * 1024
+
+
+class PollingWatcher:
+    """ Finds new and changed dicom files under root_dir by walking it every interval seconds. Uses the same 
+    include, exclude and exclude_dirs globs as discovery.iter_dicom_filepaths. Use as a context manager. 
+    """
+
+    def __init__(self, root_dir='', include=None, exclude=None, exclude_dirs=None, interval=DEFAULT_POLL_INTERVAL, 
+            settle=DEFAULT_SETTLE):
+        self.root_dir = os.fspath(root_dir)
+        self.include = include
+        self.exclude = exclude
+        self.exclude_dirs = exclude_dirs
+        self.interval = interval
+        self.settle = settle
+        self._emitted = {}     # filepath -> (size, mtime_ns) when it was handed out
+        self._settling = set() # filepaths found by a walk that may still be written to
+        self._next_walk = 0.0
+
+
+    def __enter__(self):
+        self.open()
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def open(self):
+        return self
+
+
+    def close(self):
+        pass
+
+
+    def _walk(self):
+        found = set(iter_dicom_filepaths(self.root_dir, self.include, self.exclude, self.exclude_dirs))
+        for f in set(self._emitted) - found:
+            del self._emitted[f]  # gone, eg. moved out by placement="move" 
+        self._settling.update(found)
+
+
+    def _stat_key(self, filepath=''):
+        try:
+            st = os.stat(filepath)
+        except OSError:
+            return None, None
+        return (st.st_size, st.st_mtime_ns), st.st_mtime
+
+
+    def _emit(self, filepath='', key=None, ready=None):
+        if key is not None and self._emitted.get(filepath) != key:
+            self._emitted[filepath] = key
+            ready.append(filepath)
+
+
+    def _check_settling(self, ready):
+        """ hand out the settling files that have not been written to for settle seconds 
+        """
+        now = time.time()
+        for f in sorted(self._settling):
+            key, mtime = self._stat_key(f)
+            if key is None:
+                self._settling.discard(f)  # deleted before it settled
+            elif now - mtime >= self.settle:
+                self._settling.discard(f)
+                self._emit(f, key, ready)
+
+
+    def poll(self, timeout=0.0):
+        """ wait up to timeout seconds for files that are ready to be read 
+        :returns: a list of filepaths, new or changed since they were last handed out 
+        """
+        now = time.monotonic()
+        if now < self._next_walk:
+            time.sleep(min(timeout, self._next_walk - now))
+        ready = []
+        if time.monotonic() >= self._next_walk:
+            self._walk()
+            self._next_walk = time.monotonic() + self.interval
+        self._check_settling(ready)
+        return ready
+
+
+def _load_libc():
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1, libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+def inotify_available():
+    """ True if this platform has inotify 
+    """
+    return _load_libc() is not None
+
+
+class InotifyWatcher(PollingWatcher):
+    """ Like PollingWatcher but woken up by inotify. A file is ready as soon as the process writing it closes 
+    it or renames it into place. New directories are watched as they appear and walked once in case files 
+    landed in them before the watch was added. Those files, files that are only ever created such as hard 
+    links, the files already there at startup, and everything after an event queue overflow are treated like 
+    the polling watcher treats them. 
+    """
+
+    def __init__(self, root_dir='', include=None, exclude=None, exclude_dirs=None, interval=DEFAULT_POLL_INTERVAL, 
+            settle=DEFAULT_SETTLE):
+        super().__init__(root_dir, include, exclude, exclude_dirs, interval, settle)
+        self._include = _compile_patterns(DEFAULT_INCLUDE if include is None else include)
+        self._exclude = _compile_patterns(exclude)
+        self._exclude_dirs = _compile_patterns(exclude_dirs)
+        self._libc = None
+        self._fd = None
+        self._watches = {}  # wd -> directory
+
+
+    def open(self):
+        """ set up the watches. Raises OSError if inotify is unavailable or out of watches 
+        """
+        if self._fd is not None:
+            return self
+        self._libc = _load_libc()
+        if self._libc is None:
+            raise OSError(errno.ENOSYS, 'inotify is not available')
+        fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self._fd = fd
+        try:
+            self._watch_tree(self.root_dir)
+        except OSError:
+            self.close()
+            raise
+        self._walk()
+        return self
+
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        self._watches = {}
+
+
+    def _watch_tree(self, top=''):
+        """ watch top and every directory below it that isn't excluded 
+        """
+        for dirpath, dirnames, filenames in os.walk(top):
+            dirnames[:] = [d for d in dirnames if not (self._exclude_dirs and self._exclude_dirs.match(d)) 
+                and not os.path.islink(os.path.join(dirpath, d))]
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(dirpath), WATCH_MASK)
+            if wd < 0:
+                err = ctypes.get_errno()
+                if err in (errno.ENOENT, errno.ENOTDIR):
+                    continue  # removed while we were walking
+                raise OSError(err, 'inotify_add_watch failed for {}'.format(dirpath))
+            self._watches[wd] = dirpath
+
+
+    def _wanted(self, name=''):
+        if self._exclude and self._exclude.match(name):
+            return False
+        return bool(self._include and self._include.match(name))
+
+
+    def _read_events(self, ready):
+        try:
+            buf = os.read(self._fd, READ_SIZE)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset + EVENT.size <= len(buf):
+            wd, mask, cookie, length = EVENT.unpack_from(buf, offset)
+            name = os.fsdecode(buf[offset + EVENT.size:offset + EVENT.size + length].rstrip(b'\0'))
+            offset += EVENT.size + length
+
+            if mask & IN_Q_OVERFLOW:
+                l.warning('inotify queue overflowed, walking {} again'.format(self.root_dir))
+                self._walk()
+                continue
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            parent = self._watches.get(wd)
+            if parent is None:
+                continue
+            path = os.path.join(parent, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and not (self._exclude_dirs and self._exclude_dirs.match(name)):
+                    self._watch_tree(path)
+                    self._settling.update(iter_dicom_filepaths(path, self.include, self.exclude, self.exclude_dirs))
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                self._settling.discard(path)
+                self._emitted.pop(path, None)
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO) and self._wanted(name):
+                self._settling.discard(path)
+                self._emit(path, self._stat_key(path)[0], ready)
+            elif mask & IN_CREATE and self._wanted(name):
+                self._settling.add(path)  # a hard link never gets a close event, so let it settle
+
+
+    def poll(self, timeout=0.0):
+        if self._settling:
+            timeout = min(timeout, self.interval)  # come back to check on them 
+        ready = []
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if readable:
+            self._read_events(ready)
+        self._check_settling(ready)
+        return ready
+
+
+def make_watcher(root_dir='', include=None, exclude=None, exclude_dirs=None, interval=DEFAULT_POLL_INTERVAL, 
+        settle=DEFAULT_SETTLE, use_inotify=None):
+    """ open an InotifyWatcher if possible and a PollingWatcher otherwise 
+
+    :param bool use_inotify: True to require inotify, False to always poll. None (default) uses inotify if it 
+        is available and falls back to polling if it can't be set up, eg. if the user is out of watches 
+    :returns: an open watcher 
+    """
+    if use_inotify or (use_inotify is None and inotify_available()):
+        watcher = InotifyWatcher(root_dir, include, exclude, exclude_dirs, interval, settle)
+        try:
+            return watcher.open()
+        except OSError as err:
+            if use_inotify:
+                raise
+            l.warning('Could not watch {} with inotify -> falling back to polling. ({})'.format(root_dir, err))
+    return PollingWatcher(root_dir, include, exclude, exclude_dirs, interval, settle).open()
+
+
+def iter_batches(watcher, batch_size=DEFAULT_BATCH_SIZE, batch_timeout=DEFAULT_BATCH_TIMEOUT, stop=None):
+    """ group the files a watcher hands out into micro batches. A batch is yielded once it has batch_size 
+    files or batch_timeout seconds after its first file arrived, whichever comes first. 
+
+    :param stop: A threading.Event. The current batch is yielded and iteration ends once it is set 
+    :returns: a generator of lists of filepaths 
+    """
+    batch = {}
+    deadline = None
+    while stop is None or not stop.is_set():
+        timeout = batch_timeout if deadline is None else max(0.0, deadline - time.monotonic())
+        for f in watcher.poll(timeout):
+            if not batch:
+                deadline = time.monotonic() + batch_timeout
+            batch[f] = None
+        if batch and (len(batch) >= batch_size or time.monotonic() >= deadline):
+            files = list(batch)
+            for i in range(0, len(files), batch_size):
+                yield files[i:i + batch_size]
+            batch = {}
+            deadline = None
+    if batch:
+        yield list(batch)
@@ -0,0 +1,85 @@
+""" test the archive module
+"""
+
+import unittest
+import os
+import io
+import shutil
+import tarfile
+import zipfile
+import tempfile
+
+from sortdicom import archive
+from sortdicom.archive import DicomArchive
+
+DICOM = b'\x00' * 128 + b'DICM' + b'rest of the file'
+
+MEMBERS = [
+    ('study/a.dcm', DICOM),
+    ('study/B.DCM', DICOM + b'b'),
+    ('study/notes.csv', b'a,b'),
+    ('study/export', DICOM + b'magic'),
+    ('skip/c.dcm', DICOM),
+]
+
+
+class TestDicomArchive(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.zip_path = os.path.join(self.tmpdir, 'study.zip')
+        with zipfile.ZipFile(self.zip_path, 'w', zipfile.ZIP_DEFLATED) as z:
+            for name, data in MEMBERS:
+                z.writestr(name, data)
+        self.tar_path = os.path.join(self.tmpdir, 'study.tar.gz')
+        with tarfile.open(self.tar_path, 'w:gz') as t:
+            for name, data in MEMBERS:
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                t.addfile(info, io.BytesIO(data))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_is_archive(self):
+        self.assertTrue(archive.is_archive(self.zip_path))
+        self.assertTrue(archive.is_archive(self.tar_path))
+        self.assertFalse(archive.is_archive(self.tmpdir))
+        self.assertFalse(archive.is_archive(os.path.join(self.tmpdir, 'missing.zip')))
+
+    def test_iter_members_filters_like_discovery(self):
+        for path in [self.zip_path, self.tar_path]:
+            with DicomArchive(path, exclude_dirs=['skip']) as a:
+                members = list(a.iter_members())
+            self.assertListEqual(members, [
+                (os.path.join(path, 'study/a.dcm'), DICOM, len(DICOM)),
+                (os.path.join(path, 'study/B.DCM'), DICOM + b'b', len(DICOM) + 1),
+            ])
+
+    def test_iter_members_magic_picks_up_extensionless_files(self):
+        with DicomArchive(self.tar_path, magic=True) as a:
+            names = [k for k, prefix, size in a.iter_members()]
+        self.assertIn(os.path.join(self.tar_path, 'study/export'), names)
+        self.assertNotIn(os.path.join(self.tar_path, 'study/notes.csv'), names)
+
+    def test_iter_open_members_only_opens_requested(self):
+        for path in [self.zip_path, self.tar_path]:
+            wanted = [os.path.join(path, 'study/B.DCM')]
+            with DicomArchive(path) as a:
+                opened = [(k, f.read()) for k, f in a.iter_open_members(wanted)]
+            self.assertListEqual(opened, [(wanted[0], DICOM + b'b')])
+
+    def test_iter_members_only_reads_a_prefix(self):
+        for path in [self.zip_path, self.tar_path]:
+            with DicomArchive(path, exclude_dirs=['skip']) as a:
+                members = list(a.iter_members(prefix_bytes=130))
+                self.assertListEqual([(prefix, size) for k, prefix, size in members], 
+                    [(DICOM[:130], len(DICOM)), (DICOM[:130], len(DICOM) + 1)])
+                with a.open_member(members[1][0]) as f:
+                    self.assertEqual(f.read(), DICOM + b'b')
+                with self.assertRaises(KeyError):
+                    a.open_member(os.path.join(path, 'study/missing.dcm'))
+
+    def test_not_an_archive_raises_ValueError(self):
+        with self.assertRaises(ValueError):
+            DicomArchive(self.tmpdir)
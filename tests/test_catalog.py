@@ -0,0 +1,75 @@
+""" test the catalog module
+"""
+
+import unittest
+import os
+import sqlite3
+import shutil
+import tempfile
+
+from sortdicom.catalog import OutputCatalog, query_catalog
+
+
+class TestOutputCatalog(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.catalog_path = os.path.join(self.tmpdir, 'catalog')
+        with OutputCatalog(self.catalog_path) as catalog:
+            for i, (mrn, lat, view, date) in enumerate([
+                    ('TCGA-1', 'L', 'CC', '20010101'),
+                    ('TCGA-1', 'R', 'MLO', '20010607'),
+                    ('TCGA-2', 'L', 'CC', '20020202')]):
+                f = '/in/{}.dcm'.format(i)
+                catalog.record_parsed(f, {'size': 10 + i, 'mrn': mrn, 'laterality': lat, 'view': view, 'date': date})
+                catalog.record_output(f, '{}_{}_{}_{}_1.dcm'.format(mrn, lat, view, date), 'placed')
+            catalog.record_parsed('/in/bad.dcm', {'size': 1, 'mrn': '', 'view': ''})
+            catalog.record_error('/in/bad.dcm', 'blank', 'No headers')
+            catalog.record_output('/in/unchanged.dcm', 'x.dcm', 'skipped')
+            catalog.record_parsed('/in/dry.dcm', {'size': 1, 'mrn': 'TCGA-1', 'view': 'CC'})
+            catalog.record_output('/in/dry.dcm', 'TCGA-1_dry.dcm', 'parsed')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_query_by_header_and_date_range(self):
+        with OutputCatalog(self.catalog_path) as catalog:
+            self.assertListEqual(catalog.query(mrn='TCGA-1'), 
+                ['TCGA-1_L_CC_20010101_1.dcm', 'TCGA-1_R_MLO_20010607_1.dcm'])
+            self.assertListEqual(catalog.query(view='CC', date_from='20020101'), ['TCGA-2_L_CC_20020202_1.dcm'])
+            self.assertListEqual(catalog.query(date_from='20010201', date_to='20011231'), ['TCGA-1_R_MLO_20010607_1.dcm'])
+            self.assertEqual(len(catalog.query(mrn=['TCGA-1', 'TCGA-2'])), 3)
+            self.assertListEqual(catalog.query(mrn='TCGA-3'), [])
+            with self.assertRaises(ValueError):
+                catalog.query(blah='x')
+
+    def test_lookup_and_rerun_replaces_rows(self):
+        with OutputCatalog(self.catalog_path) as catalog:
+            self.assertDictEqual(catalog.lookup('TCGA-2_L_CC_20020202_1.dcm'), {'output_path': 'TCGA-2_L_CC_20020202_1.dcm', 
+                'source_path': '/in/2.dcm', 'size': 12, 'mrn': 'TCGA-2', 'laterality': 'L', 'view': 'CC', 
+                'date': '20020202'})
+            self.assertIsNone(catalog.lookup('x.dcm'))
+            catalog.record_parsed('/in/moved.dcm', {'size': 5, 'mrn': 'TCGA-2', 'laterality': 'L', 'view': 'CC', 
+                'date': '20020202'})
+            catalog.record_output('/in/moved.dcm', 'TCGA-2_L_CC_20020202_1.dcm', 'placed')
+            self.assertEqual(catalog.lookup('TCGA-2_L_CC_20020202_1.dcm')['source_path'], '/in/moved.dcm')
+        self.assertEqual(len(query_catalog(self.catalog_path)), 3)
+
+    def test_uses_an_index_per_header(self):
+        conn = sqlite3.connect(self.catalog_path)
+        plan = ' '.join(str(r) for r in conn.execute('EXPLAIN QUERY PLAN SELECT output_path FROM outputs WHERE mrn = ?', 
+            ('TCGA-1',)))
+        conn.close()
+        self.assertIn('outputs_mrn', plan)
+
+    def test_query_catalog_missing_raises_IOError(self):
+        with self.assertRaises(IOError):
+            query_catalog(os.path.join(self.tmpdir, 'missing'))
+
+    def test_files_waiting_for_an_output_are_not_kept_across_runs(self):
+        with OutputCatalog(self.catalog_path) as catalog:
+            catalog.record_parsed('/in/pending.dcm', {'size': 7, 'mrn': 'TCGA-3'})
+            self.assertEqual(catalog.conn.execute('SELECT COUNT(*) FROM parsed').fetchone()[0], 1)
+        with OutputCatalog(self.catalog_path) as catalog:
+            catalog.record_output('/in/pending.dcm', 'TCGA-3_1.dcm', 'placed')
+            self.assertListEqual(catalog.query(mrn='TCGA-3'), [])
@@ -0,0 +1,102 @@
+""" test the cli module
+"""
+
+import unittest
+import os
+import sys
+import json
+import shutil
+import subprocess
+import tempfile
+from click.testing import CliRunner
+
+from . import DATA_DIR
+import sortdicom.processor as processor
+from sortdicom.cli import main
+
+
+class TestCli(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.plan_path = os.path.join(self.tmpdir, 'plan.jsonl')
+        self.output_dir = os.path.join(self.tmpdir, 'output')
+        self.root_dir = os.path.join(DATA_DIR, 'patientA')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_plan_then_execute_matches_sortdicom(self):
+        expected = processor.sortdicom(self.root_dir)
+        runner = CliRunner()
+        result = runner.invoke(main, ['plan', self.root_dir, self.plan_path, '--workers', '2', '--no-progress'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('files/sec', result.output)
+        with open(self.plan_path) as f:
+            header = json.loads(f.readline())
+            self.assertEqual(header['root_dir'], self.root_dir)
+            self.assertListEqual([tuple(json.loads(line)) for line in f], 
+                [(os.path.relpath(k, self.root_dir), v) for k, v in expected.items()])
+
+        result = runner.invoke(main, ['execute', self.plan_path, self.output_dir, '--workers', '2', '--no-progress'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('Placed {} files'.format(len(expected)), result.output)
+        self.assertListEqual(sorted(os.listdir(self.output_dir)), sorted(expected.values()))
+
+    def test_execute_on_another_root_dir(self):
+        processor.plan_sortdicom(self.root_dir, self.plan_path)
+        moved = os.path.join(self.tmpdir, 'mounted_elsewhere')
+        shutil.copytree(self.root_dir, moved)
+        result = CliRunner().invoke(main, ['execute', self.plan_path, self.output_dir, '--root-dir', moved, 
+            '--placement', 'move', '--no-progress'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(len(processor._get_all_dicom_filepaths(moved)), 0)
+        self.assertEqual(len(os.listdir(self.output_dir)), len(processor._get_all_dicom_filepaths(self.root_dir)))
+
+    def test_plan_rejects_dedupe_and_bad_arguments(self):
+        with self.assertRaises(ValueError):
+            processor.plan_sortdicom(self.root_dir, self.plan_path, dedupe=True)
+        result = CliRunner().invoke(main, ['execute', self.plan_path, self.output_dir, '--placement', 'blah'])
+        self.assertNotEqual(result.exit_code, 0)
+
+    def test_plan_stores_an_absolute_root_and_reports_bad_input(self):
+        cwd = os.getcwd()
+        os.chdir(DATA_DIR)
+        try:
+            result = CliRunner().invoke(main, ['plan', 'patientA', self.plan_path, '--no-progress'])
+        finally:
+            os.chdir(cwd)
+        self.assertEqual(result.exit_code, 0, result.output)
+        with open(self.plan_path) as f:
+            self.assertEqual(json.loads(f.readline())['root_dir'], self.root_dir)
+
+        result = CliRunner().invoke(main, ['plan', self.root_dir, self.plan_path, '--layout', '{bogus}'])
+        self.assertEqual(result.exit_code, 2)
+        self.assertIn("Invalid value for '--layout'", result.output)
+        self.assertNotIsInstance(result.exception, ValueError)
+
+    def test_plan_reports_a_file_that_is_not_dicom(self):
+        root_dir = os.path.join(self.tmpdir, 'in')
+        os.mkdir(root_dir)
+        with open(os.path.join(root_dir, 'notes.dcm'), 'w') as f:
+            f.write('not a dicom file')
+        result = CliRunner().invoke(main, ['plan', root_dir, self.plan_path, '--no-progress'])
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn('--skip-invalid', result.output)
+        self.assertIsInstance(result.exception, SystemExit)
+
+    def test_execute_reports_a_missing_source(self):
+        root_dir = os.path.join(self.tmpdir, 'in')
+        shutil.copytree(self.root_dir, root_dir)
+        processor.plan_sortdicom(root_dir, self.plan_path)
+        os.remove(processor._get_all_dicom_filepaths(root_dir)[0])
+        result = CliRunner().invoke(main, ['execute', self.plan_path, self.output_dir, '--workers', '1', '--no-progress'])
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn('Error:', result.output)
+        self.assertIsInstance(result.exception, SystemExit)
+
+    def test_help_does_not_import_pydicom(self):
+        code = 'import sys; from sortdicom.cli import main; print("pydicom" in sys.modules)'
+        out = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE, check=True, 
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(processor.__file__))))
+        self.assertEqual(out.stdout.strip(), b'False')
@@ -0,0 +1,53 @@
+""" test the compact module
+"""
+
+import unittest
+import os
+from collections import OrderedDict
+
+from sortdicom.compact import CompactPathMap
+
+ITEMS = [
+    (os.path.join(os.sep, 'data', 'patientA', 'series1', '000000.dcm'), 'TCGA-1_L_MLO_20010607.dcm'),
+    (os.path.join(os.sep, 'data', 'patientA', 'series1', '000001.dcm'), 'TCGA-1_L_MLO_20010607_2.dcm'),
+    (os.path.join(os.sep, 'data', 'patientB', 'series2', 'ünïcode.dcm'), 'ab/cd/TCGA-2/2001/R_CC_1.dcm'),
+    ('relative.dcm', 'x__y_.dcm'),
+]
+
+
+class TestCompactPathMap(unittest.TestCase):
+
+    def test_round_trips_in_insertion_order(self):
+        compact = CompactPathMap(ITEMS)
+        self.assertEqual(len(compact), len(ITEMS))
+        self.assertListEqual(list(compact.items()), ITEMS)
+        self.assertListEqual(list(compact), [k for k, v in ITEMS])
+        self.assertListEqual(list(compact.values()), [v for k, v in ITEMS])
+
+    def test_lookup_like_a_dict(self):
+        compact = CompactPathMap(ITEMS)
+        for k, v in ITEMS:
+            self.assertEqual(compact[k], v)
+            self.assertIn(k, compact)
+        self.assertNotIn('/data/missing.dcm', compact)
+        self.assertIsNone(compact.get('/data/missing.dcm'))
+        with self.assertRaises(KeyError):
+            compact['/data/missing.dcm']
+        self.assertEqual(compact, OrderedDict(ITEMS))
+
+    def test_lookup_after_adding_more(self):
+        compact = CompactPathMap(ITEMS[:2])
+        self.assertNotIn(ITEMS[2][0], compact)
+        compact.update(ITEMS[2:])
+        self.assertEqual(compact[ITEMS[2][0]], ITEMS[2][1])
+
+    def test_shares_directories_and_name_fields(self):
+        compact = CompactPathMap(ITEMS)
+        self.assertEqual(len(compact._dirs), 3)
+        self.assertEqual(compact._fields.values.count('TCGA-1'), 1)
+
+    def test_widens_arrays_past_16_bits(self):
+        compact = CompactPathMap(('/data/{}.dcm'.format(i), 'uid{}_{}.dcm'.format(i, i)) for i in range(70000))
+        self.assertEqual(compact._value_fields.typecode, 'I')
+        self.assertEqual(compact['/data/69999.dcm'], 'uid69999_69999.dcm')
+        self.assertEqual(compact['/data/3.dcm'], 'uid3_3.dcm')
@@ -0,0 +1,56 @@
+""" test the dedupe module
+"""
+
+import unittest
+from unittest import mock
+import os
+import shutil
+import tempfile
+
+from sortdicom import dedupe
+from sortdicom.dedupe import Deduplicator
+
+
+class TestDeduplicator(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _write(self, name, content):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+    def test_hash_file_matches_for_identical_content(self):
+        a = self._write('a.dcm', b'x' * 10)
+        b = self._write('b.dcm', b'x' * 10)
+        c = self._write('c.dcm', b'y' * 10)
+        self.assertEqual(dedupe.hash_file(a), dedupe.hash_file(b))
+        self.assertNotEqual(dedupe.hash_file(a), dedupe.hash_file(c))
+
+    def test_iter_unique_keeps_first_and_records_aliases(self):
+        a = self._write('a.dcm', b'same')
+        b = self._write('b.dcm', b'diff')  # same size, different bytes
+        c = self._write('c.dcm', b'same')
+        d = self._write('d.dcm', b'same')  # different uid so never compared
+        uids = [(a, 'uid.dcm'), (b, 'uid.dcm'), (c, 'uid.dcm'), (d, 'other.dcm')]
+        aliases = {}
+        with Deduplicator(workers=2) as dedup:
+            unique = list(dedup.iter_unique(list(dedup.iter_added(uids)), aliases))
+        self.assertListEqual(unique, [(a, 'uid.dcm'), (b, 'uid.dcm'), (d, 'other.dcm')])
+        self.assertDictEqual(aliases, {c: a})
+
+    @mock.patch('sortdicom.dedupe.hash_file')
+    def test_unique_sizes_are_never_hashed(self, mock_hash):
+        a = self._write('a.dcm', b'one')
+        b = self._write('b.dcm', b'three')
+        with Deduplicator() as dedup:
+            dedup.add(a, 'uid.dcm')
+            dedup.add(b, 'uid.dcm')
+            self.assertIsNone(dedup.alias_of(a))
+            self.assertIsNone(dedup.alias_of(b))
+        mock_hash.assert_not_called()
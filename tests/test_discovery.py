@@ -0,0 +1,62 @@
+""" test the discovery module
+"""
+
+import unittest
+import os
+import shutil
+import tempfile
+
+from sortdicom import discovery
+
+
+class TestDiscovery(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self._touch('a', '1.dcm')
+        self._touch('a', '2.DCM')
+        self._touch('a', 'notes.dcm.bak')
+        self._touch('a', 'sub', '3.dcm')
+        self._touch('b', '4.dcm')
+        self._touch('skipme', '5.dcm')
+        self._touch('b', 'extensionless', content=b'\x00' * 128 + b'DICM' + b'rest')
+        self._touch('b', 'readme.txt', content=b'not dicom')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _touch(self, *parts, content=b''):
+        path = os.path.join(self.tmpdir, *parts)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+
+    def _names(self, **kwargs):
+        return [os.path.relpath(f, self.tmpdir) for f in discovery.iter_dicom_filepaths(self.tmpdir, **kwargs)]
+
+    def test_default_matches_dcm_extension_only_in_walk_order(self):
+        expected = [os.path.join('a', '1.dcm'), os.path.join('a', '2.DCM'), os.path.join('a', 'sub', '3.dcm'),
+            os.path.join('b', '4.dcm'), os.path.join('skipme', '5.dcm')]
+        self.assertListEqual(self._names(), expected)
+
+    def test_exclude_dirs(self):
+        names = self._names(exclude_dirs=['skip*', 'sub'])
+        self.assertListEqual(names, [os.path.join('a', '1.dcm'), os.path.join('a', '2.DCM'), os.path.join('b', '4.dcm')])
+
+    def test_include_and_exclude(self):
+        names = self._names(include=['*.dcm', '*.bak'], exclude=['2.*', '3.*', '4.*', '5.*'])
+        self.assertListEqual(names, [os.path.join('a', '1.dcm'), os.path.join('a', 'notes.dcm.bak')])
+
+    def test_magic_finds_extensionless_dicom(self):
+        names = self._names(magic=True)
+        self.assertIn(os.path.join('b', 'extensionless'), names)
+        self.assertNotIn(os.path.join('b', 'readme.txt'), names)
+
+    def test_has_dicom_magic(self):
+        self.assertTrue(discovery.has_dicom_magic(os.path.join(self.tmpdir, 'b', 'extensionless')))
+        self.assertFalse(discovery.has_dicom_magic(os.path.join(self.tmpdir, 'b', 'readme.txt')))
+        self.assertFalse(discovery.has_dicom_magic(os.path.join(self.tmpdir, 'missing')))
+
+    def test_is_a_generator(self):
+        walker = discovery.iter_dicom_filepaths(self.tmpdir)
+        self.assertTrue(hasattr(walker, '__next__'))
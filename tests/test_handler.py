@@ -3,7 +3,7 @@ import pydicom
 import os
 
 from . import DATA_DIR
-from sortdicom.handler import DicomFileHandler
+from sortdicom.handler import DicomFileHandler, ExtractionPlan
 
 dicomfilepath = os.path.join(DATA_DIR, 'patientA', '4947-DIG DIAG MAMMOGR-94476', '000000.dcm')
 
@@ -37,6 +37,15 @@ class TestHandler(unittest.TestCase):
         self.dfh.load(self.dicomfilepath)
         self.assertTrue(isinstance(self.dfh.ds, pydicom.dataset.FileDataset))
     
+    def test_dicom_file_handler_load_header_only_skips_pixel_data(self):
+        self.dfh.load(self.dicomfilepath, header_only=True)
+        self.assertNotIn('PixelData', self.dfh.ds)
+        self.assertEqual(self.dfh.get_dicom_header_tag('mrn'), 'TCGA-AO-A0JB')
+
+    def test_dicom_list_header_tags(self):
+        tags = self.dfh.list_header_tags(['mrn', 'laterality'])
+        self.assertListEqual(tags, [(0x0010, 0x0020), (0x0020, 0x0060), (0x0020, 0x0062)])
+
     def test_dicom_file_handler_load_pins_filepath(self): 
         self.dfh.load(self.dicomfilepath)
         self.assertIsNotNone(self.dfh.filepath)
@@ -99,5 +108,45 @@ class TestHandler(unittest.TestCase):
         }
         self.dfh.ds = fake_laterality_ds
         res = self.dfh.get_dicom_header_tag('laterality')
-        self.assertEqual('ok', res) 
+        self.assertEqual('ok', res)
+
+
+
+class TestExtractionPlan(unittest.TestCase):
+
+    def setUp(self):
+        self.dicomfilepath = os.path.join(
+            DATA_DIR, 'patientA', '4947-DIG DIAG MAMMOGR-94476', '000000.dcm')
+
+    def test_plan_resolves_tags_once(self):
+        plan = ExtractionPlan(['MRN', 'laterality'])
+        self.assertTupleEqual(plan.headers, ('mrn', 'laterality'))
+        self.assertListEqual(plan.tags, [(0x0010, 0x0020), (0x0020, 0x0060), (0x0020, 0x0062)])
+
+    def test_plan_invalid_header_raises_ValueError(self):
+        with self.assertRaises(ValueError):
+            ExtractionPlan(['blah'])
+
+    def test_plan_apply_builds_uid_from_dicom_file(self):
+        plan = ExtractionPlan()
+        uid = plan.apply(plan.load(self.dicomfilepath))
+        self.assertEqual(uid, 'TCGA-AO-A0JB_L_MLO_20010607')
+
+    def test_plan_apply_cleans_and_skips_blank(self):
+        fake_ds = {
+            (0x0010, 0x0020): Fake('HE$)(LLO/: T)H*&$*ERE'),
+            (0x0020, 0x0060): Fake(''), 
+            (0x0020, 0x0062): Fake('ok')
+        }
+        uid = ExtractionPlan(['mrn', 'laterality', 'view']).apply(fake_ds)
+        self.assertEqual(uid, 'HELLO-.-THERE_ok_')
+
+    def test_plan_apply_empty_dataset_is_blank(self):
+        self.assertEqual(ExtractionPlan().apply({}), '')
+
+    def test_plan_fast_scan_matches_pydicom(self):
+        fast = ExtractionPlan()
+        slow = ExtractionPlan(fast_scan=False)
+        self.assertEqual(fast.apply(fast.load(self.dicomfilepath)), slow.apply(slow.load(self.dicomfilepath)))
+        self.assertIsInstance(fast.load(self.dicomfilepath), dict)
 
@@ -0,0 +1,90 @@
+""" test the index module
+"""
+
+import unittest
+import os
+import shutil
+import tempfile
+
+from sortdicom.index import FileIndex
+from sortdicom.layout import OutputLayout
+
+
+class TestFileIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.index_path = os.path.join(self.tmpdir, 'index.db')
+        self.files = []
+        for i in range(3):
+            f = os.path.join(self.tmpdir, '{}.dcm'.format(i))
+            with open(f, 'w') as fh:
+                fh.write('dicom')
+            self.files.append(f)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _run(self, uid='uid.dcm', layout=None):
+        results = {}
+        with FileIndex(self.index_path, layout) as index:
+            for f in index.iter_changed(self.files):
+                counter = index.assign_counter(f, uid)
+                results[f] = counter
+                index.record(f, uid, counter, 'out_{}.dcm'.format(counter))
+            unchanged = list(index.unchanged)
+        return results, unchanged
+
+    def test_first_run_parses_everything(self):
+        results, unchanged = self._run()
+        self.assertListEqual(list(results.values()), [1, 2, 3])
+        self.assertListEqual(unchanged, [])
+
+    def test_second_run_skips_unchanged(self):
+        self._run()
+        results, unchanged = self._run()
+        self.assertDictEqual(results, {})
+        self.assertListEqual([u[1] for u in unchanged], ['out_1.dcm', 'out_2.dcm', 'out_3.dcm'])
+
+    def test_new_files_continue_numbering(self):
+        self._run()
+        new_file = os.path.join(self.tmpdir, 'new.dcm')
+        with open(new_file, 'w') as fh:
+            fh.write('dicom')
+        self.files.insert(0, new_file)
+        results, unchanged = self._run()
+        self.assertDictEqual(results, {new_file: 4})
+        self.assertEqual(len(unchanged), 3)
+
+    def test_changed_file_keeps_counter_if_uid_unchanged(self):
+        self._run()
+        with open(self.files[1], 'w') as fh:
+            fh.write('changed dicom')
+        results, unchanged = self._run()
+        self.assertDictEqual(results, {self.files[1]: 2})
+
+    def test_changed_file_gets_new_counter_if_uid_changed(self):
+        self._run()
+        with open(self.files[1], 'w') as fh:
+            fh.write('changed dicom')
+        results, unchanged = self._run(uid='other.dcm')
+        self.assertDictEqual(results, {self.files[1]: 1})
+
+    def test_changing_the_layout_parses_everything_again(self):
+        self._run()
+        layout = OutputLayout('{mrn}/{view}')
+        results, unchanged = self._run(uid='a/uid.dcm', layout=layout)
+        self.assertListEqual(list(results.values()), [1, 2, 3])
+        self.assertListEqual(unchanged, [])
+        results, unchanged = self._run(layout=layout)
+        self.assertEqual(len(unchanged), 3)
+        results, unchanged = self._run(layout=OutputLayout('{mrn}/{view}', fanout=1))
+        self.assertEqual(len(results), 3)
+
+    def test_seed_counters_continues_after_existing_outputs(self):
+        with FileIndex(self.index_path) as index:
+            index.seed_counters(['uid_7.dcm', 'a/b/uid_2.dcm', 'uid_3.dcm', 'not_labeled.txt'])
+            f = next(index.iter_changed(self.files))
+            self.assertEqual(index.assign_counter(f, 'uid.dcm'), 8)
+            self.assertEqual(index.counters['a/b/uid.dcm'], 2)
+
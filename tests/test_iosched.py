@@ -0,0 +1,71 @@
+""" test the iosched module
+"""
+
+import unittest
+import os
+import shutil
+import tempfile
+import threading
+from unittest import mock
+
+from sortdicom.iosched import IOScheduler, advise_willneed, advise_dontneed, first_extent
+
+
+class TestIOScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filepaths = []
+        for i in range(7):
+            f = os.path.join(self.tmpdir, '{}.dcm'.format(i))
+            with open(f, 'wb') as fp:
+                fp.write(os.urandom(4096))
+            self.filepaths.append(f)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_iter_windows_keeps_order(self):
+        scheduler = IOScheduler(window=3)
+        self.assertListEqual(list(scheduler.iter_windows(range(7))), [[0, 1, 2], [3, 4, 5], [6]])
+        self.assertListEqual(list(scheduler.iter_windows([])), [])
+
+    def test_order_sorts_by_device_and_inode(self):
+        scheduler = IOScheduler(prefetch=False)
+        ordered = scheduler.order(list(reversed(self.filepaths)))
+        keys = [(os.stat(f).st_dev, os.stat(f).st_ino) for f, dev in ordered]
+        self.assertListEqual(keys, sorted(keys))
+        self.assertSetEqual({dev for f, dev in ordered}, {os.stat(self.tmpdir).st_dev})
+
+    def test_order_with_key_and_missing_files_last(self):
+        scheduler = IOScheduler()
+        items = [('missing.dcm', 'a')] + [(f, 'b') for f in self.filepaths]
+        ordered = [item for item, dev in scheduler.order(items, key=lambda kv: kv[0])]
+        self.assertEqual(ordered[-1], ('missing.dcm', 'a'))
+        self.assertCountEqual(ordered, items)
+
+    def test_extent_falls_back_to_inode(self):
+        scheduler = IOScheduler(extent=True)
+        with mock.patch('sortdicom.iosched.first_extent', return_value=None):
+            self.assertEqual(scheduler.physical_key(self.filepaths[0]), 
+                (os.stat(self.filepaths[0]).st_dev, os.stat(self.filepaths[0]).st_ino))
+        self.assertIsNone(first_extent(os.path.join(self.tmpdir, 'missing.dcm')))
+
+    def test_advise_is_harmless(self):
+        expected = hasattr(os, 'posix_fadvise')
+        self.assertEqual(advise_willneed(self.filepaths[0]), expected)
+        self.assertEqual(advise_dontneed(self.filepaths[0]), expected)
+        self.assertFalse(advise_willneed(os.path.join(self.tmpdir, 'missing.dcm')))
+
+    def test_reads_per_device_caps_in_flight(self):
+        scheduler = IOScheduler(reads_per_device=2)
+        scheduler.acquire('dev')
+        scheduler.acquire('dev')
+        acquired = threading.Event()
+        t = threading.Thread(target=lambda: (scheduler.acquire('dev'), acquired.set()))
+        t.start()
+        self.assertFalse(acquired.wait(0.1))
+        scheduler.acquire('other')  # other devices are not held up
+        scheduler.release('dev')
+        self.assertTrue(acquired.wait(5))
+        t.join()
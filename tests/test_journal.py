@@ -0,0 +1,55 @@
+""" test the journal module
+"""
+
+import unittest
+import os
+import shutil
+import tempfile
+
+from sortdicom.journal import PlacementJournal
+
+
+class TestPlacementJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.journal_path = os.path.join(self.tmpdir, 'journal')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_resume_loads_parsed_and_placed(self):
+        with PlacementJournal(self.journal_path) as journal:
+            journal.record_parsed('a.dcm', 'uid.dcm')
+            journal.record_parsed('b.dcm', 'uid.dcm')
+            journal.record_placed('a.dcm', 'uid_1.dcm')
+
+        with PlacementJournal(self.journal_path, resume=True) as journal:
+            self.assertDictEqual(journal.parsed, {'a.dcm': 'uid.dcm', 'b.dcm': 'uid.dcm'})
+            self.assertTrue(journal.is_placed('a.dcm', 'uid_1.dcm'))
+            self.assertFalse(journal.is_placed('a.dcm', 'uid_2.dcm'))
+            self.assertFalse(journal.is_placed('b.dcm', 'uid_2.dcm'))
+
+    def test_without_resume_starts_over(self):
+        with PlacementJournal(self.journal_path) as journal:
+            journal.record_parsed('a.dcm', 'uid.dcm')
+        with PlacementJournal(self.journal_path) as journal:
+            pass
+        with PlacementJournal(self.journal_path, resume=True) as journal:
+            self.assertDictEqual(journal.parsed, {})
+
+    def test_torn_last_line_is_ignored(self):
+        with PlacementJournal(self.journal_path) as journal:
+            journal.record_parsed('a.dcm', 'uid.dcm')
+        with open(self.journal_path, 'a') as f:
+            f.write('["placed", "a.dc')
+        with PlacementJournal(self.journal_path, resume=True) as journal:
+            self.assertDictEqual(journal.parsed, {'a.dcm': 'uid.dcm'})
+            self.assertSetEqual(journal.placed, set())
+
+    def test_record_parsed_skips_known_uids(self):
+        with PlacementJournal(self.journal_path) as journal:
+            journal.record_parsed('a.dcm', 'uid.dcm')
+            journal.record_parsed('a.dcm', 'uid.dcm')
+        with open(self.journal_path) as f:
+            self.assertEqual(len(f.readlines()), 1)
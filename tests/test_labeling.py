@@ -0,0 +1,61 @@
+""" test the labeling module
+"""
+
+import unittest
+import os
+import shutil
+import tempfile
+
+from sortdicom.labeling import DuplicateLabeler, label_duplicate, parse_label
+
+
+class TestDuplicateLabeler(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.pairs = [
+            ('key0', 'value2.dcm'),
+            ('key1', 'value1.dcm'), 
+            ('key2', 'value2.dcm'), 
+            ('key3', 'value0.dcm'),
+            ('key4', 'value1.dcm'),
+            ('key5', 'value2.dcm'),
+        ]
+        self.expected = [
+            ('key3', 'value0_1.dcm'),
+            ('key1', 'value1_1.dcm'),
+            ('key4', 'value1_2.dcm'),
+            ('key0', 'value2_1.dcm'),
+            ('key2', 'value2_2.dcm'),
+            ('key5', 'value2_3.dcm'),
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_label_duplicate(self):
+        self.assertEqual(label_duplicate('value.dcm', 3), 'value_3.dcm')
+
+    def test_parse_label_reverses_label_duplicate(self):
+        for uid in ['value.dcm', 'A_L_MLO_20010607.dcm', 'ab/x.dcm/L_CC.dcm']:
+            self.assertEqual(parse_label(label_duplicate(uid, 12)), (uid, 12))
+        for name in ['value.dcm', 'value_x.dcm', 'value_1.dcm.part']:
+            self.assertIsNone(parse_label(name))
+
+    def test_labels_in_memory(self):
+        with DuplicateLabeler() as labeler:
+            for k, v in self.pairs:
+                labeler.add(k, v)
+            self.assertListEqual(list(labeler), self.expected)
+
+    def test_labels_with_spilled_runs(self):
+        with DuplicateLabeler(max_in_memory=2, tmp_dir=self.tmpdir) as labeler:
+            for k, v in self.pairs:
+                labeler.add(k, v)
+            self.assertEqual(len(os.listdir(self.tmpdir)), 3)
+            self.assertListEqual(list(labeler), self.expected)
+        self.assertListEqual(os.listdir(self.tmpdir), [])
+
+    def test_empty(self):
+        with DuplicateLabeler() as labeler:
+            self.assertListEqual(list(labeler), [])
@@ -0,0 +1,44 @@
+""" test the layout module
+"""
+
+import unittest
+
+from sortdicom.layout import OutputLayout, MISSING
+
+VALUES = {'mrn': 'TCGA-1', 'date': '20010607', 'laterality': '', 'view': 'MLO'}
+
+
+class TestOutputLayout(unittest.TestCase):
+
+    def test_render_template(self):
+        layout = OutputLayout('{mrn}/{date}/{laterality}_{view}.dcm')
+        self.assertEqual(layout.render(dict(VALUES, laterality='L')), 'TCGA-1/20010607/L_MLO.dcm')
+        self.assertEqual(layout.headers, ('mrn', 'date', 'laterality', 'view'))
+
+    def test_render_adds_suffix_and_format_specs(self):
+        layout = OutputLayout('{mrn}/{date:.4}/{view}')
+        self.assertEqual(layout.render(VALUES), 'TCGA-1/2001/MLO.dcm')
+
+    def test_render_missing_values(self):
+        layout = OutputLayout('{mrn}/{laterality}/{view}')
+        self.assertEqual(layout.render(VALUES), 'TCGA-1/{}/MLO.dcm'.format(MISSING))
+        self.assertEqual(layout.render({'mrn': '', 'laterality': '', 'view': ''}), '')
+        self.assertEqual(layout.render({'mrn': '..', 'laterality': 'L', 'view': '.'}), '{0}/L/{0}.dcm'.format(MISSING))
+
+    def test_fanout_keeps_first_component_together(self):
+        layout = OutputLayout('{mrn}/{view}', fanout=2)
+        a = layout.render(VALUES)
+        b = layout.render(dict(VALUES, view='CC'))
+        self.assertEqual(a.split('/')[:2], b.split('/')[:2])
+        self.assertEqual(len(a.split('/')), 4)
+        self.assertTrue(a.endswith('/TCGA-1/MLO.dcm'))
+
+    def test_invalid_templates_raise_ValueError(self):
+        for template in ['{blah}/{mrn}', '/{mrn}', '{mrn}/../{view}', '{mrn}//{view}', 'static.dcm']:
+            with self.assertRaises(ValueError):
+                OutputLayout(template)
+
+    def test_layouts_compare_by_template_and_fanout(self):
+        self.assertEqual(OutputLayout('{mrn}'), OutputLayout('{mrn}.dcm'))
+        self.assertNotEqual(OutputLayout('{mrn}'), OutputLayout('{mrn}', fanout=1))
+        self.assertEqual(len({OutputLayout('{mrn}'), OutputLayout('{mrn}')}), 1)
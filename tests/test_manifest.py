@@ -0,0 +1,55 @@
+""" test the manifest module
+"""
+
+import unittest
+import os
+import csv
+import shutil
+import tempfile
+
+from sortdicom.manifest import ManifestWriter
+
+
+class TestManifestWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.manifest_path = os.path.join(self.tmpdir, 'manifest.csv')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _rows(self):
+        with open(self.manifest_path, newline='') as f:
+            return list(csv.DictReader(f))
+
+    def test_rows_join_parse_and_output(self):
+        with ManifestWriter(self.manifest_path, headers=['mrn', 'view']) as manifest:
+            manifest.record_parsed('/in/a.dcm', {'size': 10, 'mrn': 'TCGA-1', 'view': 'CC'})
+            manifest.record_error('/in/b.dcm', 'blank', 'No headers', {'size': 3, 'mrn': '', 'view': ''})
+            manifest.record_output('/in/a.dcm', 'TCGA-1_CC_1.dcm', 'placed', bytes_saved=4)
+        rows = self._rows()
+        self.assertListEqual(list(rows[0].keys()), 
+            ['source_path', 'size', 'mrn', 'view', 'output_path', 'bytes_saved', 'status', 'error'])
+        self.assertDictEqual(dict(rows[0]), {'source_path': '/in/b.dcm', 'size': '3', 'mrn': '', 'view': '', 
+            'output_path': '', 'bytes_saved': '', 'status': 'blank', 'error': 'No headers'})
+        self.assertDictEqual(dict(rows[1]), {'source_path': '/in/a.dcm', 'size': '10', 'mrn': 'TCGA-1', 'view': 'CC', 
+            'output_path': 'TCGA-1_CC_1.dcm', 'bytes_saved': '4', 'status': 'placed', 'error': ''})
+
+    def test_rows_are_written_in_batches(self):
+        manifest = ManifestWriter(self.manifest_path, batch_size=3).open()
+        try:
+            for i in range(7):
+                manifest.record_output('/in/{}.dcm'.format(i), '{}.dcm'.format(i), 'parsed')
+            self.assertEqual(manifest.rows_written, 6)
+            self.assertEqual(len(self._rows()), 6)
+        finally:
+            manifest.close()
+        self.assertEqual(len(self._rows()), 7)
+
+    def test_close_writes_files_without_output(self):
+        with ManifestWriter(self.manifest_path) as manifest:
+            manifest.record_parsed('/in/a.dcm', {'size': 10, 'mrn': 'TCGA-1'})
+        rows = self._rows()
+        self.assertEqual(rows[0]['source_path'], '/in/a.dcm')
+        self.assertEqual(rows[0]['status'], '')
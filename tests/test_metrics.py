@@ -0,0 +1,58 @@
+""" test the metrics module
+"""
+
+import unittest
+import os
+import shutil
+import tempfile
+
+from sortdicom.metrics import Metrics, NullMetrics, Histogram
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_histogram_percentiles(self):
+        h = Histogram(buckets=(0.1, 1.0, float('inf')))
+        for v in [0.05] * 8 + [0.5, 5.0]:
+            h.observe(v)
+        self.assertEqual(h.count, 10)
+        self.assertEqual(h.percentile(0.5), 0.1)
+        self.assertEqual(h.percentile(0.9), 1.0)
+        self.assertEqual(h.percentile(1.0), float('inf'))
+
+    def test_histogram_percentile_empty_is_None(self):
+        self.assertIsNone(Histogram().percentile(0.5))
+
+    def test_metrics_counters_and_summary(self):
+        m = Metrics()
+        m.inc('files_discovered', 3)
+        m.inc('files_parsed')
+        m.observe('parse_seconds', 0.002)
+        summary = m.summary()
+        self.assertEqual(summary['files_discovered'], 3)
+        self.assertEqual(summary['files_parsed'], 1)
+        self.assertEqual(summary['parse_seconds_count'], 1)
+        self.assertEqual(summary['parse_seconds_p50'], 0.0025)
+
+    def test_metrics_to_prometheus(self):
+        m = Metrics()
+        m.inc('files_placed', 2)
+        m.observe('place_seconds', 0.3)
+        text = m.to_prometheus()
+        self.assertIn('sortdicom_files_placed_total 2', text)
+        self.assertIn('sortdicom_place_seconds_bucket{le="0.5"} 1', text)
+        self.assertIn('sortdicom_place_seconds_bucket{le="+Inf"} 1', text)
+        self.assertIn('sortdicom_place_seconds_count 1', text)
+
+    def test_metrics_write_prometheus(self):
+        tmpdir = tempfile.mkdtemp()
+        path = os.path.join(tmpdir, 'sortdicom.prom')
+        Metrics().write_prometheus(path)
+        self.assertEqual(os.listdir(tmpdir), ['sortdicom.prom'])
+        shutil.rmtree(tmpdir)
+
+    def test_null_metrics_records_nothing(self):
+        m = NullMetrics()
+        m.inc('files_parsed')
+        m.observe('parse_seconds', 1.0)
+        self.assertFalse(m.enabled)
@@ -0,0 +1,146 @@
+""" test the placement module
+"""
+
+import unittest
+from unittest import mock
+import os
+import shutil
+import tempfile
+
+from sortdicom import placement
+
+
+class TestPlacement(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.src = os.path.join(self.tmpdir, 'src.dcm')
+        with open(self.src, 'wb') as f:
+            f.write(b'dicom bytes')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def test_place_dicom_file_all_strategies(self):
+        for strategy in ['copy', 'hardlink', 'symlink', 'reflink']:
+            dst = os.path.join(self.tmpdir, strategy + '.dcm')
+            placement.place_dicom_file(self.src, dst, strategy)
+            self.assertEqual(self._read(dst), b'dicom bytes')
+
+    def test_place_dicom_file_move_removes_src(self):
+        dst = os.path.join(self.tmpdir, 'moved.dcm')
+        placement.place_dicom_file(self.src, dst, 'move')
+        self.assertFalse(os.path.exists(self.src))
+        self.assertEqual(self._read(dst), b'dicom bytes')
+
+    def test_place_dicom_file_hardlink_shares_inode(self):
+        dst = os.path.join(self.tmpdir, 'linked.dcm')
+        placement.place_dicom_file(self.src, dst, 'hardlink')
+        self.assertEqual(os.stat(self.src).st_ino, os.stat(dst).st_ino)
+
+    def test_place_dicom_file_does_not_write_through_old_hardlink(self):
+        dst = os.path.join(self.tmpdir, 'linked.dcm')
+        placement.place_dicom_file(self.src, dst, 'hardlink')
+        other = os.path.join(self.tmpdir, 'other.dcm')
+        with open(other, 'wb') as f:
+            f.write(b'other bytes')
+        placement.place_dicom_file(other, dst, 'copy')
+        self.assertEqual(self._read(self.src), b'dicom bytes')
+        self.assertEqual(self._read(dst), b'other bytes')
+
+    @mock.patch('os.link', side_effect=OSError(18, 'Invalid cross-device link'))
+    def test_place_dicom_file_falls_back_to_copy(self, mock_link):
+        dst = os.path.join(self.tmpdir, 'fallback.dcm')
+        placement.place_dicom_file(self.src, dst, 'hardlink')
+        self.assertEqual(self._read(dst), b'dicom bytes')
+        self.assertNotEqual(os.stat(self.src).st_ino, os.stat(dst).st_ino)
+
+    def test_place_dicom_file_invalid_strategy_raises_ValueError(self):
+        with self.assertRaises(ValueError):
+            placement.place_dicom_file(self.src, os.path.join(self.tmpdir, 'x.dcm'), 'blah')
+
+    def test_file_placer_places_on_pool(self):
+        outdir = os.path.join(self.tmpdir, 'out')
+        os.mkdir(outdir)
+        with placement.FilePlacer(outdir, strategy='copy', workers=4) as placer:
+            for i in range(20):
+                placer.place(self.src, '{}.dcm'.format(i))
+        self.assertEqual(len(os.listdir(outdir)), 20)
+
+    def test_file_placer_caps_placements_per_device(self):
+        from sortdicom.iosched import IOScheduler
+        import threading, time
+        outdir = os.path.join(self.tmpdir, 'out')
+        os.mkdir(outdir)
+        lock = threading.Lock()
+        in_flight = [0, 0]  # now, most
+        copy = placement.place_dicom_file
+
+        def slow_copy(src, dst, strategy):
+            with lock:
+                in_flight[0] += 1
+                in_flight[1] = max(in_flight)
+            time.sleep(0.01)
+            with lock:
+                in_flight[0] -= 1
+            if dst.endswith('failing.dcm'):
+                raise IOError('disk went away')
+            copy(src, dst, strategy)
+
+        with mock.patch('sortdicom.placement.place_dicom_file', slow_copy):
+            with placement.FilePlacer(outdir, workers=4, scheduler=IOScheduler(reads_per_device=2), 
+                    on_error=lambda *args: None) as placer:
+                for i in range(3):
+                    placer.place(self.src, 'failing.dcm')  # failures give their read back too 
+                for i in range(12):
+                    placer.place(self.src, '{}.dcm'.format(i))
+        self.assertEqual(in_flight[1], 2)
+        self.assertEqual(len(os.listdir(outdir)), 12)
+
+    def test_file_placer_raises_placement_errors(self):
+        with self.assertRaises(IOError):
+            with placement.FilePlacer(self.tmpdir, workers=4) as placer:
+                placer.place(os.path.join(self.tmpdir, 'missing.dcm'), 'x.dcm')
+
+    def test_place_dicom_file_leaves_no_partial_file(self):
+        outdir = os.path.join(self.tmpdir, 'out')
+        os.mkdir(outdir)
+        placement.place_dicom_file(self.src, os.path.join(outdir, 'new.dcm'), 'copy')
+        self.assertListEqual(os.listdir(outdir), ['new.dcm'])
+
+    @mock.patch('shutil.copy', side_effect=OSError(28, 'No space left on device'))
+    def test_place_dicom_file_failure_keeps_old_dst(self, mock_copy):
+        dst = os.path.join(self.tmpdir, 'dst.dcm')
+        with open(dst, 'wb') as f:
+            f.write(b'old bytes')
+        with self.assertRaises(OSError):
+            placement.place_dicom_file(self.src, dst, 'copy')
+        self.assertEqual(self._read(dst), b'old bytes')
+
+    def test_write_dicom_file_streams_fileobj(self):
+        dst = os.path.join(self.tmpdir, 'written.dcm')
+        with open(self.src, 'rb') as f:
+            size = placement.write_dicom_file(f, dst)
+        self.assertEqual(size, len(b'dicom bytes'))
+        self.assertEqual(self._read(dst), b'dicom bytes')
+        self.assertFalse(os.path.exists(placement._temp_path(dst)))
+
+    def test_file_placer_creates_nested_dirs(self):
+        outdir = os.path.join(self.tmpdir, 'out')
+        with placement.FilePlacer(outdir, workers=4) as placer:
+            for i in range(10):
+                placer.place(self.src, 'a/{}/{}.dcm'.format(i % 3, i))
+        self.assertListEqual(sorted(os.listdir(os.path.join(outdir, 'a'))), ['0', '1', '2'])
+
+    @mock.patch('os.makedirs')
+    def test_directory_cache_creates_each_dir_once(self, mock_makedirs):
+        dirs = placement.DirectoryCache()
+        for i in range(10):
+            dirs.ensure_parent('/out/a/b/{}.dcm'.format(i))
+        dirs.ensure_all(['/out/a/b/x.dcm', '/out/a/c/y.dcm', '/out/a/y.dcm'])
+        self.assertListEqual([c[0][0] for c in mock_makedirs.call_args_list], ['/out/a/b', '/out/a/c'])
+
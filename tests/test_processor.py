@@ -3,13 +3,17 @@
 
 import unittest 
 from unittest import mock
+import asyncio
+import time
 import pydicom 
 import os 
 import shutil
+import tempfile
 from pprint import pprint 
 from . import DATA_DIR
 from collections import OrderedDict
 import sortdicom.processor as processor
+from sortdicom.metrics import Metrics
 
 
 #_get_all_dicom_filepaths, 
@@ -82,15 +86,21 @@ class TestProcessor(unittest.TestCase):
             'key91': 'value5_2.dcm'}
         self.assertDictEqual(dict(result), expected)
 
-    @mock.patch('sortdicom.handler.DicomFileHandler.load', return_value='')
-    @mock.patch('sortdicom.handler.DicomFileHandler.get_dicom_header_tag', return_value='')
-    def test_build_dicom_unique_identifier_raises_BlankDicomHeaderError_if_no_header(self, mock_get_header_tag, mock_load): 
+        result = processor._label_duplicates(input_val, max_in_memory=3)
+        self.assertDictEqual(dict(result), expected)
+
+
+    def test_duplicate_labels_empty(self): 
+        self.assertDictEqual(dict(processor._label_duplicates(OrderedDict())), {})
+
+    @mock.patch('sortdicom.handler.ExtractionPlan.load', return_value={})
+    def test_build_dicom_unique_identifier_raises_BlankDicomHeaderError_if_no_header(self, mock_load): 
 
         with self.assertRaises(processor.BlankDicomHeaderError):
             uid = processor._build_dicom_unique_identifier()
 
 
-    @mock.patch('sortdicom.handler.DicomFileHandler.load', side_effect=pydicom.errors.InvalidDicomError)
+    @mock.patch('sortdicom.handler.ExtractionPlan.load', side_effect=pydicom.errors.InvalidDicomError)
     def test_sortdicom_raise_on_read_allows_dicom_error(self, mock_handler):
 
         with self.assertRaises(pydicom.errors.InvalidDicomError): 
@@ -172,6 +182,442 @@ class TestProcessor(unittest.TestCase):
         result = processor.sortdicom(DATA_DIR)
         for e in expected: 
             self.assertIn(e, list(result.values()))
-        
 
-   
\ No newline at end of file
+
+    def test_sortdicom_parallel_workers_match_serial(self):
+        expected = processor.sortdicom(DATA_DIR)
+        for executor in ['thread', 'process']:
+            result = processor.sortdicom(DATA_DIR, workers=4, executor=executor)
+            self.assertListEqual(list(result.items()), list(expected.items()))
+
+
+    def test_sortdicom_invalid_executor_raises_ValueError(self):
+        with self.assertRaises(ValueError):
+            processor.sortdicom(self.patientA_filepath, workers=2, executor='blah')
+
+
+    def test_sortdicom_stream_matches_batch_numbering(self):
+        expected = processor.sortdicom(DATA_DIR)
+        result = processor.sortdicom(DATA_DIR, stream=True, workers=4)
+        self.assertDictEqual(dict(result), dict(expected))
+
+
+    def test_sortdicom_stream_writes_to_output_dir(self):
+        new_output_dir = os.path.join(DATA_DIR, 'test_stream_output_dir') 
+        result = processor.sortdicom(self.patientA_filepath, new_output_dir, stream=True, placement_workers=4)
+        self.assertListEqual(sorted(os.listdir(new_output_dir)), sorted(result.values()))
+        shutil.rmtree(new_output_dir)
+
+
+    def test_sortdicom_index_skips_unchanged_and_keeps_names(self):
+        index_path = os.path.join(DATA_DIR, 'test_index.db') 
+        expected = processor.sortdicom(DATA_DIR)
+        first = processor.sortdicom(DATA_DIR, index_path=index_path)
+        second = processor.sortdicom(DATA_DIR, index_path=index_path)
+        self.assertDictEqual(dict(first), dict(expected))
+        self.assertDictEqual(dict(second), dict(expected))
+
+        # unchanged files are placed by the new layout, not by the names cached for the old one 
+        layout = '{mrn}/{date}/{laterality}_{view}'
+        new_output_dir = tempfile.mkdtemp()
+        try:
+            third = processor.sortdicom(DATA_DIR, new_output_dir, index_path=index_path, layout=layout)
+            self.assertDictEqual(dict(third), dict(processor.sortdicom(DATA_DIR, layout=layout)))
+            for v in third.values():
+                self.assertTrue(os.path.exists(os.path.join(new_output_dir, v)))
+        finally:
+            shutil.rmtree(new_output_dir)
+            os.remove(index_path)
+
+
+    def test_sortdicom_async_matches_sync(self):
+        expected = processor.sortdicom(DATA_DIR)
+        result = asyncio.get_event_loop().run_until_complete(processor.sortdicom_async(DATA_DIR, concurrency=8))
+        self.assertListEqual(list(result.items()), list(expected.items()))
+
+
+    def test_sortdicom_async_writes_to_output_dir(self):
+        new_output_dir = os.path.join(DATA_DIR, 'test_async_output_dir') 
+        result = asyncio.get_event_loop().run_until_complete(
+            processor.sortdicom_async(self.patientA_filepath, new_output_dir))
+        self.assertListEqual(sorted(os.listdir(new_output_dir)), sorted(result.values()))
+        shutil.rmtree(new_output_dir)
+
+
+    def test_sortdicom_collects_metrics(self):
+        metrics = Metrics()
+        metrics_path = os.path.join(DATA_DIR, 'test_metrics.prom') 
+        result = processor.sortdicom(self.patientA_filepath, metrics=metrics, metrics_path=metrics_path)
+        self.assertEqual(metrics.counters['files_discovered'], 8)
+        self.assertEqual(metrics.counters['files_parsed'], len(result))
+        self.assertEqual(metrics.histograms['parse_seconds'].count, 8)
+        self.assertTrue(os.path.exists(metrics_path))
+        os.remove(metrics_path)
+
+
+    def test_sortdicom_resume_after_crash_skips_parsed_and_placed(self):
+        new_output_dir = os.path.join(DATA_DIR, 'test_resume_output_dir') 
+        expected = processor.sortdicom(self.patientA_filepath)
+        place = processor.FilePlacer._place
+        calls = []
+        def crash(placer, src, new_name):
+            calls.append(src)
+            if len(calls) == 4:
+                raise OSError('disk full')
+            return place(placer, src, new_name)
+
+        with mock.patch('sortdicom.processor.FilePlacer._place', autospec=True, side_effect=crash):
+            with self.assertRaises(OSError):
+                processor.sortdicom(self.patientA_filepath, new_output_dir, resume=True)
+
+        metrics = Metrics()
+        with mock.patch('sortdicom.processor._extract_dicom_unique_identifier') as mock_extract:
+            result = processor.sortdicom(self.patientA_filepath, new_output_dir, resume=True, metrics=metrics)
+            self.assertEqual(mock_extract.call_count, 0)
+        self.assertDictEqual(dict(result), dict(expected))
+        self.assertEqual(metrics.counters['files_placed'], 5)
+        for v in expected.values():
+            self.assertIn(v, os.listdir(new_output_dir))
+        shutil.rmtree(new_output_dir)
+
+
+    def test_sortdicom_resume_with_move_raises_ValueError(self):
+        tmpdir = tempfile.mkdtemp()
+        new_output_dir = os.path.join(tmpdir, 'output')
+        try:
+            with self.assertRaises(ValueError):
+                processor.sortdicom(self.patientA_filepath, new_output_dir, placement='move', resume=True)
+            with self.assertRaises(ValueError):
+                processor.sortdicom(self.patientA_filepath, new_output_dir, placement='move', dedupe=True, stream=True)
+            self.assertFalse(os.path.exists(new_output_dir))
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+    def test_sortdicom_dedupe_places_identical_payload_once(self):
+        dicomfilepath = os.path.join(self.patientA_filepath, '4947-DIG DIAG MAMMOGR-94476', '000000.dcm')
+        copy_path = os.path.join(self.patientA_filepath, '4947-DIG DIAG MAMMOGR-94476', 'zz_copy.dcm')
+        new_output_dir = os.path.join(DATA_DIR, 'test_dedupe_output_dir') 
+        shutil.copy(dicomfilepath, copy_path)
+        try:
+            result = processor.sortdicom(self.patientA_filepath, new_output_dir, dedupe=True)
+            self.assertEqual(result[copy_path], result[dicomfilepath])
+            self.assertEqual(len(os.listdir(new_output_dir)), 8)
+        finally:
+            os.remove(copy_path)
+            shutil.rmtree(new_output_dir)
+
+
+
+
+    def test_sortdicom_reads_from_archives(self):
+        expected = processor.sortdicom(self.patientA_filepath)
+        for fmt in ['zip', 'gztar']:
+            archive_path = shutil.make_archive(os.path.join(DATA_DIR, 'test_archive'), fmt, self.patientA_filepath)
+            new_output_dir = os.path.join(DATA_DIR, 'test_archive_output_dir') 
+            try:
+                result = processor.sortdicom(archive_path, new_output_dir, workers=2)
+                self.assertListEqual(list(result.values()), list(expected.values()))
+                for k in expected:
+                    member = os.path.join(archive_path, os.path.relpath(k, self.patientA_filepath))
+                    self.assertEqual(result[member], expected[k])
+                self.assertListEqual(sorted(os.listdir(new_output_dir)), sorted(expected.values()))
+            finally:
+                os.remove(archive_path)
+                shutil.rmtree(new_output_dir)
+
+
+    def test_sortdicom_archive_reads_header_from_member_when_prefix_is_short(self):
+        import csv
+        from sortdicom.archive import DicomArchive
+        expected = processor.sortdicom(self.patientA_filepath)
+        iter_members = DicomArchive.iter_members
+        archive_path = shutil.make_archive(os.path.join(DATA_DIR, 'test_archive'), 'gztar', self.patientA_filepath)
+        try:
+            with mock.patch.object(DicomArchive, 'iter_members', lambda a: iter_members(a, prefix_bytes=200)):
+                for workers in [1, 2]:
+                    result = processor.sortdicom(archive_path, workers=workers, manifest_path=archive_path + '.csv')
+                    self.assertListEqual(list(result.values()), list(expected.values()))
+                    with open(archive_path + '.csv', newline='') as f:
+                        sizes = sorted(int(r['size']) for r in csv.DictReader(f))
+                    self.assertListEqual(sizes, sorted(os.path.getsize(k) for k in expected))
+        finally:
+            os.remove(archive_path)
+            os.remove(archive_path + '.csv')
+
+
+    def test_sortdicom_archive_with_link_placement_raises_ValueError(self):
+        archive_path = shutil.make_archive(os.path.join(DATA_DIR, 'test_archive'), 'zip', self.patientA_filepath)
+        try:
+            with self.assertRaises(ValueError):
+                processor.sortdicom(archive_path, self.output_dir, placement='hardlink')
+        finally:
+            os.remove(archive_path)
+
+
+    def test_sortdicom_shards_in_separate_processes_match_single_run(self):
+        from concurrent.futures import ProcessPoolExecutor
+        expected = processor.sortdicom(DATA_DIR)
+        shards = 3
+        manifests = [os.path.join(DATA_DIR, 'test_shard{}.manifest'.format(i)) for i in range(shards)]
+        merged_path = os.path.join(DATA_DIR, 'test_merged.manifest')
+        new_output_dir = os.path.join(DATA_DIR, 'test_shard_output_dir') 
+        mount = os.path.join(os.path.dirname(DATA_DIR), 'test_shard_mount')
+        try:
+            with ProcessPoolExecutor(max_workers=shards) as pool:
+                futures = [pool.submit(processor.sortdicom_shard, DATA_DIR, manifests[i], i, shards) for i in range(shards)]
+                parsed = sum(len(f.result()) for f in futures)
+            self.assertEqual(parsed, len(expected))
+
+            result = processor.merge_manifests(manifests, merged_path)
+            self.assertListEqual(list(result.items()), list(expected.items()))
+
+            placed = {}
+            for i in range(shards):
+                placed.update(processor.place_manifest(merged_path, new_output_dir, shard=i))
+            self.assertDictEqual(placed, dict(expected))
+            self.assertListEqual(sorted(os.listdir(new_output_dir)), sorted(expected.values()))
+
+            # a node that mounts the archive somewhere else 
+            shutil.rmtree(new_output_dir)
+            os.symlink(DATA_DIR, mount)
+            processor.sortdicom_shard(mount, manifests[1], 1, shards)
+            result = processor.merge_manifests(manifests, merged_path, root_dir=mount)
+            self.assertListEqual(list(result.values()), list(expected.values()))
+            self.assertListEqual(list(result), [os.path.join(mount, os.path.relpath(k, DATA_DIR)) for k in expected])
+        finally:
+            for path in manifests + [merged_path]:
+                if os.path.exists(path):
+                    os.remove(path)
+            if os.path.lexists(mount):
+                os.remove(mount)
+            shutil.rmtree(new_output_dir, ignore_errors=True)
+
+
+    def test_sortdicom_layout_places_tree_and_numbers_per_leaf(self):
+        new_output_dir = os.path.join(DATA_DIR, 'test_layout_output_dir') 
+        async_result = asyncio.run(processor.sortdicom_async(DATA_DIR, layout='{mrn}/{date}/{laterality}_{view}'))
+        try:
+            result = processor.sortdicom(DATA_DIR, new_output_dir, layout='{mrn}/{date}/{laterality}_{view}', 
+                placement_workers=4)
+            for v in result.values():
+                self.assertEqual(len(v.split('/')), 3)
+                self.assertTrue(os.path.isfile(os.path.join(new_output_dir, v)))
+            self.assertEqual(len(set(result.values())), len(result))
+            self.assertTrue(any(v.endswith('_1.dcm') for v in result.values()))
+            self.assertDictEqual(dict(async_result), dict(result))
+        finally:
+            shutil.rmtree(new_output_dir, ignore_errors=True)
+
+
+    def test_sortdicom_streams_manifest(self):
+        import csv
+        dicomfilepath = os.path.join(self.patientA_filepath, '4947-DIG DIAG MAMMOGR-94476', '000000.dcm')
+        copy_path = os.path.join(self.patientA_filepath, '4947-DIG DIAG MAMMOGR-94476', 'zz_copy.dcm')
+        bad_path = os.path.join(self.patientA_filepath, 'zz_bad.dcm')
+        manifest_path = os.path.join(DATA_DIR, 'test_manifest.csv')
+        new_output_dir = os.path.join(DATA_DIR, 'test_manifest_output_dir') 
+        shutil.copy(dicomfilepath, copy_path)
+        with open(bad_path, 'w') as f:
+            f.write('not a dicom')
+        try:
+            result = processor.sortdicom(self.patientA_filepath, new_output_dir, raise_on_read_error=False, dedupe=True, 
+                workers=2, executor='process', manifest_path=manifest_path)
+            with open(manifest_path, newline='') as f:
+                rows = {r['source_path']: r for r in csv.DictReader(f)}
+            self.assertEqual(len(rows), len(result) + 1)
+            self.assertEqual(rows[bad_path]['status'], 'invalid')
+            self.assertEqual(rows[copy_path]['status'], 'deduplicated')
+            self.assertEqual(rows[dicomfilepath]['status'], 'placed')
+            self.assertEqual(rows[dicomfilepath]['mrn'], 'TCGA-AO-A0JB')
+            self.assertEqual(int(rows[dicomfilepath]['size']), os.path.getsize(dicomfilepath))
+            for k, v in result.items():
+                self.assertEqual(rows[k]['output_path'], v)
+        finally:
+            for path in [copy_path, bad_path, manifest_path]:
+                os.remove(path)
+            shutil.rmtree(new_output_dir, ignore_errors=True)
+
+
+    def test_sortdicom_transcodes_and_records_bytes_saved(self):
+        import csv
+        from pydicom.uid import DeflatedExplicitVRLittleEndian, RLELossless
+        manifest_path = os.path.join(DATA_DIR, 'test_transcode.csv')
+        expected = processor.sortdicom(DATA_DIR)
+        tmpdir = tempfile.mkdtemp()
+        try:
+            for placement, syntax in [('deflate', DeflatedExplicitVRLittleEndian), ('rle', RLELossless)]:
+                metrics = Metrics()
+                new_output_dir = os.path.join(tmpdir, placement)
+                result = processor.sortdicom(DATA_DIR, new_output_dir, placement=placement, placement_workers=2, 
+                    stream=True, workers=2, manifest_path=manifest_path, metrics=metrics)
+                self.assertDictEqual(dict(result), dict(expected))
+                with open(manifest_path, newline='') as f:
+                    rows = {r['source_path']: r for r in csv.DictReader(f)}
+                for k, v in result.items():
+                    out = pydicom.dcmread(os.path.join(new_output_dir, v))
+                    self.assertEqual(int(rows[k]['bytes_saved']), 
+                        os.path.getsize(k) - os.path.getsize(os.path.join(new_output_dir, v)))
+                    self.assertGreaterEqual(int(rows[k]['bytes_saved']), 0)
+                    if int(rows[k]['bytes_saved']) == 0:  # would have grown so it was copied 
+                        continue
+                    self.assertEqual(out.file_meta.TransferSyntaxUID, syntax)
+                    if placement == 'deflate':
+                        self.assertEqual(out.PixelData, pydicom.dcmread(k).PixelData)
+                    else:
+                        self.assertTrue(out.PixelData.startswith(b'\xfe\xff\x00\xe0'))  # encapsulated item tag 
+                self.assertEqual(metrics.counters['bytes_saved'], sum(int(r['bytes_saved']) for r in rows.values()))
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+            if os.path.exists(manifest_path):
+                os.remove(manifest_path)
+
+
+    def test_sortdicom_catalog_finds_outputs_by_header(self):
+        from sortdicom.catalog import query_catalog, CATALOG_NAME
+        new_output_dir = tempfile.mkdtemp()
+        catalog_path = os.path.join(new_output_dir, CATALOG_NAME)
+        try:
+            result = processor.sortdicom(DATA_DIR, new_output_dir, workers=2, catalog_path=catalog_path, 
+                layout='{mrn}/{date}/{laterality}_{view}.dcm')
+            patient = query_catalog(catalog_path, mrn='TCGA-AO-A0JB')
+            self.assertListEqual(patient, sorted(v for v in result.values() if v.startswith('TCGA-AO-A0JB/')))
+            for v in patient:
+                self.assertTrue(os.path.exists(os.path.join(new_output_dir, v)))
+            self.assertListEqual(query_catalog(catalog_path, date_from='20010601', date_to='20010630'), patient)
+            self.assertEqual(len(query_catalog(catalog_path, view='CC', laterality=['L', 'R'])), 
+                len([v for v in result.values() if '_CC_' in v]))
+
+            processor.sortdicom(DATA_DIR, new_output_dir, catalog_path=catalog_path, 
+                layout='{mrn}/{date}/{laterality}_{view}.dcm')  # a second run updates rows in place 
+            self.assertEqual(len(query_catalog(catalog_path)), len(result))
+            with self.assertRaises(ValueError):
+                processor.sortdicom(DATA_DIR, catalog_path=catalog_path)  # a dry run has no outputs to catalog 
+        finally:
+            shutil.rmtree(new_output_dir, ignore_errors=True)
+
+
+    def test_sortdicom_compact_matches_ordered_dict(self):
+        expected = processor.sortdicom(DATA_DIR)
+        result = processor.sortdicom(DATA_DIR, compact=True, workers=2)
+        self.assertIsInstance(result, processor.CompactPathMap)
+        self.assertListEqual(list(result.items()), list(expected.items()))
+        with mock.patch('sortdicom.processor.DuplicateLabeler', wraps=processor.DuplicateLabeler) as labeler:
+            processor.sortdicom(DATA_DIR, compact=True)
+            labeler.assert_called_once_with(processor.COMPACT_MAX_IN_MEMORY)
+
+
+    def test_sortdicom_io_schedule_matches_walk_order(self):
+        from sortdicom.iosched import IOScheduler
+        expected = processor.sortdicom(DATA_DIR)
+        for workers in [1, 4]:
+            scheduler = IOScheduler(window=3, reads_per_device=2)
+            result = processor.sortdicom(DATA_DIR, workers=workers, stream=True, io_schedule=scheduler)
+            self.assertDictEqual(dict(result), dict(expected))
+        new_output_dir = tempfile.mkdtemp()
+        try:
+            result = processor.sortdicom(DATA_DIR, new_output_dir, io_schedule=IOScheduler(window=3, extent=True))
+            self.assertListEqual(list(result.items()), list(expected.items()))
+            self.assertListEqual(sorted(os.listdir(new_output_dir)), sorted(expected.values()))
+        finally:
+            shutil.rmtree(new_output_dir, ignore_errors=True)
+
+
+    def test_sortdicom_watch_sorts_arriving_files_and_continues_numbering(self):
+        import threading
+        from sortdicom.catalog import query_catalog
+        landing = os.path.join(DATA_DIR, 'test_landing')
+        new_output_dir = os.path.join(DATA_DIR, 'test_watch_output_dir') 
+        expected = processor.sortdicom(self.patientA_filepath)
+        shutil.copytree(self.patientA_filepath, landing)
+        try:
+            for use_inotify in [False, None]:
+                stop = threading.Event()
+                batches = []
+                def on_batch(copy_map):
+                    batches.append(copy_map)
+                    stop.set()
+                total = processor.sortdicom_watch(landing, new_output_dir, settle=0, poll_interval=0.05, 
+                    batch_timeout=0.1, batch_size=100, use_inotify=use_inotify, stop=stop, on_batch=on_batch, 
+                    catalog_path=os.path.join(new_output_dir, 'catalog'))
+                if use_inotify is False:
+                    self.assertEqual(total, len(expected))
+                    self.assertListEqual(sorted(batches[0].values()), sorted(expected.values()))
+                    self.assertListEqual(query_catalog(os.path.join(new_output_dir, 'catalog')), sorted(expected.values()))
+                else:  # nothing changed so the index skips everything 
+                    self.assertEqual(total, 0)
+
+            # a new copy of a file that was already sorted gets the next counter 
+            dicomfilepath = os.path.join(self.patientA_filepath, '4947-DIG DIAG MAMMOGR-94476', '000000.dcm')
+            uid_filename = processor._build_dicom_unique_identifier(dicomfilepath)
+            highest = max(int(v.rsplit('_', 1)[1][:-4]) for v in expected.values() if v.startswith(uid_filename[:-4] + '_'))
+            stop = threading.Event()
+            thread = threading.Thread(target=processor.sortdicom_watch, args=(landing, new_output_dir), kwargs=dict(
+                settle=0, poll_interval=0.05, batch_timeout=0.1, stop=stop, on_batch=lambda m: m and batches.append(m)))
+            thread.start()
+            try:
+                time.sleep(0.3)
+                shutil.copy(dicomfilepath, os.path.join(landing, 'zz_new.dcm'))
+                deadline = time.time() + 10
+                while len(batches) < 2 and time.time() < deadline:
+                    time.sleep(0.05)
+            finally:
+                stop.set()
+                thread.join()
+            self.assertDictEqual(dict(batches[1]), {os.path.join(landing, 'zz_new.dcm'): 
+                processor._label_duplicate(uid_filename, highest + 1)})
+        finally:
+            shutil.rmtree(landing)
+            shutil.rmtree(new_output_dir, ignore_errors=True)
+
+
+    def test_sortdicom_watch_skips_files_removed_mid_batch(self):
+        import threading
+        from sortdicom.catalog import query_catalog
+        from sortdicom.index import FileIndex
+        from sortdicom.metrics import Metrics
+        landing = os.path.join(DATA_DIR, 'test_landing')
+        new_output_dir = os.path.join(DATA_DIR, 'test_watch_output_dir') 
+        shutil.copytree(self.patientA_filepath, landing)
+        expected = processor.sortdicom(landing)
+        before_stat, before_parse, before_place = sorted(expected)[:3]
+        stat_key, record = FileIndex._stat_key, FileIndex.record
+
+        def existing(filepaths):
+            for f in filepaths:
+                if f == before_stat and os.path.exists(f):
+                    os.remove(f)
+                yield f
+
+        def removing_after_stat(index, f):
+            key = stat_key(index, f)
+            if f == before_parse:
+                os.remove(f)
+            return key
+
+        def removing_after_record(index, f, *args):
+            record(index, f, *args)
+            if f == before_place:
+                os.remove(f)
+
+        stop = threading.Event()
+        batches = []
+        def on_batch(copy_map):
+            batches.append(copy_map)
+            stop.set()
+        metrics = Metrics()
+        try:
+            with mock.patch('sortdicom.processor._iter_existing', existing), \
+                    mock.patch.object(FileIndex, '_stat_key', removing_after_stat), \
+                    mock.patch.object(FileIndex, 'record', removing_after_record):
+                total = processor.sortdicom_watch(landing, new_output_dir, settle=0, poll_interval=0.05, 
+                    batch_timeout=0.1, use_inotify=False, stop=stop, on_batch=on_batch, metrics=metrics, 
+                    catalog_path=os.path.join(new_output_dir, 'catalog'))
+            removed = {before_stat, before_parse, before_place}
+            self.assertEqual(total, len(expected) - 3)
+            self.assertSetEqual(set(batches[0]), set(expected) - removed)
+            self.assertEqual(metrics.counters['files_unreadable'], 2)
+            self.assertEqual(len(query_catalog(os.path.join(new_output_dir, 'catalog'))), len(expected) - 3)
+        finally:
+            shutil.rmtree(landing)
+            shutil.rmtree(new_output_dir, ignore_errors=True)
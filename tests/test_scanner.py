@@ -0,0 +1,107 @@
+""" test the scanner module
+"""
+
+import unittest
+import os
+import struct
+import shutil
+import tempfile
+
+from sortdicom import scanner
+from sortdicom.scanner import scan_tags, UnsupportedDicomError
+
+EXPLICIT = b'1.2.840.10008.1.2.1\x00'
+IMPLICIT = b'1.2.840.10008.1.2\x00'
+BIG_ENDIAN = b'1.2.840.10008.1.2.2\x00'
+
+MRN = (0x0010, 0x0020)
+VIEW = (0x0018, 0x5101)
+
+
+def _explicit(group, element, vr, value):
+    if vr in (b'OB', b'SQ', b'UN'):
+        return struct.pack('<HH2s2xI', group, element, vr, len(value)) + value
+    return struct.pack('<HH2sH', group, element, vr, len(value)) + value
+
+
+def _implicit(group, element, value):
+    return struct.pack('<HHI', group, element, len(value)) + value
+
+
+def _file(transfer_syntax, dataset):
+    meta = _explicit(0x0002, 0x0010, b'UI', transfer_syntax)
+    return b'\x00' * 128 + b'DICM' + meta + dataset
+
+
+class TestScanner(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _write(self, content):
+        path = os.path.join(self.tmpdir, 'test.dcm')
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+    def test_explicit_vr_little_endian(self):
+        dataset = _explicit(0x0010, 0x0020, b'LO', b'TCGA-1 ') + _explicit(0x0018, 0x5101, b'CS', b'MLO ')
+        found = scan_tags(self._write(_file(EXPLICIT, dataset)), [MRN, VIEW])
+        self.assertEqual(found[MRN].value, 'TCGA-1')
+        self.assertEqual(found[VIEW].value, 'MLO')
+
+    def test_implicit_vr_little_endian(self):
+        dataset = _implicit(0x0010, 0x0020, b'TCGA-1') + _implicit(0x0018, 0x5101, b'CC')
+        found = scan_tags(self._write(_file(IMPLICIT, dataset)), [MRN, VIEW])
+        self.assertEqual(found[MRN].value, 'TCGA-1')
+        self.assertEqual(found[VIEW].value, 'CC')
+
+    def test_missing_tags_are_left_out(self):
+        dataset = _explicit(0x0010, 0x0020, b'LO', b'TCGA-1')
+        found = scan_tags(self._write(_file(EXPLICIT, dataset)), [MRN, VIEW])
+        self.assertListEqual(list(found.keys()), [MRN])
+
+    def test_stops_before_pixel_data(self):
+        dataset = _explicit(0x0010, 0x0020, b'LO', b'TCGA-1') + \
+            struct.pack('<HH2s2xI', 0x7FE0, 0x0010, b'OB', 0xFFFFFFFF) + b'\x00' * 64
+        found = scan_tags(self._write(_file(EXPLICIT, dataset)), [MRN, VIEW])
+        self.assertEqual(found[MRN].value, 'TCGA-1')
+
+    def test_skips_defined_length_sequence(self):
+        dataset = _explicit(0x0008, 0x1140, b'SQ', b'\x00' * 16) + _explicit(0x0010, 0x0020, b'LO', b'TCGA-1')
+        found = scan_tags(self._write(_file(EXPLICIT, dataset)), [MRN])
+        self.assertEqual(found[MRN].value, 'TCGA-1')
+
+    def test_undefined_length_sequence_before_target_is_unsupported(self):
+        dataset = struct.pack('<HH2s2xI', 0x0008, 0x1140, b'SQ', 0xFFFFFFFF) + b'\x00' * 16
+        with self.assertRaises(UnsupportedDicomError):
+            scan_tags(self._write(_file(EXPLICIT, dataset)), [MRN])
+
+    def test_big_endian_is_unsupported(self):
+        with self.assertRaises(UnsupportedDicomError):
+            scan_tags(self._write(_file(BIG_ENDIAN, b'')), [MRN])
+
+    def test_multi_valued_and_non_ascii_are_unsupported(self):
+        for value in [b'CC\\MLO', b'\xc4']:
+            dataset = _explicit(0x0010, 0x0020, b'LO', value)
+            with self.assertRaises(UnsupportedDicomError):
+                scan_tags(self._write(_file(EXPLICIT, dataset)), [MRN])
+
+    def test_unusual_character_set_is_unsupported(self):
+        dataset = _explicit(0x0008, 0x0005, b'CS', b'ISO_IR 144') + _explicit(0x0010, 0x0020, b'LO', b'TCGA-1')
+        with self.assertRaises(UnsupportedDicomError):
+            scan_tags(self._write(_file(EXPLICIT, dataset)), [MRN])
+
+    def test_not_dicom_or_missing_is_unsupported(self):
+        with self.assertRaises(UnsupportedDicomError):
+            scan_tags(self._write(b'a,b\n' * 100), [MRN])
+        with self.assertRaises(UnsupportedDicomError):
+            scan_tags(os.path.join(self.tmpdir, 'missing.dcm'), [MRN])
+
+    def test_truncated_scan_window_is_unsupported(self):
+        dataset = _explicit(0x0008, 0x0001, b'UN', b'\x00' * scanner.SCAN_BYTES) + _explicit(0x0010, 0x0020, b'LO', b'X')
+        with self.assertRaises(UnsupportedDicomError):
+            scan_tags(self._write(_file(EXPLICIT, dataset)), [MRN])
@@ -0,0 +1,59 @@
+""" test the sharding module
+"""
+
+import unittest
+import os
+import shutil
+import tempfile
+
+from sortdicom import sharding
+
+
+class TestSharding(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _manifest(self, shard, shards, records, root_dir='/data'):
+        path = os.path.join(self.tmpdir, 'shard{}.manifest'.format(shard))
+        header = {'root_dir': root_dir, 'shard': shard, 'shards': shards}
+        sharding.write_manifest(path, header, records)
+        return path
+
+    def test_shard_of_is_stable_across_mount_points(self):
+        a = sharding.shard_of('/mnt/a/patient/1.dcm', '/mnt/a', 7)
+        b = sharding.shard_of('/nfs/archive/patient/1.dcm', '/nfs/archive', 7)
+        self.assertEqual(a, b)
+        self.assertIn(a, range(7))
+
+    def test_shard_of_spreads_files(self):
+        shards = [sharding.shard_of('/data/{}.dcm'.format(i), '/data', 4) for i in range(400)]
+        for s in range(4):
+            self.assertGreater(shards.count(s), 50)
+
+    def test_iter_merged_restores_walk_order(self):
+        a = self._manifest(0, 2, [(0, 'a.dcm', 'x.dcm'), (3, 'd.dcm', 'x.dcm')])
+        b = self._manifest(1, 2, [(1, 'b.dcm', 'y.dcm'), (2, 'c.dcm', 'x.dcm')], root_dir='/mnt/data')
+        header, records = sharding.iter_merged([a, b])
+        self.assertDictEqual(header, {'root_dir': '/data', 'shards': 2})
+        self.assertListEqual([r[1] for r in records], ['a.dcm', 'b.dcm', 'c.dcm', 'd.dcm'])
+        self.assertEqual(sharding.iter_merged([b, a], root_dir='/here')[0]['root_dir'], '/here')
+
+    def test_iter_merged_missing_shard_raises_ValueError(self):
+        a = self._manifest(0, 3, [])
+        b = self._manifest(1, 3, [])
+        with self.assertRaises(ValueError):
+            sharding.iter_merged([a, b])
+
+    def test_iter_merged_different_runs_raise_ValueError(self):
+        a = self._manifest(0, 2, [])
+        b = self._manifest(1, 3, [])
+        with self.assertRaises(ValueError):
+            sharding.iter_merged([a, b])
+
+    def test_write_manifest_leaves_no_partial_file(self):
+        self._manifest(0, 1, [(0, 'a.dcm', 'x.dcm')])
+        self.assertListEqual(os.listdir(self.tmpdir), ['shard0.manifest'])
@@ -0,0 +1,92 @@
+""" test the transcode module
+"""
+
+import unittest
+import os
+import shutil
+import tempfile
+
+import pydicom
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.uid import ExplicitVRLittleEndian, DeflatedExplicitVRLittleEndian, RLELossless, generate_uid
+
+from sortdicom.transcode import Transcoder, transcode_dicom_file, _save_as
+
+
+def _dataset(rows=32, pixel_data=None):
+    meta = FileMetaDataset()
+    meta.MediaStorageSOPClassUID = '1.2.840.10008.5.1.4.1.1.1.2'
+    meta.MediaStorageSOPInstanceUID = generate_uid()
+    meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    ds = Dataset()
+    ds.file_meta = meta
+    ds.PatientID = 'TCGA-1'
+    ds.SOPInstanceUID = meta.MediaStorageSOPInstanceUID
+    ds.Rows = ds.Columns = rows
+    ds.BitsAllocated = ds.BitsStored = 16
+    ds.HighBit = 15
+    ds.PixelRepresentation = 0
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = 'MONOCHROME2'
+    ds.PixelData = pixel_data or bytes(range(256)) * (rows * rows * 2 // 256)
+    return ds
+
+
+class TestTranscode(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.src = os.path.join(self.tmpdir, 'src.dcm')
+        _save_as(_dataset(), self.src)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_deflate_round_trips(self):
+        dst = os.path.join(self.tmpdir, 'dst.dcm')
+        size, output_size, seconds = transcode_dicom_file(self.src, dst, 'deflate')
+        self.assertEqual(size, os.path.getsize(self.src))
+        self.assertEqual(output_size, os.path.getsize(dst))
+        self.assertLess(output_size, size)
+        out = pydicom.dcmread(dst)
+        self.assertEqual(out.file_meta.TransferSyntaxUID, DeflatedExplicitVRLittleEndian)
+        self.assertEqual(out.PixelData, pydicom.dcmread(self.src).PixelData)
+        self.assertEqual(out.PatientID, 'TCGA-1')
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir, '.dst.dcm.part')))
+
+    def test_compressed_files_are_copied(self):
+        flat = os.path.join(self.tmpdir, 'flat.dcm')
+        _save_as(_dataset(pixel_data=bytes(32 * 32 * 2)), flat)
+        rle = os.path.join(self.tmpdir, 'rle.dcm')
+        transcode_dicom_file(flat, rle, 'rle')
+        self.assertEqual(pydicom.dcmread(rle).file_meta.TransferSyntaxUID, RLELossless)
+        dst = os.path.join(self.tmpdir, 'dst.dcm')
+        size, output_size, seconds = transcode_dicom_file(rle, dst, 'deflate')
+        self.assertEqual(size, output_size)
+        with open(rle, 'rb') as a, open(dst, 'rb') as b:
+            self.assertEqual(a.read(), b.read())
+
+    def test_files_that_would_grow_are_copied(self):
+        noise = os.path.join(self.tmpdir, 'noise.dcm')
+        _save_as(_dataset(pixel_data=os.urandom(32 * 32 * 2)), noise)
+        dst = os.path.join(self.tmpdir, 'dst.dcm')
+        size, output_size, seconds = transcode_dicom_file(noise, dst, 'rle')
+        self.assertEqual(size, output_size)
+        with open(noise, 'rb') as a, open(dst, 'rb') as b:
+            self.assertEqual(a.read(), b.read())
+        self.assertListEqual(sorted(os.listdir(self.tmpdir)), ['dst.dcm', 'noise.dcm', 'src.dcm'])
+
+    def test_invalid_syntax_raises_ValueError(self):
+        with self.assertRaises(ValueError):
+            transcode_dicom_file(self.src, os.path.join(self.tmpdir, 'dst.dcm'), 'jpeg')
+        with self.assertRaises(ValueError):
+            Transcoder(self.tmpdir, syntax='jpeg')
+
+    def test_transcoder_reports_bytes_saved(self):
+        placed = []
+        for workers in [1, 2]:
+            target_dir = os.path.join(self.tmpdir, 'out{}'.format(workers))
+            with Transcoder(target_dir, workers=workers, on_placed=lambda *args: placed.append(args)) as transcoder:
+                transcoder.place(self.src, 'a/b.dcm')
+            saved = os.path.getsize(self.src) - os.path.getsize(os.path.join(target_dir, 'a', 'b.dcm'))
+            self.assertEqual(placed.pop(), (self.src, 'a/b.dcm', saved))
@@ -0,0 +1,106 @@
+""" test the watch module
+"""
+
+import unittest
+import os
+import time
+import shutil
+import tempfile
+import threading
+
+from sortdicom import watch
+
+
+class TestWatchers(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _write(self, name, content=b'dicom', age=None):
+        path = os.path.join(self.tmpdir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+        if age is not None:
+            then = time.time() - age
+            os.utime(path, (then, then))
+        return path
+
+    def test_polling_watcher_hands_out_new_and_changed_files_once(self):
+        with watch.PollingWatcher(self.tmpdir, interval=0, settle=0) as watcher:
+            a = self._write('a.dcm')
+            self._write('notes.csv')
+            self.assertListEqual(watcher.poll(), [a])
+            self.assertListEqual(watcher.poll(), [])
+            self._write('a.dcm', b'more dicom')
+            self.assertListEqual(watcher.poll(), [a])
+
+    def test_polling_watcher_waits_for_files_to_settle(self):
+        with watch.PollingWatcher(self.tmpdir, interval=0, settle=60) as watcher:
+            a = self._write('sub/a.dcm')
+            self.assertListEqual(watcher.poll(), [])
+            then = time.time() - 120
+            os.utime(a, (then, then))
+            self.assertListEqual(watcher.poll(), [a])
+
+    @unittest.skipUnless(watch.inotify_available(), 'needs inotify')
+    def test_inotify_watcher_reads_closed_files_straight_away(self):
+        old = self._write('old.dcm', age=120)
+        fresh = self._write('fresh.dcm')
+        with watch.InotifyWatcher(self.tmpdir, settle=60) as watcher:
+            self.assertListEqual(watcher.poll(0.1), [old])  # fresh was already there so it has to settle
+            os.mkdir(os.path.join(self.tmpdir, 'sub'))
+            watcher.poll(0.1)
+            new = self._write('sub/new.dcm')
+            renamed = self._write('sub/upload.tmp')
+            os.rename(renamed, os.path.join(self.tmpdir, 'sub', 'renamed.dcm'))
+            self.assertListEqual(watcher.poll(1.0), [new, os.path.join(self.tmpdir, 'sub', 'renamed.dcm')])
+            self.assertNotIn(fresh, watcher.poll(0.1))
+
+    @unittest.skipUnless(watch.inotify_available(), 'needs inotify')
+    def test_inotify_watcher_picks_up_hard_links(self):
+        landing = os.path.join(self.tmpdir, 'landing')
+        os.mkdir(landing)
+        old = self._write('elsewhere/old.dcm', age=120)
+        with watch.InotifyWatcher(landing, interval=0.05, settle=60) as watcher:
+            self.assertListEqual(watcher.poll(0.1), [])
+            linked = os.path.join(landing, 'linked.dcm')
+            os.link(old, linked)
+            self.assertListEqual(watcher.poll(1.0), [linked])
+
+    def test_make_watcher_can_be_forced_to_poll(self):
+        with watch.make_watcher(self.tmpdir, use_inotify=False) as watcher:
+            self.assertIsInstance(watcher, watch.PollingWatcher)
+            self.assertNotIsInstance(watcher, watch.InotifyWatcher)
+
+
+class FakeWatcher:
+
+    def __init__(self, polls):
+        self.polls = list(polls)
+
+    def poll(self, timeout=0.0):
+        return self.polls.pop(0) if self.polls else []
+
+
+class TestIterBatches(unittest.TestCase):
+
+    def test_batches_split_by_size_and_drop_repeats(self):
+        watcher = FakeWatcher([['a', 'b', 'a', 'c', 'd', 'e']])
+        stop = threading.Event()
+        batches = []
+        for batch in watch.iter_batches(watcher, batch_size=2, batch_timeout=0.01, stop=stop):
+            batches.append(batch)
+            if len(batches) == 3:
+                stop.set()
+        self.assertListEqual(batches, [['a', 'b'], ['c', 'd'], ['e']])
+
+    def test_batches_wait_for_timeout(self):
+        watcher = FakeWatcher([['a'], [], ['b']])
+        stop = threading.Event()
+        for batch in watch.iter_batches(watcher, batch_size=10, batch_timeout=0.2, stop=stop):
+            break
+        self.assertListEqual(batch, ['a', 'b'])